@@ -6,13 +6,17 @@ import json
 import click  # type: ignore
 import logging
 import os
-from typing import Tuple, Any
+from typing import Tuple, Any, List, Dict, Optional, Set, TYPE_CHECKING
 from colorama import Fore, Style
-from time import sleep
+from time import sleep, monotonic
+from datetime import datetime
 from click_option_group import optgroup, MutuallyExclusiveOptionGroup  # type: ignore
-from ananke.connectors.shared import WRITE_METHODS
-from ananke.struct.dispatch import Dispatch
-from ananke.post_checks.slack import post_run_check_notification
+
+# everything else is imported by the commands that use it, so the CLI starts without
+# loading gRPC, jinja2 or HTTP clients it doesn't need (see test_startup.py)
+if TYPE_CHECKING:
+    from ananke.connectors.shared import WRITE_METHODS, AnankeResponse
+    from ananke.struct.validate import ValidationResult
 
 
 main = click.Group(help="Device configurator")
@@ -32,6 +36,88 @@ def color_results(prefix: str, message: str, message_color: Any) -> str:
     )
 
 
+def parse_cli_targets(
+    targets: Tuple[str], sections: Tuple[str]
+) -> Dict[Optional[str], Set[str]]:
+    """
+    Build Dispatch targets from CLI arguments
+    """
+    # allow to run with targets from environment variable
+    if len(targets) == 1 and " " in targets[0]:
+        targets = targets[0].split(" ")
+    return (
+        {target: set(sections) for target in targets}
+        if targets
+        else {None: set(sections)}
+    )
+
+
+def echo_deploy_results(
+    results: List["AnankeResponse"], dry_run: bool, debug: bool
+) -> None:
+    """
+    Print deploy results per target
+    """
+    fg_translate = {1: Fore.RED, 2: Fore.YELLOW, 3: Fore.WHITE}
+    for result in results:
+        click.echo(color_results("target", result.source, Fore.CYAN))
+        if dry_run or debug:
+            click.echo(
+                color_results("config", json.dumps(result.body, indent=2), Fore.WHITE)
+            )
+        if debug:
+            click.echo(
+                color_results(
+                    "device response", json.dumps(result.output, indent=2), Fore.MAGENTA
+                )
+            )
+            for message in result.messages:
+                click.echo(
+                    color_results(
+                        "message", message.text, fg_translate[message.priority]
+                    )
+                )
+        else:
+            min_priority = min([message.priority for message in result.messages])
+            message = "Config section(s) pushed to device"
+            if min_priority == 1:
+                message = "One or more config sections failed"
+            elif min_priority in [2, 3]:
+                message = result.messages[0].text
+            click.echo(color_results("message", message, fg_translate[min_priority]))
+
+
+def echo_validation_results(results: List["ValidationResult"], verbose: bool) -> None:
+    """
+    Print validation errors per target and pack
+    """
+    for result in results:
+        if result.valid and not verbose:
+            continue
+        click.echo(color_results("target", result.source, Fore.CYAN))
+        for pack in result.packs:
+            if pack.errors:
+                for error in pack.errors:
+                    click.echo(color_results(pack.path, error, Fore.RED))
+            elif verbose:
+                message = "no binding, skipped" if pack.skipped else "valid"
+                click.echo(color_results(pack.path, message, Fore.GREEN))
+
+
+def echo_check_results(results: Dict[str, List[Any]]) -> None:
+    """
+    Print post check diffs per host
+    """
+    for host, diffs in results.items():
+        click.secho("  " + host + ": ", fg="magenta")
+        if diffs:
+            for diff in diffs:
+                click.secho(f"    - {diff}", fg="white")
+        else:
+            click.secho("    " + "\U00002705", nl=False)
+            click.secho(" No diffs", fg="green")
+
+
 @main.command(name="set")
 @click.argument("targets", nargs=-1)
 @click.option(
@@ -47,7 +133,7 @@ def color_results(prefix: str, message: str, message_color: Any) -> str:
     "-m",
     "--method",
     "method",
-    help="Method for write operations, default is replace",
+    help="Method for write operations (replace, update or delta), default is replace",
     default=None,
 )
 @click.option(
@@ -72,6 +158,78 @@ def color_results(prefix: str, message: str, message_color: Any) -> str:
     type=int,
     help="Variation tolerance percentage for integers in post check diffs, default is 10",
 )
+@click.option(
+    "-P",
+    "--scoped-post-checks",
+    "scoped_post_checks",
+    is_flag=True,
+    type=bool,
+    help="Only monitor the interfaces/BGP neighbors touched by the deployed config",
+)
+@click.option(
+    "-A",
+    "--adaptive-post-checks",
+    "adaptive_post_checks",
+    is_flag=True,
+    type=bool,
+    help="Poll until devices converge, -C is the maximum number of post checks and "
+    "-I the maximum interval (default 60)",
+)
+@click.option(
+    "-N",
+    "--stable-polls",
+    "stable_polls",
+    type=int,
+    help="Number of unchanged polls after which a device is considered converged in "
+    "adaptive mode, default is 3",
+)
+@click.option(
+    "-W",
+    "--waves",
+    "waves",
+    type=click.Choice(["role", "site", "percent"]),
+    default=None,
+    help="Roll out in waves by role, site or percentage of targets, gated by post "
+    "checks",
+)
+@click.option(
+    "-w",
+    "--wave-percent",
+    "wave_percent",
+    type=int,
+    help="Percentage of targets per wave for percent waves, default is 10",
+)
+@click.option(
+    "-U",
+    "--max-unhealthy",
+    "max_unhealthy",
+    type=int,
+    help="Percentage of unhealthy hosts allowed in a wave before the rollout is "
+    "halted, default is 0",
+)
+@click.option(
+    "-a",
+    "--artifact",
+    "artifact",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Deploy the packs from a build artifact instead of rendering config",
+)
+@click.option(
+    "-V",
+    "--validate",
+    "validate_packs",
+    is_flag=True,
+    default=False,
+    help="Validate config packs against their YANG bindings and abort on errors",
+)
+@click.option(
+    "--preflight",
+    "preflight_check",
+    is_flag=True,
+    default=False,
+    help="Reject config packs for models the device doesn't support before deploying",
+)
 @click.option(
     "-S",
     "--slack-post-checks",
@@ -104,40 +262,106 @@ def color_results(prefix: str, message: str, message_color: Any) -> str:
 def config_set(
     targets: Tuple[str],
     sections: str,
-    method: WRITE_METHODS,
+    method: "WRITE_METHODS",
     debug: bool,
     dry_run: bool,
     post_checks: int,
     post_check_interval: int,
     diff_tolerance: int,
+    scoped_post_checks: bool,
+    adaptive_post_checks: bool,
+    stable_polls: int,
+    waves: str,
+    wave_percent: int,
+    max_unhealthy: int,
+    artifact: Optional[str],
+    validate_packs: bool,
+    preflight_check: bool,
     slack_post_checks: bool,
 ) -> None:
     """
     Push config to devices. Specify comma-separated list of hosts and/or roles with an
     optional config section parameter
     """
-    if method not in [None, "replace", "update"]:
-        raise ValueError("Method must be replace or update")
-    # allow to run with targets from environment variable
-    if len(targets) == 1 and " " in targets[0]:
-        targets = targets[0].split(" ")
-    targets = (
-        {target: set(sections) for target in targets}
-        if targets
-        else {None: set(sections)}
-    )
-    if (post_check_interval or diff_tolerance) and not post_checks:
+    from ananke.struct.dispatch import Dispatch
+    from ananke.struct.rollout import Rollout, RolloutPolicy, plan_waves
+    from ananke.struct.capabilities import CapabilitiesCache, preflight
+    from ananke.struct.validate import concurrent_validate
+    from ananke.post_checks.slack import post_run_check_notification
+
+    if method not in [None, "replace", "update", "delta"]:
+        raise ValueError("Method must be replace, update or delta")
+    targets = parse_cli_targets(targets, sections)
+    if (
+        post_check_interval
+        or diff_tolerance
+        or scoped_post_checks
+        or adaptive_post_checks
+    ) and not post_checks:
         raise ValueError(
-            "Post check interval/tolerance specified without number of post checks"
+            "Post check interval/tolerance/scope/adaptive specified without number of "
+            "post checks"
         )
+    if stable_polls and not adaptive_post_checks:
+        raise ValueError("Stable polls specified without adaptive post checks")
+    if (wave_percent or max_unhealthy) and not waves:
+        raise ValueError("Wave percentage/max unhealthy specified without waves")
+    if waves and dry_run:
+        raise ValueError("Waves cannot be used in dry-run mode")
     deploy_tags = []
     if dry_run:
         deploy_tags.append("dry-run")
     dispatch = Dispatch(
         targets=targets,
         deploy_tags=deploy_tags,
-        post_checks=True if post_checks else False,
+        post_checks=True if post_checks and not waves else False,
+        scoped_post_checks=scoped_post_checks,
+        artifact=artifact,
     )
+    if validate_packs:
+        results = list(
+            concurrent_validate([target.config for target in dispatch.targets])
+        )
+        if not all(result.valid for result in results):
+            echo_validation_results(results, verbose=False)
+            raise SystemExit(1)
+    if preflight_check or (dispatch.settings.get("capabilities") or {}).get(
+        "preflight"
+    ):
+        for target_id, paths in preflight(
+            dispatch.targets, CapabilitiesCache.from_settings(dispatch.settings)
+        ).items():
+            click.echo(
+                color_results(target_id, "rejected " + ", ".join(paths), Fore.YELLOW)
+            )
+    if waves:
+        rollout = Rollout(
+            dispatch=dispatch,
+            waves=plan_waves(
+                dispatch.targets,
+                strategy=waves,
+                percent=wave_percent or 10,
+                sites=dispatch.get_sites(),
+            ),
+            policy=RolloutPolicy(max_unhealthy=(max_unhealthy or 0) / 100),
+            tolerance=diff_tolerance or 10,
+            max_polls=post_checks or 5,
+            scoped=scoped_post_checks,
+        )
+        for wave in rollout.run(method):
+            click.secho(
+                "Wave {}/{}".format(wave.number + 1, len(rollout.waves)), fg="yellow"
+            )
+            echo_deploy_results(wave.deploy_results, dry_run, debug)
+            click.secho("Post checks", fg="cyan")
+            echo_check_results(wave.check_results)
+            if not wave.promoted:
+                click.secho(
+                    "Wave not within policy, halting rollout. Unhealthy hosts: "
+                    + ", ".join(wave.unhealthy),
+                    fg="red",
+                )
+        return
     dispatch.concurrent_deploy(method)
     retry = 1000
     wait_time = 0.2
@@ -151,53 +375,31 @@ def config_set(
         )
         logger.error(message)
         raise RuntimeError(message)
-    fg_translate = {1: Fore.RED, 2: Fore.YELLOW, 3: Fore.WHITE}
-    for result in dispatch.deploy_results:
-        click.echo(color_results("target", result.source, Fore.CYAN))
-        if dry_run or debug:
-            click.echo(
-                color_results("config", json.dumps(result.body, indent=2), Fore.WHITE)
-            )
-        if debug:
-            click.echo(
-                color_results(
-                    "device response", json.dumps(result.output, indent=2), Fore.MAGENTA
-                )
-            )
-            for message in result.messages:
-                click.echo(
-                    color_results(
-                        "message", message.text, fg_translate[message.priority]
-                    )
-                )
-        else:
-            min_priority = min([message.priority for message in result.messages])
-            message = "Config section(s) pushed to device"
-            if min_priority == 1:
-                message = "One or more config sections failed"
-            elif min_priority in [2, 3]:
-                message = result.messages[0].text
-            click.echo(color_results("message", message, fg_translate[min_priority]))
+    echo_deploy_results(dispatch.deploy_results, dry_run, debug)
     if post_checks:
         click.secho("Running post checks...", fg="yellow")
-        post_check_interval = post_check_interval or 10
         diff_tolerance = diff_tolerance or 10
-        sleep(post_check_interval)
+        if adaptive_post_checks:
+            check_rounds = dispatch.post_status.adaptive_poll(
+                tolerance=diff_tolerance,
+                max_polls=post_checks,
+                max_interval=post_check_interval or 60,
+                stable_polls=stable_polls or 3,
+            )
+        else:
+            check_rounds = dispatch.post_status.scheduled_poll(
+                tolerance=diff_tolerance,
+                interval=post_check_interval or 10,
+                count=post_checks,
+            )
         check_results = []
-        for check_number in range(post_checks):
-            dispatch.post_status.poll(tolerance=diff_tolerance)
-            check_results.append(dispatch.post_status.results)
+        for check_number, results, last_check in check_rounds:
+            check_results.append(dict(results))
+            total_checks = check_number + 1 if last_check else post_checks
             click.secho(
-                "Post check {}/{}".format(check_number + 1, post_checks), fg="cyan"
+                "Post check {}/{}".format(check_number + 1, total_checks), fg="cyan"
             )
-            for host, diffs in check_results[-1].items():
-                click.secho("  " + host + ": ", fg="magenta")
-                if diffs:
-                    for diff in diffs:
-                        click.secho(f"    - {diff}", fg="white")
-                else:
-                    click.secho("    " + "\U00002705", nl=False)
-                    click.secho(" No diffs", fg="green")
+            echo_check_results(check_results[-1])
             slack_webhook = dispatch.settings["post-checks"].get("slack-webhook")
             if "ANANKE_SLACK_WEBHOOK" in os.environ:
                 slack_webhook = os.environ["ANANKE_SLACK_WEBHOOK"]
@@ -205,37 +407,692 @@ def config_set(
                 post_run_check_notification(
                     check_results,
                     check_number,
-                    post_checks,
+                    total_checks,
                     slack_webhook,
                 )
-            if check_number < post_checks - 1:
-                sleep(post_check_interval)
+
+
+@main.command(name="plan")
+@click.argument("targets", nargs=-1)
+@click.option(
+    "-s",
+    "--section",
+    "sections",
+    help="Config section to plan",
+    type=str,
+    default=None,
+    multiple=True,
+)
+@click.option(
+    "-m",
+    "--method",
+    "method",
+    help="Method for write operations (replace, update or delta), default is as "
+    "configured",
+    default=None,
+)
+@click.option(
+    "-c",
+    "--content",
+    "content",
+    is_flag=True,
+    default=False,
+    help="Print the JSON content of every pack",
+)
+@click.option(
+    "-j",
+    "--json",
+    "json_output",
+    is_flag=True,
+    default=False,
+    help="Print a machine-readable JSON summary",
+)
+@click.option(
+    "-w",
+    "--workers",
+    "workers",
+    type=int,
+    default=None,
+    help="Number of processes to render with, default is the number of CPUs",
+)
+def plan(
+    targets: Tuple[str],
+    sections: Tuple[str],
+    method: "WRITE_METHODS",
+    content: bool,
+    json_output: bool,
+    workers: Optional[int],
+) -> None:
+    """
+    Render and transform config offline and print what would be sent to each device,
+    without connecting to devices. Specify space-separated list of hosts and/or roles
+    with an optional config section parameter
+    """
+    from ananke.struct.dispatch import Dispatch
+    from ananke.struct.plan import concurrent_plan, plan_summary
+
+    if method not in [None, "replace", "update", "delta"]:
+        raise ValueError("Method must be replace, update or delta")
+    dispatch = Dispatch(targets=parse_cli_targets(targets, sections), connect=False)
+    plans = list(
+        concurrent_plan(
+            [target.config for target in dispatch.targets],
+            write_method=method,
+            max_workers=workers,
+        )
+    )
+    if json_output:
+        click.echo(json.dumps(plan_summary(plans), indent=2))
+        return
+    for target_plan in sorted(plans, key=lambda target_plan: target_plan.source):
+        click.echo(
+            color_results(
+                "target",
+                "{} ({} packs, {} bytes)".format(
+                    target_plan.source, len(target_plan.packs), target_plan.size
+                ),
+                Fore.CYAN,
+            )
+        )
+        for pack in target_plan.packs:
+            click.echo(
+                color_results(
+                    pack.path,
+                    "{} {} bytes {}".format(
+                        pack.write_method, pack.size, pack.digest[:12]
+                    ),
+                    Fore.WHITE,
+                )
+            )
+            if content:
+                click.secho(json.dumps(pack.content, indent=2), fg="white")
+    click.echo(
+        "{} targets, {} packs, {} bytes ({} templates rendered, {} from cache)".format(
+            len(plans),
+            sum(len(target_plan.packs) for target_plan in plans),
+            sum(target_plan.size for target_plan in plans),
+            sum(target.config.render_stats["rendered"] for target in dispatch.targets),
+            sum(target.config.render_stats["cached"] for target in dispatch.targets),
+        )
+    )
+
+
+@main.command(name="build")
+@click.argument("targets", nargs=-1)
+@click.option(
+    "-o",
+    "--output",
+    "output",
+    type=click.Path(dir_okay=False),
+    required=True,
+    help="Artifact file to write",
+)
+@click.option(
+    "-s",
+    "--section",
+    "sections",
+    help="Config section to build",
+    type=str,
+    default=None,
+    multiple=True,
+)
+@click.option(
+    "-m",
+    "--method",
+    "method",
+    help="Method for write operations (replace, update or delta), default is as "
+    "configured",
+    default=None,
+)
+@click.option(
+    "-w",
+    "--workers",
+    "workers",
+    type=int,
+    default=None,
+    help="Number of processes to render with, default is the number of CPUs",
+)
+def build(
+    targets: Tuple[str],
+    output: str,
+    sections: Tuple[str],
+    method: "WRITE_METHODS",
+    workers: Optional[int],
+) -> None:
+    """
+    Render and transform config offline into a single artifact file that set can
+    deploy with --artifact. Specify space-separated list of hosts and/or roles with an
+    optional config section parameter
+    """
+    from ananke.struct.dispatch import Dispatch
+    from ananke.struct.plan import concurrent_plan
+    from ananke.struct.bundle import write_bundle
+
+    if method not in [None, "replace", "update", "delta"]:
+        raise ValueError("Method must be replace, update or delta")
+    dispatch = Dispatch(targets=parse_cli_targets(targets, sections), connect=False)
+    index = write_bundle(
+        output,
+        concurrent_plan(
+            [target.config for target in dispatch.targets],
+            write_method=method,
+            max_workers=workers,
+        ),
+    )
+    click.echo(
+        "{} targets written to {} ({} bytes)".format(
+            len(index["targets"]), output, os.path.getsize(output)
+        )
+    )
+
+
+@main.command(name="validate")
+@click.argument("targets", nargs=-1)
+@click.option(
+    "-s",
+    "--section",
+    "sections",
+    help="Config section to validate",
+    type=str,
+    default=None,
+    multiple=True,
+)
+@click.option(
+    "-v",
+    "--verbose",
+    "verbose",
+    is_flag=True,
+    default=False,
+    help="List valid and skipped packs as well",
+)
+@click.option(
+    "-n",
+    "--no-cache",
+    "no_cache",
+    is_flag=True,
+    default=False,
+    help="Validate all packs, ignoring cached results",
+)
+@click.option(
+    "-w",
+    "--workers",
+    "workers",
+    type=int,
+    default=None,
+    help="Number of processes to validate with, default is the number of CPUs",
+)
+def validate(
+    targets: Tuple[str],
+    sections: Tuple[str],
+    verbose: bool,
+    no_cache: bool,
+    workers: Optional[int],
+) -> None:
+    """
+    Validate rendered config packs against their YANG bindings without connecting to
+    devices. Specify space-separated list of hosts and/or roles with an optional config
+    section parameter
+    """
+    from ananke.struct.dispatch import Dispatch
+    from ananke.struct.validate import concurrent_validate
+
+    dispatch = Dispatch(targets=parse_cli_targets(targets, sections), connect=False)
+    results = list(
+        concurrent_validate(
+            [target.config for target in dispatch.targets],
+            use_cache=not no_cache,
+            max_workers=workers,
+        )
+    )
+    echo_validation_results(sorted(results, key=lambda result: result.source), verbose)
+    packs = [pack for result in results for pack in result.packs]
+    invalid = [pack for pack in packs if pack.errors]
+    click.echo(
+        "{} packs validated ({} cached), {} skipped, {} invalid".format(
+            len([pack for pack in packs if not pack.skipped]),
+            len([pack for pack in packs if pack.cached]),
+            len([pack for pack in packs if pack.skipped]),
+            len(invalid),
+        )
+    )
+    if invalid:
+        raise SystemExit(1)
+
+
+@main.command(name="drift")
+@click.argument("targets", nargs=-1)
+@click.option(
+    "-s",
+    "--section",
+    "sections",
+    help="Config section to compare",
+    type=str,
+    default=None,
+    multiple=True,
+)
+@click.option(
+    "-j",
+    "--json",
+    "json_output",
+    is_flag=True,
+    default=False,
+    help="Print a machine-readable JSON summary",
+)
+@click.option(
+    "-v",
+    "--verbose",
+    "verbose",
+    is_flag=True,
+    default=False,
+    help="List the drifted paths",
+)
+@click.option(
+    "-w",
+    "--workers",
+    "workers",
+    type=int,
+    default=32,
+    help="Number of devices to fetch running config from at once, default is 32",
+)
+def config_drift(
+    targets: Tuple[str],
+    sections: Tuple[str],
+    json_output: bool,
+    verbose: bool,
+    workers: int,
+) -> None:
+    """
+    Compare the running config of devices with the intended config from the repo.
+    Specify space-separated list of hosts and/or roles with an optional config section
+    parameter
+    """
+    from ananke.struct.dispatch import Dispatch
+    from ananke.struct.drift import concurrent_drift, drift_summary
+
+    dispatch = Dispatch(targets=parse_cli_targets(targets, sections))
+    results = []
+    for result in concurrent_drift(dispatch.targets, max_workers=workers):
+        results.append(result)
+        if json_output:
+            continue
+        click.echo(color_results("target", result.source, Fore.CYAN))
+        for path in result.paths:
+            if path.error:
+                message, color = f"error: {path.error}", Fore.RED
+            elif path.drifted:
+                message = "{} changed, {} extra".format(
+                    len(path.changed), len(path.extra)
+                )
+                color = Fore.YELLOW
+            else:
+                message, color = "in sync", Fore.GREEN
+            click.echo(color_results(path.path, message, color))
+            if verbose:
+                for changed in path.changed:
+                    click.secho(f"    ~ {changed}", fg="yellow")
+                for extra in path.extra:
+                    click.secho(f"    - {extra}", fg="red")
+    if json_output:
+        click.echo(json.dumps(drift_summary(results), indent=2))
 
 
 @main.command(name="get")
-@click.argument("hostname")
-@click.argument("path")
+@click.argument("args", nargs=-1, required=True)
 @click.option("-O", "--oneline", "oneline", is_flag=True, default=False)
 @click.option("-o", "--operational", "operational", is_flag=True, default=False)
 @click.option("-y", "--yaml", "yaml", is_flag=True, default=False)
+@click.option(
+    "-n",
+    "--ndjson",
+    "ndjson",
+    is_flag=True,
+    default=False,
+    help="Print one JSON object per line for every update instead of one document",
+)
+@click.option(
+    "-d",
+    "--output-dir",
+    "output_dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Write updates to one NDJSON file per device in this directory",
+)
+@click.option(
+    "-w",
+    "--workers",
+    "workers",
+    type=int,
+    default=32,
+    help="Number of devices to get from at once, default is 32",
+)
 def gnmi_get(
-    hostname: str, path: str, oneline: bool, operational: bool, yaml: bool
+    args: Tuple[str],
+    oneline: bool,
+    operational: bool,
+    yaml: bool,
+    ndjson: bool,
+    output_dir: Optional[str],
+    workers: int,
+) -> None:
+    """
+    Get config from devices based on gNMI paths. Specify space-separated list of hosts
+    and/or roles followed by one or more paths, arguments containing a slash are
+    treated as paths
+    """
+    from ananke.struct.dispatch import Dispatch
+
+    paths = [arg for arg in args if "/" in arg]
+    selectors = tuple(arg for arg in args if "/" not in arg)
+    if not paths:
+        raise click.UsageError("At least one gNMI path must be given")
+    if yaml and (oneline or ndjson or output_dir):
+        raise click.UsageError("YAML output can't be combined with line output")
+    dispatch = Dispatch(targets=parse_cli_targets(selectors, ()), render=False)
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        files: Dict[str, Any] = {}
+        try:
+            for target_id, update in dispatch.concurrent_get(
+                paths, operational=operational, max_workers=workers
+            ):
+                if target_id not in files:
+                    files[target_id] = open(f"{output_dir}/{target_id}.ndjson", "w")
+                    click.echo(color_results("target", target_id, Fore.CYAN))
+                files[target_id].write(json.dumps(update) + "\n")
+        finally:
+            for file in files.values():
+                file.close()
+        return
+
+    from itertools import groupby
+
+    updates = dispatch.concurrent_get(
+        paths, operational=operational, max_workers=workers
+    )
+    if ndjson:
+        for target_id, update in updates:
+            click.echo(json.dumps({"target": target_id, **update}))
+        return
+    # updates of a target arrive together, each target prints one document with the
+    # values of all its updates like get always has
+    for target_id, target_updates in groupby(updates, key=lambda item: item[0]):
+        if len(dispatch.targets) > 1:
+            click.echo(color_results("target", target_id, Fore.CYAN))
+        values = []
+        for _, update in target_updates:
+            if "error" in update:
+                click.secho(update["error"], fg="red")
+            else:
+                values.append(update["val"])
+        if not values:
+            continue
+        if yaml:
+            from ruamel.yaml import YAML  # type: ignore
+            from io import StringIO
+
+            yaml_string = StringIO()
+            YAML().dump(values, yaml_string)
+            click.secho(yaml_string.getvalue(), fg="white")
+        elif oneline:
+            click.secho(json.dumps(values), fg="white")
+        else:
+            click.secho(json.dumps(values, indent=2), fg="white")
+
+
+@main.command(name="collect")
+@click.argument("targets", nargs=-1)
+@click.option(
+    "-p",
+    "--path",
+    "paths",
+    type=str,
+    multiple=True,
+    help="Path to collect, defaults to collect paths in settings",
+)
+@click.option(
+    "-d",
+    "--directory",
+    "directory",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Directory to write artifacts to, defaults to collect directory in settings",
+)
+@click.option("-o", "--operational", "operational", is_flag=True, default=False)
+@click.option(
+    "-w",
+    "--workers",
+    "workers",
+    type=int,
+    default=32,
+    help="Number of devices to collect from at once, default is 32",
+)
+def collect(
+    targets: Tuple[str],
+    paths: Tuple[str],
+    directory: Optional[str],
+    operational: bool,
+    workers: int,
+) -> None:
+    """
+    Back up running config from devices to compressed, content-addressed artifacts.
+    Specify space-separated list of hosts and/or roles, or none for all devices
+    """
+    from ananke.struct.dispatch import Dispatch
+    from ananke.struct.collect import concurrent_collect, write_manifest
+
+    dispatch = Dispatch(targets=parse_cli_targets(targets, ()), render=False)
+    settings = dispatch.settings.get("collect") or {}
+    collect_paths = list(paths) or settings.get("paths")
+    directory = directory or settings.get("directory")
+    if not collect_paths or not directory:
+        raise click.UsageError(
+            "Paths and directory must be given or set under collect in settings.yaml"
+        )
+    started, start = datetime.now(), monotonic()
+    results = []
+    for result in concurrent_collect(
+        dispatch.targets,
+        collect_paths,
+        directory,
+        operational=operational,
+        max_workers=workers,
+    ):
+        results.append(result)
+        if result.error:
+            message, color = f"failed: {result.error}", Fore.RED
+        elif result.changed:
+            message, color = f"changed ({result.digest[:12]})", Fore.YELLOW
+        else:
+            message, color = "unchanged", Fore.GREEN
+        click.echo(color_results(result.source, message, color))
+    manifest = write_manifest(
+        directory, results, collect_paths, started, monotonic() - start
+    )
+    click.echo(
+        "{} collected, {} changed, {} failed in {:.1f}s".format(
+            len(results) - len(manifest["failed"]),
+            len(manifest["changed"]),
+            len(manifest["failed"]),
+            manifest["duration"],
+        )
+    )
+    if manifest["failed"]:
+        raise SystemExit(1)
+
+
+@main.command(name="capabilities")
+@click.argument("targets", nargs=-1)
+@click.option(
+    "-r",
+    "--refresh",
+    "refresh",
+    is_flag=True,
+    default=False,
+    help="Fetch from devices even if cached capabilities haven't expired",
+)
+@click.option(
+    "-v",
+    "--verbose",
+    "verbose",
+    is_flag=True,
+    default=False,
+    help="List the supported models",
+)
+@click.option(
+    "-w",
+    "--workers",
+    "workers",
+    type=int,
+    default=32,
+    help="Number of devices to fetch capabilities from at once, default is 32",
+)
+def capabilities(
+    targets: Tuple[str], refresh: bool, verbose: bool, workers: int
 ) -> None:
     """
-    Get config from device based on gNMI path
+    Fetch device capabilities into the capabilities cache. Specify space-separated list
+    of hosts and/or roles, or none for all devices
     """
-    target = {hostname: set()}
-    dispatch = Dispatch(targets=target)
+    from ananke.struct.dispatch import Dispatch
+    from ananke.struct.capabilities import CapabilitiesCache
 
-    target = dispatch.targets[0]
-    connection = target.connector
-    format = "JSON"
-    if yaml:
-        format = "YAML"
-    config = connection.get_config(
-        path=path, oneline=oneline, operational=operational, format=format
+    dispatch = Dispatch(targets=parse_cli_targets(targets, ()), render=False)
+    cache = CapabilitiesCache.from_settings(dispatch.settings)
+    results = cache.fill(dispatch.targets, refresh=refresh, max_workers=workers)
+    for target_id, result in sorted(results.items()):
+        if result is None:
+            click.echo(color_results(target_id, "unreachable", Fore.RED))
+            continue
+        models = result.get("supported_models", [])
+        click.echo(
+            color_results(
+                target_id,
+                "{} models, gNMI {}".format(len(models), result.get("gnmi_version")),
+                Fore.GREEN,
+            )
+        )
+        if verbose:
+            for model in models:
+                click.secho(
+                    "    {} {}".format(model.get("name"), model.get("version", "")),
+                    fg="white",
+                )
+
+
+@main.command(name="serve")
+@click.option(
+    "-H",
+    "--host",
+    "host",
+    default="127.0.0.1",
+    help="Address to listen on, default is 127.0.0.1",
+)
+@click.option(
+    "-p",
+    "--port",
+    "port",
+    type=int,
+    default=None,
+    help="Port to listen on, default is 8151",
+)
+@click.option(
+    "-u",
+    "--unix-socket",
+    "unix_socket",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Listen on a Unix socket instead of a TCP port",
+)
+@click.option(
+    "-t",
+    "--token-file",
+    "token_file",
+    type=click.Path(dir_okay=False, exists=True),
+    default=None,
+    help="File with the token clients must send, default is ANANKE_SERVICE_TOKEN",
+)
+@click.option(
+    "-r",
+    "--max-requests",
+    "max_requests",
+    type=int,
+    default=4,
+    help="Number of plan/get/preview/edit requests handled at once, default is 4",
+)
+@click.option(
+    "-d",
+    "--max-deploys",
+    "max_deploys",
+    type=int,
+    default=1,
+    help="Number of set requests handled at once, default is 1",
+)
+@click.option(
+    "-i",
+    "--poll-interval",
+    "poll_interval",
+    type=float,
+    default=5,
+    help="Seconds between checks of the config repo for changes, 0 to disable, "
+    "default is 5",
+)
+def serve(
+    host: str,
+    port: Optional[int],
+    unix_socket: Optional[str],
+    token_file: Optional[str],
+    max_requests: int,
+    max_deploys: int,
+    poll_interval: float,
+) -> None:
+    """
+    Run as a service with a local HTTP API, keeping settings, variables, secrets,
+    rendered templates and gNMI sessions warm between requests
+    """
+    from ananke.struct.service import (
+        DEFAULT_PORT,
+        Service,
+        make_server,
+        service_token,
+    )
+
+    from ananke.connectors.gnmi import close_sessions, persistent_sessions
+
+    token = service_token(token_file)
+    if not unix_socket and not token:
+        raise click.UsageError(
+            "Set ANANKE_SERVICE_TOKEN or --token-file to listen on a TCP port, or "
+            "listen on a Unix socket with --unix-socket"
+        )
+    service = Service(
+        max_requests=max_requests,
+        max_deploys=max_deploys,
+        poll_interval=poll_interval,
+    )
+    port = port or DEFAULT_PORT
+    server = make_server(
+        service,
+        host=host,
+        port=port,
+        unix_socket=unix_socket,
+        token=token,
+    )
+    persistent_sessions()
+    service.start()
+    click.echo(
+        color_results(
+            "serving", unix_socket or "http://{}:{}".format(host, port), Fore.GREEN
+        )
     )
-    click.secho(config, fg="white")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+        close_sessions()
 
 
 if __name__ == "__main__":
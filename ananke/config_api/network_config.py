@@ -1,16 +1,26 @@
 import os
 import ruamel.yaml  # type: ignore
 import json
+import pickle
 import logging
+import threading
+import concurrent.futures
 from pathlib import Path
-from dataclasses import dataclass
-from typing import Any, Tuple, Union, Optional, Dict
+from fnmatch import fnmatch
+from time import monotonic
+from dataclasses import dataclass, field
+from typing import Any, Callable, Tuple, Union, Optional, Dict, List
 from io import StringIO
 from ananke.struct.repo import GitLabRepo, LocalRepo  # type: ignore
-from ananke.struct.vault import Vault  # type: ignore
+from ananke.config_api.yang_index import ContentIndex
+from ananke.struct.overlay import Overlay, PackChange, preview
 
 REPO_TARGET = os.environ.get("ANANKE_REPO_TARGET")
 CONFIG_DIR = os.environ.get("ANANKE_CONFIG")
+# below this many files parsing in processes costs more than it saves
+PARALLEL_PARSE_THRESHOLD = 50
+# YAML objects used by parse_file, dump_section and edit_file, see _process_yaml
+_YAML = threading.local()
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +47,22 @@ class RepoConfigSection:
     changed: bool = False
     new_file: bool = False
     binding: Any = None
+    index: Optional[ContentIndex] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def keyed(self) -> ContentIndex:
+        """
+        Keyed access to the content below the file's path, with YANG lists indexed by
+        their keys, see ananke.config_api.yang_index. Changes made through it are made
+        to content, so they are committed as usual (set changed to True).
+        """
+        if self.content is None or self.path is None:
+            raise ValueError("Section has no content to index")
+        root = self.content[self.path]
+        if self.index is None or self.index.root is not root:
+            self.index = ContentIndex(root)
+        return self.index
 
     def populate_binding(self, binding_object: Any, overwrite: bool = False):
         """
@@ -71,6 +97,130 @@ class RepoConfigSection:
         self.content = exported
 
 
+def create_yaml() -> ruamel.yaml.YAML:
+    """
+    YAML object for reading and writing templated config files
+    """
+    yaml = ruamel.yaml.YAML(typ="jinja2")
+    yaml.Representer = NonAliasingRTRepresenter
+    yaml.preserve_quotes = True
+    yaml.explicit_start = True
+    yaml.indent(offset=2, sequence=4)
+    return yaml
+
+
+def create_plain_yaml() -> ruamel.yaml.YAML:
+    """
+    YAML object for writing new files and vars.yaml, which aren't templated
+    """
+    yaml = ruamel.yaml.YAML()
+    yaml.Representer = NonAliasingRTRepresenter
+    yaml.preserve_quotes = True
+    yaml.explicit_start = True
+    yaml.indent(offset=2, sequence=4)
+    return yaml
+
+
+def _process_yaml(plain: bool = False) -> ruamel.yaml.YAML:
+    """
+    YAML object of each kind for the calling thread. ruamel keeps reader, parser and
+    emitter state on the YAML object between calls, so threads can't share one.
+    """
+    key = "plain" if plain else "templated"
+    if (yaml := getattr(_YAML, key, None)) is None:
+        yaml = create_plain_yaml() if plain else create_yaml()
+        setattr(_YAML, key, yaml)
+    return yaml
+
+
+def parse_file(content_raw: bytes) -> Any:
+    """
+    Parse raw file content, used by worker processes and threads which keep one YAML
+    object each
+    """
+    return _process_yaml().load(content_raw.decode())
+
+
+def dump_section(
+    file_path: str,
+    section: "RepoConfigSection",
+    yaml: Optional[ruamel.yaml.YAML] = None,
+) -> str:
+    """
+    YAML text of a section as it is committed. Existing files are written as templated
+    YAML, new files and vars.yaml as plain YAML.
+    """
+    yaml_string = StringIO()
+    if not section.new_file and Path(file_path).parts[-1] != "vars.yaml":
+        (yaml or _process_yaml()).dump(section.content, yaml_string)
+    else:
+        _process_yaml(plain=True).dump(section.content, yaml_string)
+    return yaml_string.getvalue()
+
+
+def _snapshot(content: Any) -> str:
+    return json.dumps(content, sort_keys=True, default=str)
+
+
+def edit_file(
+    file_path: str, content_raw: Union[bytes, bool], edit: Callable[..., Any]
+) -> Tuple[str, Optional[str], Dict[str, float], Optional[str]]:
+    """
+    Parse, edit and dump one file, run in worker processes by
+    RepoConfigInterface.bulk_edit. Returns the file path, the new file content (None if
+    the edit didn't change anything), time spent per phase and an error if any.
+    """
+    timings = {"parse": 0.0, "edit": 0.0, "dump": 0.0}
+    try:
+        start = monotonic()
+        content = parse_file(content_raw) if content_raw else None
+        section = RepoConfigSection(
+            hostname=Path(file_path).parts[-2],
+            path=list(content.keys())[0] if content else None,
+            content=content,
+            new_file=not content_raw,
+        )
+        before = _snapshot(section.content)
+        timings["parse"] = monotonic() - start
+        start = monotonic()
+        edit(section)
+        timings["edit"] = monotonic() - start
+        if section.content is None or _snapshot(section.content) == before:
+            return file_path, None, timings, None
+        start = monotonic()
+        dumped = dump_section(file_path, section)
+        timings["dump"] = monotonic() - start
+        return file_path, dumped, timings, None
+    except Exception as err:
+        return file_path, None, timings, f"{type(err).__name__}: {err}"
+
+
+def _picklable(function: Callable[..., Any]) -> bool:
+    try:
+        pickle.dumps(function)
+    except Exception:
+        return False
+    return True
+
+
+@dataclass
+class BulkEditResult:
+    """
+    changed: Paths of files changed by the edit, in commit order
+    unchanged: Number of selected files the edit left as they were
+    failed: Error per path for files that failed to parse, edit or dump
+    committed: Whether the changed files were committed
+    timings: Seconds per phase. select, fetch, process and commit are wall clock,
+        parse, edit and dump are summed over all files
+    """
+
+    changed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)
+    committed: bool = False
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
 class RepoConfigInterface:
     """
     Class for interacting with a repo and populating data in a readable format.
@@ -83,8 +233,9 @@ class RepoConfigInterface:
     def __init__(
         self,
         branch: Union[bool, str] = False,
+        odb: bool = False,
     ):
-        self.repo = self._populate_repo(branch)
+        self.repo = self._populate_repo(branch, odb)
         self.yaml = self._create_yaml_object()
         self.content_map: Dict[str, RepoConfigSection] = {}
         self.repo_objects = self.repo.list_objects()
@@ -107,12 +258,7 @@ class RepoConfigInterface:
         """
         Setup a global YAML object for use in reading and writing
         """
-        yaml = ruamel.yaml.YAML(typ="jinja2")
-        yaml.Representer = NonAliasingRTRepresenter
-        yaml.preserve_quotes = True
-        yaml.explicit_start = True
-        yaml.indent(offset=2, sequence=4)
-        return yaml
+        return create_yaml()
 
     def _populate_vault(self) -> None:
         """
@@ -123,6 +269,8 @@ class RepoConfigInterface:
                 "ANANKE_CONFIG environment variable must be set to build vault. To "
                 "run without vault set the ANANKE_CONFIG_PAT environment variable."
             )
+        from ananke.struct.vault import SECRET_TTL, Vault  # type: ignore
+
         vault_secret = os.environ.get("ANANKE_VAULT_SECRET")
         if not vault_secret:
             raise ValueError("ANANKE_VAULT_SECRET env var must be set")
@@ -134,15 +282,18 @@ class RepoConfigInterface:
             url=settings["vault"]["url"],
             mount_point=settings["vault"]["mount-point"],
             paths=["network/pipeline"],
+            ttl=settings["vault"].get("cache-ttl", SECRET_TTL),
         )
 
-    def _populate_repo(self, branch: Union[bool, str]) -> Union[GitLabRepo, LocalRepo]:
+    def _populate_repo(
+        self, branch: Union[bool, str], odb: bool = False
+    ) -> Union[GitLabRepo, LocalRepo]:
         """
         Populates self.repo with an instantiated GitLabRepo/LocalRepo instance.
 
         If REPO_TARGET is only numbers we assume it's a GitLab project ID and therefore
         instantiate a GitLabRepo instance, otherwise we assume it's a path and use
-        LocalRepo.
+        LocalRepo, in object database mode if odb is set.
         """
         if not REPO_TARGET:
             raise ValueError(
@@ -151,7 +302,9 @@ class RepoConfigInterface:
             )
         if not os.environ.get("ANANKE_CONFIG_PAT"):
             self._populate_vault()
-            config_pat = self.vault.keys.get("ANANKE_CONFIG_PAT")
+            config_pat = self.vault.resolve(["ANANKE_CONFIG_PAT"]).get(
+                "ANANKE_CONFIG_PAT"
+            )
         else:
             config_pat = os.environ["ANANKE_CONFIG_PAT"]
         if not config_pat:
@@ -174,7 +327,7 @@ class RepoConfigInterface:
             logger.info(
                 "Initializing local repo for path {target}".format(target=REPO_TARGET)
             )
-            return LocalRepo(REPO_TARGET, branch=branch)
+            return LocalRepo(REPO_TARGET, branch=branch, odb=odb)
 
     def populate_content_map(self, file_path: str) -> RepoConfigSection:
         """
@@ -190,14 +343,60 @@ class RepoConfigInterface:
                 "Content map already populated for {}, skipping".format(file_path)
             )
             return self.content_map[file_path]
-        hostname = Path(file_path).parts[-2]
         content_raw = self.repo.get_file(path=file_path, create=True)
-        if not content_raw:
-            content = self.content_map[file_path] = RepoConfigSection(
+        content = self.yaml.load(content_raw.decode()) if content_raw else None
+        return self._add_section(file_path, content)
+
+    def populate_content_maps(
+        self,
+        file_paths: List[str],
+        max_workers: int = 16,
+        parse_workers: Optional[int] = None,
+    ) -> Dict[str, RepoConfigSection]:
+        """
+        Batch version of populate_content_map for many files. Files are fetched
+        concurrently with at most max_workers requests in flight (or from a single
+        repository archive for large sets on GitLab) and parsed in parallel processes
+        once there are at least PARALLEL_PARSE_THRESHOLD of them. Returns the
+        RepoConfigSection objects by file path.
+        """
+        missing = [
+            path for path in dict.fromkeys(file_paths) if path not in self.content_map
+        ]
+        logger.info(
+            "Fetching {count} files, {cached} already in content map".format(
+                count=len(missing), cached=len(set(file_paths)) - len(missing)
+            )
+        )
+        files = self.repo.get_files(missing, max_workers=max_workers)
+        existing = [path for path in missing if files[path]]
+        if len(existing) >= PARALLEL_PARSE_THRESHOLD:
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=parse_workers
+            ) as executor:
+                contents = list(
+                    executor.map(
+                        parse_file, [files[path] for path in existing], chunksize=16
+                    )
+                )
+        else:
+            contents = [self.yaml.load(files[path].decode()) for path in existing]
+        parsed = dict(zip(existing, contents))
+        for path in missing:
+            self._add_section(path, parsed.get(path))
+        return {path: self.content_map[path] for path in file_paths}
+
+    def _add_section(self, file_path: str, content: Any) -> RepoConfigSection:
+        """
+        Add a RepoConfigSection for parsed file content to content_map, content None
+        meaning the file doesn't exist yet
+        """
+        hostname = Path(file_path).parts[-2]
+        if content is None:
+            self.content_map[file_path] = RepoConfigSection(
                 hostname=hostname, path=None, content=None, new_file=True
             )
         else:
-            content = self.yaml.load(content_raw.decode())
             keys = list(content.keys())
             if len(keys) > 1:
                 logger.warning(
@@ -241,21 +440,10 @@ class RepoConfigInterface:
     ) -> None:
         actions = []
         for file_path, config_object in self.content_map.items():
-            yaml_string = StringIO()
             # skip empty commits
             if not config_object.changed:
                 continue
-            if not config_object.new_file and Path(file_path).parts[-1] != "vars.yaml":
-                self.yaml.dump(config_object.content, yaml_string)
-            # need non-j2 YAML for new files and vars.yaml
-            else:
-                yaml = ruamel.yaml.YAML()
-                yaml.Representer = NonAliasingRTRepresenter
-                yaml.preserve_quotes = True
-                yaml.explicit_start = True
-                yaml.indent(offset=2, sequence=4)
-                yaml.dump(config_object.content, yaml_string)
-            content = yaml_string.getvalue()
+            content = dump_section(file_path, config_object, self.yaml)
             actions.append(
                 {
                     "file_path": file_path,
@@ -273,3 +461,141 @@ class RepoConfigInterface:
             commit_message=commit_message,
             actions=actions,
         )
+
+    def overlay(self, config_prefix: str = "network-elements") -> Overlay:
+        """
+        Changed files in the content_map as an overlay on the config repo in
+        ANANKE_CONFIG. config_prefix is the directory of the config repo within the
+        repo the config API works on.
+        """
+        files = {}
+        for file_path, section in self.content_map.items():
+            if not section.changed:
+                continue
+            path = Path(file_path).relative_to(config_prefix)
+            files[str(path)] = dump_section(file_path, section, self.yaml)
+        return Overlay(files, CONFIG_DIR)
+
+    def preview(
+        self,
+        targets: Optional[List[str]] = None,
+        config_prefix: str = "network-elements",
+    ) -> Dict[str, List[PackChange]]:
+        """
+        Render the devices affected by the uncommitted changes in the content_map (or
+        the given devices) and return their changed config packs, see
+        ananke.struct.overlay.preview
+        """
+        return preview(self.overlay(config_prefix), targets)
+
+    def select(
+        self, selector: Union[str, List[str], Callable[[Path], bool]]
+    ) -> List[str]:
+        """
+        File paths for a selector, which is either a list of paths, a glob pattern
+        matched against repo files (e.g. network-elements/devices/*/ntp.yaml) or a
+        function taking a repo file path and returning whether to select it
+        """
+        if isinstance(selector, list):
+            return selector
+        files = [
+            object for object in self.repo_objects if object.suffix in [".j2", ".yaml"]
+        ]
+        if isinstance(selector, str):
+            return [str(path) for path in files if fnmatch(str(path), selector)]
+        return [str(path) for path in files if selector(path)]
+
+    def bulk_edit(
+        self,
+        selector: Union[str, List[str], Callable[[Path], bool]],
+        edit: Callable[[RepoConfigSection], Any],
+        commit_message: str = "Automated commit",
+        author_name: str = "DV Network Configurator",
+        author_email: str = "network@doubleverify.com",
+        max_workers: int = 16,
+        parse_workers: Optional[int] = None,
+        allow_partial: bool = False,
+    ) -> BulkEditResult:
+        """
+        Apply an edit to many files and commit the files it changed in one commit.
+        edit gets the RepoConfigSection of each selected file and modifies its content
+        (or assigns content for files that don't exist yet), either directly or through
+        a binding with export_binding(). Files are fetched concurrently, then parsed,
+        edited and dumped in worker processes once there are at least
+        PARALLEL_PARSE_THRESHOLD of them. For that edit has to be picklable (a module
+        level function or a functools.partial of one), other edits run in threads.
+
+        If any file fails, nothing is committed, so a change is never applied to only
+        part of the selection. With allow_partial the files that were edited are
+        committed anyway. Check result.failed and result.committed.
+
+        The content_map is neither used nor changed.
+        """
+        if not self.repo.branch_name:
+            raise ValueError("Cannot commit without creating branch first")
+        result = BulkEditResult()
+        start = monotonic()
+        file_paths = list(dict.fromkeys(self.select(selector)))
+        result.timings["select"] = monotonic() - start
+        start = monotonic()
+        files = self.repo.get_files(file_paths, max_workers=max_workers)
+        result.timings["fetch"] = monotonic() - start
+        start = monotonic()
+        arguments = ([files[path] for path in file_paths], [edit] * len(file_paths))
+        executor: concurrent.futures.Executor
+        if len(file_paths) >= PARALLEL_PARSE_THRESHOLD and _picklable(edit):
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=parse_workers)
+            edited = executor.map(edit_file, file_paths, *arguments, chunksize=16)
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+            edited = executor.map(edit_file, file_paths, *arguments)
+        actions = []
+        with executor:
+            for file_path, content, timings, error in edited:
+                for phase, seconds in timings.items():
+                    result.timings[phase] = result.timings.get(phase, 0.0) + seconds
+                if error:
+                    logger.error(
+                        "Could not edit {path}: {error}".format(
+                            path=file_path, error=error
+                        )
+                    )
+                    result.failed[file_path] = error
+                elif content is None:
+                    result.unchanged += 1
+                else:
+                    result.changed.append(file_path)
+                    actions.append(
+                        {
+                            "file_path": file_path,
+                            "action": "update" if files[file_path] else "create",
+                            "content": content,
+                            "author_email": author_email,
+                            "author_name": author_name,
+                        }
+                    )
+        result.timings["process"] = monotonic() - start
+        start = monotonic()
+        if result.failed and not allow_partial:
+            logger.error(
+                "Not committing bulk edit, {failed} of {selected} files failed".format(
+                    failed=len(result.failed), selected=len(file_paths)
+                )
+            )
+        elif actions:
+            self.repo.bulk_commit(commit_message=commit_message, actions=actions)
+            result.committed = True
+        result.timings["commit"] = monotonic() - start
+        logger.info(
+            "Bulk edit: {changed} changed, {unchanged} unchanged, {failed} failed, "
+            "{timings}".format(
+                changed=len(result.changed),
+                unchanged=result.unchanged,
+                failed=len(result.failed),
+                timings=", ".join(
+                    f"{phase} {seconds:.2f}s"
+                    for phase, seconds in result.timings.items()
+                ),
+            )
+        )
+        return result
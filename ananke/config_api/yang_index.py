@@ -0,0 +1,257 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# path segment like protocol[identifier=BGP][name=BGP], values may contain / (prefixes)
+SEGMENT = re.compile(r"(?P<name>[^/\[\]]+)(?P<predicates>(?:\[[^\]=]+=[^\]]*\])*)")
+PREDICATE = re.compile(r"\[(?P<key>[^\]=]+)=(?P<value>[^\]]*)\]")
+
+KeyValues = Tuple[str, ...]
+
+
+def parse_path(path: str) -> List[Tuple[str, Dict[str, str]]]:
+    """
+    Split a path like network-instance[name=default]/protocols/protocol[name=BGP] into
+    element names and their key predicates
+    """
+    segments = []
+    position = 0
+    path = path.strip("/")
+    while position < len(path):
+        if not (match := SEGMENT.match(path, position)):
+            raise ValueError(f"Invalid path {path} at position {position}")
+        predicates = {
+            predicate["key"].strip(): predicate["value"].strip()
+            for predicate in PREDICATE.finditer(match["predicates"])
+        }
+        segments.append((match["name"].strip(), predicates))
+        position = match.end() + 1
+    return segments
+
+
+def child_key(container: Dict[str, Any], name: str) -> Optional[str]:
+    """
+    Key of a child element, matching with or without module prefix, e.g. name
+    network-instance finds openconfig-network-instance:network-instance
+    """
+    if name in container:
+        return name
+    for key in container:
+        if isinstance(key, str) and key.split(":")[-1] == name.split(":")[-1]:
+            return key
+    return None
+
+
+class KeyedList:
+    """
+    Hash index over a YANG list (a list of dicts) by its key leaves. The index is built
+    on first lookup and points into the underlying list, which stays the only copy of
+    the data, so round-trip formatting and comments are kept. Lookups and inserts are
+    O(1), deletes look the entry up in O(1) before removing it from the list.
+
+    Changes made to the list directly are detected (a changed length or an entry whose
+    key no longer matches its indexed position) and the index is rebuilt. A miss on an
+    index that is consistent with the list is a real miss, so an entry replaced in place
+    under a new key is only found once the old key was looked up or after refresh().
+    """
+
+    def __init__(self, items: List[Any], keys: Tuple[str, ...]):
+        self.items = items
+        self.keys = keys
+        self.positions: Dict[KeyValues, int] = {}
+        self.length = -1
+        self.rebuilds = 0
+
+    def key_of(self, entry: Any) -> Optional[KeyValues]:
+        if not isinstance(entry, dict) or any(key not in entry for key in self.keys):
+            return None
+        return tuple(str(entry[key]) for key in self.keys)
+
+    def _rebuild(self) -> None:
+        self.positions = {}
+        for position, entry in enumerate(self.items):
+            if (key := self.key_of(entry)) is not None:
+                self.positions.setdefault(key, position)
+        self.length = len(self.items)
+        self.rebuilds += 1
+
+    def refresh(self) -> None:
+        """
+        Rebuild the index on next use, after entries were replaced in place
+        """
+        self.length = -1
+
+    def position(self, values: KeyValues) -> Optional[int]:
+        """
+        Position of the entry with the given key values in the list, or None
+        """
+        values = tuple(str(value) for value in values)
+        if self.length != len(self.items):
+            self._rebuild()
+        position = self.positions.get(values)
+        # only the entry found is checked, a miss on a consistent index is a real miss
+        if position is not None and self.key_of(self.items[position]) != values:
+            self._rebuild()
+            position = self.positions.get(values)
+        return position
+
+    def typed(self, values: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Key values from path predicates typed like the same key of the other entries,
+        so index=0 stays an integer. Without other entries, integers are recognised.
+        """
+        typed: Dict[str, Any] = {}
+        for key, value in values.items():
+            sibling = next(
+                (
+                    entry[key]
+                    for entry in self.items
+                    if isinstance(entry, dict) and key in entry
+                ),
+                None,
+            )
+            if isinstance(sibling, (int, float)) and not isinstance(sibling, bool):
+                try:
+                    typed[key] = type(sibling)(value)
+                except ValueError:
+                    typed[key] = value
+            elif sibling is None and re.fullmatch(r"-?(0|[1-9][0-9]*)", value):
+                typed[key] = int(value)
+            else:
+                typed[key] = value
+        return typed
+
+    def get(self, values: KeyValues) -> Optional[Any]:
+        position = self.position(values)
+        return None if position is None else self.items[position]
+
+    def insert(self, entry: Dict[str, Any]) -> Any:
+        """
+        Add an entry, replacing the entry with the same key values if there is one
+        """
+        if (values := self.key_of(entry)) is None:
+            raise ValueError(f"Entry is missing list keys {self.keys}: {entry}")
+        if (position := self.position(values)) is not None:
+            self.items[position] = entry
+        else:
+            self.items.append(entry)
+            self.positions[values] = self.length
+            self.length += 1
+        return entry
+
+    def delete(self, values: KeyValues) -> bool:
+        """
+        Remove the entry with the given key values, returns whether there was one
+        """
+        if (position := self.position(values)) is None:
+            return False
+        del self.items[position]
+        # positions after the removed entry shift, so the index is rebuilt on next use
+        self.length = -1
+        return True
+
+
+class ContentIndex:
+    """
+    Keyed access to config content by path, e.g.
+
+        index.get("network-instance[name=default]/protocols/protocol[name=BGP]")
+
+    Element names may leave out module prefixes and key values are compared as strings.
+    Created entries get key values typed like their siblings' (see KeyedList.typed).
+    Lists get a KeyedList index on first use, keyed by the leaves in the predicates.
+    """
+
+    def __init__(self, root: Any):
+        self.root = root
+        self.lists: Dict[Tuple[int, Tuple[str, ...]], KeyedList] = {}
+
+    def keyed_list(self, items: List[Any], keys: Tuple[str, ...]) -> KeyedList:
+        """
+        Index of a list by the given keys, built once per list
+        """
+        cached = self.lists.get((id(items), keys))
+        if cached is None or cached.items is not items:
+            cached = self.lists[(id(items), keys)] = KeyedList(items, keys)
+        return cached
+
+    def _step(
+        self, node: Any, name: str, predicates: Dict[str, str], create: bool
+    ) -> Any:
+        if not isinstance(node, dict):
+            return None
+        if (key := child_key(node, name)) is None:
+            if not create:
+                return None
+            key = name
+            node[key] = [] if predicates else {}
+        child = node[key]
+        if not predicates:
+            return child
+        if not isinstance(child, list):
+            return None
+        keyed = self.keyed_list(child, tuple(predicates))
+        entry = keyed.get(tuple(predicates.values()))
+        if entry is None and create:
+            entry = keyed.insert(keyed.typed(predicates))
+        return entry
+
+    def get(self, path: str, default: Any = None) -> Any:
+        """
+        Node at path, or default if any element along the path doesn't exist
+        """
+        node = self.root
+        for name, predicates in parse_path(path):
+            if (node := self._step(node, name, predicates, create=False)) is None:
+                return default
+        return node
+
+    def ensure(self, path: str) -> Any:
+        """
+        Node at path, creating missing containers and list entries along the way.
+        Created list entries only contain their keys.
+        """
+        node = self.root
+        for name, predicates in parse_path(path):
+            if (node := self._step(node, name, predicates, create=True)) is None:
+                raise ValueError(f"{path} runs through a leaf or mismatched list")
+        return node
+
+    def _parent(self, path: str, create: bool) -> Tuple[Any, str, Dict[str, str]]:
+        segments = parse_path(path)
+        name, predicates = segments[-1]
+        if not predicates:
+            raise ValueError(
+                f"{path} does not end in a list entry, e.g. name[key=value]"
+            )
+        parent_path = "/".join(
+            segment + "".join(f"[{k}={v}]" for k, v in keys.items())
+            for segment, keys in segments[:-1]
+        )
+        parent = self.ensure(parent_path) if create else self.get(parent_path)
+        return parent, name, predicates
+
+    def insert(self, path: str, entry: Dict[str, Any]) -> Any:
+        """
+        Add or replace the list entry at a path ending in a list element with key
+        predicates, e.g. .../neighbor[neighbor-address=1.2.3.4]. Key leaves from the
+        predicates are added to the entry if missing. Missing parents are created.
+        """
+        parent, name, predicates = self._parent(path, create=True)
+        if not isinstance(parent, dict):
+            raise ValueError(f"Parent of {path} is not a container")
+        if (key := child_key(parent, name)) is None:
+            key = name
+            parent[key] = []
+        keyed = self.keyed_list(parent[key], tuple(predicates))
+        return keyed.insert({**keyed.typed(predicates), **entry})
+
+    def delete(self, path: str) -> bool:
+        """
+        Remove the list entry at a path ending in a list element with key predicates,
+        returns whether there was one
+        """
+        parent, name, predicates = self._parent(path, create=False)
+        if not isinstance(parent, dict) or (key := child_key(parent, name)) is None:
+            return False
+        keyed = self.keyed_list(parent[key], tuple(predicates))
+        return keyed.delete(tuple(predicates.values()))
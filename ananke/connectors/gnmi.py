@@ -1,15 +1,91 @@
 import json
 import os
+import threading
 from pathlib import Path
 import logging
-from typing import Any, Optional, Literal
+from typing import Any, Dict, Generator, List, Optional, Literal, Union
 from pygnmi import client  # typing: ignore
 from ananke.struct.config import Config, ConfigPack
 from ananke.connectors.shared import Connector, get_password
+from ananke.connectors.retry import call_with_retries
+from ananke.struct.delta import (
+    compute_delta,
+    descend,
+    merge,
+    nest,
+    split_path,
+    strip_origin,
+)
 
 
 logger = logging.getLogger(__name__)
 
+# connected sessions kept per target by long-running processes, see persistent_sessions
+SESSIONS: Dict[str, "PersistentSession"] = {}
+_SESSIONS_LOCK = threading.Lock()
+PERSISTENT = False
+
+
+class PersistentSession:
+    """
+    gNMI client that connects on first use and stays connected, so the gRPC channel is
+    reused across with blocks instead of being set up for every call
+    """
+
+    def __init__(self, **target_dict: Any):
+        self.client = client.gNMIclient(**target_dict)
+        self.connected = False
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> Any:
+        with self.lock:
+            if not self.connected:
+                self.client.connect()
+                self.connected = True
+        return self.client
+
+    def __exit__(self, *args: Any) -> None:
+        pass
+
+    def close(self) -> None:
+        with self.lock:
+            if self.connected:
+                self.client.close()
+                self.connected = False
+
+
+def persistent_sessions(enabled: bool = True) -> None:
+    """
+    Keep gNMI sessions connected across GnmiDevice instances in this process. Only
+    useful for long-running processes such as ananke serve, which run devices in
+    threads as channels can't be shared with other processes.
+    """
+    global PERSISTENT
+    PERSISTENT = enabled
+    if not enabled:
+        close_sessions()
+
+
+def close_sessions() -> None:
+    with _SESSIONS_LOCK:
+        sessions = list(SESSIONS.values())
+        SESSIONS.clear()
+    for session in sessions:
+        session.close()
+
+
+def get_session(target_dict: Dict[str, Any]) -> Any:
+    """
+    Session for a target, shared and kept connected if persistent sessions are enabled
+    """
+    if not PERSISTENT:
+        return client.gNMIclient(**target_dict)
+    key = json.dumps(target_dict, sort_keys=True, default=str)
+    with _SESSIONS_LOCK:
+        if (session := SESSIONS.get(key)) is None:
+            session = SESSIONS[key] = PersistentSession(**target_dict)
+        return session
+
 
 class GnmiDevice(Connector):
     """
@@ -34,7 +110,7 @@ class GnmiDevice(Connector):
             self.target_dict["path_cert"] = cert
         else:
             self.target_dict["insecure"] = True
-        self.session = client.gNMIclient(**self.target_dict)
+        self.session = get_session(self.target_dict)
         logger.info(
             "Creating GnmiDevice instance for {username}@{target_id}:{port} "
             "with cert {cert}. TLS server name override: {tls_server}".format(
@@ -82,32 +158,67 @@ class GnmiDevice(Connector):
         logger.debug(
             "Pushing config with set: {config_pack}".format(config_pack=config_pack)
         )
-        with self.session as session:
+        if config_pack.write_method == "delta":
+            delta = compute_delta(
+                config_pack.path,
+                self._running_config(config_pack.path),
+                config_pack.content,
+            )
+            logger.info(
+                "Delta for {target} {path}: {updates} updates, {replaces} replaces, "
+                "{deletes} deletes".format(
+                    target=self.target_id,
+                    path=config_pack.path,
+                    updates=len(delta.updates),
+                    replaces=len(delta.replaces),
+                    deletes=len(delta.deletes),
+                )
+            )
+            if not delta:
+                return None
+            kwargs = delta.set_kwargs()
+        else:
             kwargs = {
                 config_pack.write_method: [(config_pack.path, config_pack.content)]
             }
-            try:
-                return session.set(**kwargs)
-            except client.gNMIException as gnmi_error:
-                if (
-                    "'YANG framework' detected the 'fatal' condition 'Operation failed'"
-                    in str(gnmi_error)
-                ):
-                    logger.warning("Caught gNMI exception, trying again...")
-                    return session.set(**kwargs)
+        with self.session as session:
+            return call_with_retries(
+                lambda: session.set(**kwargs),
+                self.retry_policies,
+                description=f"{self.target_id} {config_pack.path}",
+            )
+
+    def _running_config(self, path: str) -> Any:
+        """
+        Get running config at a path as a single content structure. Devices may return
+        several notifications for deeper (or shallower) paths than the one requested,
+        so these are nested/descended to the requested path and merged.
+        """
+        response = self._get_config(path=path, operational=False)
+        requested = split_path(strip_origin(path))
+        content = None
+        for notification in response.get("notification", []):
+            for update in notification.get("update") or []:
+                elements = split_path(strip_origin(update["path"]))
+                if len(elements) >= len(requested):
+                    value = nest(elements[len(requested) :], update["val"])
                 else:
-                    raise client.gNMIException(gnmi_error)
+                    value = descend(update["val"], requested[len(elements) :])
+                content = value if content is None else merge(content, value)
+        return content
 
-    def _get_config(self, path: str, operational: bool) -> Any:
+    def _get_config(self, path: Union[str, List[str]], operational: bool) -> Any:
         """
         Get config method
         Args:
-            path: gNMI path to get config from
+            path: gNMI path, or list of paths sent in a single GetRequest, to get
+                config from
         """
+        paths = [path] if isinstance(path, str) else path
         with self.session as session:
             if operational:
-                return session.get(path=[path])
-            return session.get(path=[path], datatype="config")
+                return session.get(path=paths)
+            return session.get(path=paths, datatype="config")
 
     def _get_capabilities(self) -> Any:
         """
@@ -134,6 +245,26 @@ class GnmiDevice(Connector):
     #         transform_func=self._transform_config if self.config_transform else None,
     #     )
 
+    def iter_config(
+        self, paths: List[str], operational: bool = False
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        Get config for several paths with a single GetRequest, yielding updates one by
+        one with the path prefix and notification timestamp folded in
+        """
+        content = self._get_config(path=paths, operational=operational)
+        for notification in content.get("notification", []):
+            prefix = notification.get("prefix")
+            for update in notification.get("update") or []:
+                path = update.get("path", "")
+                if prefix:
+                    path = prefix.rstrip("/") + "/" + path if path else prefix
+                yield {
+                    "path": path,
+                    "timestamp": notification.get("timestamp"),
+                    "val": update.get("val"),
+                }
+
     def get_config(
         self,
         path: str,
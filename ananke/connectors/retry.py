@@ -0,0 +1,136 @@
+import re
+import random
+import logging
+from time import sleep
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# gRPC status codes that indicate the device or network is overloaded rather than the
+# request being bad
+CONGESTION_ERRORS = ["RESOURCE_EXHAUSTED", "DEADLINE_EXCEEDED", "UNAVAILABLE"]
+GRPC_STATUS_CODES = re.compile(
+    r"\b(CANCELLED|UNKNOWN|INVALID_ARGUMENT|DEADLINE_EXCEEDED|NOT_FOUND|"
+    r"ALREADY_EXISTS|PERMISSION_DENIED|RESOURCE_EXHAUSTED|FAILED_PRECONDITION|"
+    r"ABORTED|OUT_OF_RANGE|UNIMPLEMENTED|INTERNAL|UNAVAILABLE|DATA_LOSS|"
+    r"UNAUTHENTICATED)\b"
+)
+
+
+@dataclass
+class RetryPolicy:
+    """
+    error_class: gRPC status code name (e.g. UNAVAILABLE) the policy applies to
+    match: Optional regex matched against the error text, the policy applies if either
+        the error class or the regex matches
+    attempts: Number of retries after the initial attempt
+    base_delay: Base delay in seconds for exponential backoff
+    max_delay: Upper bound for the backoff delay in seconds
+    """
+
+    error_class: Optional[str] = None
+    match: Optional[str] = None
+    attempts: int = 1
+    base_delay: float = 0
+    max_delay: float = 30
+
+    def applies(self, error_class: str, error: Exception) -> bool:
+        """
+        Whether the policy applies to a given error
+        """
+        if self.error_class and self.error_class == error_class:
+            return True
+        return bool(self.match and re.search(self.match, str(error)))
+
+    def delay(self, attempt: int) -> float:
+        """
+        Exponential backoff with full jitter for a given (zero-based) attempt
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+DEFAULT_RETRY_POLICIES = [
+    RetryPolicy(
+        match="'YANG framework' detected the 'fatal' condition 'Operation failed'",
+        attempts=1,
+    ),
+    RetryPolicy(error_class="UNAVAILABLE", attempts=3, base_delay=1, max_delay=10),
+    RetryPolicy(
+        error_class="RESOURCE_EXHAUSTED", attempts=3, base_delay=2, max_delay=30
+    ),
+    RetryPolicy(error_class="DEADLINE_EXCEEDED", attempts=2, base_delay=2),
+    RetryPolicy(error_class="FAILED_PRECONDITION", attempts=1, base_delay=3),
+]
+
+
+def classify_error(error: Exception) -> str:
+    """
+    Map an error to a gRPC status code name. pygnmi wraps gRPC errors in a
+    gNMIException with the original exception attached, otherwise we fall back to
+    looking for a status code name in the error text.
+    """
+    original = getattr(error, "orig_exc", None) or error
+    if callable(code := getattr(original, "code", None)):
+        try:
+            return code().name
+        except Exception:
+            pass
+    if type(original).__name__ == "FutureTimeoutError":
+        return "DEADLINE_EXCEEDED"
+    if status := GRPC_STATUS_CODES.search(str(error)):
+        return status.groups()[0]
+    return "UNKNOWN"
+
+
+def get_retry_policies(settings: Dict[Any, Any]) -> List[RetryPolicy]:
+    """
+    Build retry policies from the retries section of settings.yaml, or the defaults if
+    none are configured
+    """
+    if not (configured := settings.get("retries")):
+        return DEFAULT_RETRY_POLICIES
+    return [
+        RetryPolicy(
+            error_class=policy.get("error-class"),
+            match=policy.get("match"),
+            attempts=policy.get("attempts", 1),
+            base_delay=policy.get("base-delay", 0),
+            max_delay=policy.get("max-delay", 30),
+        )
+        for policy in configured
+    ]
+
+
+def call_with_retries(
+    func: Callable[[], Any], policies: List[RetryPolicy], description: str = ""
+) -> Any:
+    """
+    Call func, retrying according to the first policy that applies to a raised error.
+    Errors no policy applies to are raised immediately.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as error:
+            error_class = classify_error(error)
+            policy = next(
+                (policy for policy in policies if policy.applies(error_class, error)),
+                None,
+            )
+            if not policy or attempt >= policy.attempts:
+                raise
+            delay = policy.delay(attempt)
+            logger.warning(
+                "Caught {error_class} error for {description}, retrying in {delay:.1f}s "
+                "({attempt}/{attempts})".format(
+                    error_class=error_class,
+                    description=description,
+                    delay=delay,
+                    attempt=attempt + 1,
+                    attempts=policy.attempts,
+                )
+            )
+            sleep(delay)
+            attempt += 1
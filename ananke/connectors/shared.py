@@ -1,15 +1,16 @@
 import os
 import logging
+from time import monotonic
 from pathlib import Path
 from typing import Any, List, Optional, Literal, Union
 from dataclasses import dataclass, field
 from ananke.struct.config import Config, ConfigPack
-from pygnmi.client import gNMIException
+from ananke.connectors.retry import get_retry_policies, classify_error
 
 logger = logging.getLogger(__name__)
 
 
-WRITE_METHODS = Optional[Literal["update", "replace"]]
+WRITE_METHODS = Optional[Literal["update", "replace", "delta"]]
 
 
 @dataclass
@@ -24,6 +25,8 @@ class AnankeResponse:
     messages: List[AnankeResponseMessage] = field(default_factory=list)
     body: List[Any] = field(default_factory=list)
     output: List[Any] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    duration: float = 0
 
 
 def get_password(username: str, variables: Any) -> str:
@@ -98,6 +101,63 @@ def get_connector(target_id: str, config: Config, connector_cls: Any) -> Any:
     return connector
 
 
+def get_platform_id(variables: Any) -> Optional[str]:
+    """
+    Platform (or service) ID used to pick a transform module
+    """
+    if "platform" in variables:
+        return variables["platform"]["os"]
+    if "service-id" in variables:
+        return variables["service-id"]
+    return None
+
+
+def has_transform(settings: Any, variables: Any) -> bool:
+    """
+    Whether a device/service has a transform module defined. Module functions rather
+    than Connector methods so packs can be transformed offline without a connector.
+    """
+    if "transforms" not in settings or not settings["transforms"].get(
+        "module-directory"
+    ):
+        return False
+    transform_modules = [
+        str(file.stem)
+        for file in Path(settings["transforms"]["module-directory"]).glob("*.py")
+        if str(file.stem) != "__init__"
+    ]
+    logger.debug(
+        "Transform modules discovered: {transform_modules}".format(
+            transform_modules=transform_modules
+        )
+    )
+    if not (platform_id := get_platform_id(variables)):
+        return False
+    if platform_id.replace("-", "_") in transform_modules:
+        logger.debug("Transform module matching platform found, marking for transform")
+        return True
+    return False
+
+
+def transform_pack(
+    settings: Any, platform_id: str, pack: ConfigPack
+) -> Optional[ConfigPack]:
+    """
+    Runs pack through the transform module of a platform
+    """
+    module_name = platform_id.replace("-", "_")
+    logger.debug(
+        "Running transform function from {path}/{mod}".format(
+            path=settings["transforms"]["module-directory"], mod=module_name
+        )
+    )
+    import importlib
+
+    transform_module = importlib.import_module(module_name, package=None)
+    transform_function = getattr(transform_module, "transform")
+    return transform_function(pack)
+
+
 class Connector:
     def __init__(self, target_id: str, config: Config):
         self.target_id = target_id
@@ -105,55 +165,20 @@ class Connector:
         self.settings = config.settings
         self.variables = config.variables
         self.config_transform: bool = self.should_transform_config()
+        self.retry_policies = get_retry_policies(self.settings)
 
     def should_transform_config(self) -> bool:
         """
         Inform that queried device/service has a transform module defined
         """
-        if "transforms" not in self.settings or not self.settings["transforms"].get(
-            "module-directory"
-        ):
-            return False
-        transform_modules = [
-            str(file.stem)
-            for file in Path(self.settings["transforms"]["module-directory"]).glob(
-                "*.py"
-            )
-            if str(file.stem) != "__init__"
-        ]
-        logger.debug(
-            "Transform modules discovered: {transform_modules}".format(
-                transform_modules=transform_modules
-            )
-        )
-        if "platform" in self.variables:
-            self.platform_id = self.variables["platform"]["os"]
-        elif "service-id" in self.variables:
-            self.platform_id = self.variables["service-id"]
-        else:
-            return False
-        if self.platform_id.replace("-", "_") in transform_modules:
-            logger.debug(
-                "Transform module matching platform found, marking for transform"
-            )
-            return True
-        return False
+        self.platform_id = get_platform_id(self.variables)
+        return has_transform(self.settings, self.variables)
 
     def _transform_config(self, pack: ConfigPack) -> Optional[ConfigPack]:
         """
         Runs pack through config transform
         """
-        module_name = self.platform_id.replace("-", "_")
-        logger.debug(
-            "Running transform function from {path}/{mod}".format(
-                path=self.settings["transforms"]["module-directory"], mod=module_name
-            )
-        )
-        import importlib
-
-        transform_module = importlib.import_module(module_name, package=None)
-        transform_function = getattr(transform_module, "transform")
-        return transform_function(pack)
+        return transform_pack(self.settings, self.platform_id, pack)
 
     @staticmethod
     def deploy(
@@ -165,16 +190,29 @@ class Connector:
         dispatch executor. Static method so that the ThreadPoolExecutor can run it in a
         map as an uninstantiated method with an instance passed in.
         """
+        # gRPC is only imported once something is deployed
+        from pygnmi.client import gNMIException
+        from grpc import FutureTimeoutError  # type: ignore
+
         logger.debug(
             "Starting deploy process for {}".format(target.connector.target_id)
         )
         response = AnankeResponse(target.connector.target_id)
+        start = monotonic()
+        for path, reason in target.config.rejected.items():
+            response.messages.append(
+                AnankeResponseMessage(
+                    text=f"Config for {path} rejected: {reason}", priority=2
+                )
+            )
         for pack in target.config.packs:
             if write_method:
                 pack.write_method = write_method
+            # content is shared between packs and targets (see ContentPool), so
+            # transforms get a copy to modify
             pack = (
-                target.connector._transform_config(pack)
-                if target.connector.config_transform
+                target.connector._transform_config(pack.writable())
+                if target.connector.config_transform and not target.config.transformed
                 else pack
             )
             if not pack:
@@ -205,15 +243,14 @@ class Connector:
                 else:
                     try:
                         logger.debug("Deploying config pack {}".format(pack.path))
-                        response.output.append(
-                            target.connector._set_config(config_pack=pack)
-                        )
-                        response.messages.append(
-                            AnankeResponseMessage(
-                                text=f"Config for {pack.path} pushed to device"
-                            )
-                        )
-                    except gNMIException as err:
+                        output = target.connector._set_config(config_pack=pack)
+                        response.output.append(output)
+                        text = f"Config for {pack.path} pushed to device"
+                        if output is None and pack.write_method == "delta":
+                            text = f"Config for {pack.path} already in sync"
+                        response.messages.append(AnankeResponseMessage(text=text))
+                    except (gNMIException, FutureTimeoutError) as err:
+                        response.errors.append(classify_error(err))
                         response.messages.append(
                             AnankeResponseMessage(
                                 text=f"Config for {pack.path} failed: Error: {err}",
@@ -222,10 +259,11 @@ class Connector:
                         )
             else:
                 response.messages.append(AnankeResponseMessage(text="Config dry-run"))
+        response.duration = monotonic() - start
         return response
 
 
 @dataclass
 class Target:
-    connector: Union[Connector]
+    connector: Optional[Union[Connector]]
     config: Config
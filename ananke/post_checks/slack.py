@@ -1,4 +1,3 @@
-import requests
 import logging
 from typing import Any, Dict, List, Optional
 
@@ -118,4 +117,6 @@ def post_run_check_notification(
     if check_number == total_checks:
         body["blocks"].append({"type": "divider"})
 
+    import requests
+
     requests.post(url=slack_webhook, json=body)
@@ -1,9 +1,15 @@
+import re
 from dictdiffer import diff  # type: ignore
 from collections import defaultdict
 import concurrent.futures
-from typing import List, Any, Tuple, Optional, Dict, Union
+from time import sleep
+from typing import List, Any, Tuple, Optional, Dict, Union, Set, Generator
 from ananke.post_checks.gnmi.telemetry import subscribe
 from ananke.connectors.shared import Target
+from ananke.struct.config import ConfigPack
+
+INTERFACE_LIST = re.compile(r"(?<=[/:])interfaces/interface(?=/|$)")
+BGP_NEIGHBOR_LIST = re.compile(r"bgp/neighbors/neighbor(?=/|$)")
 
 
 class CheckSubscriber:
@@ -241,6 +247,76 @@ class CheckSubscriber:
         return diffs
 
 
+def touched_objects(packs: List[ConfigPack]) -> Dict[str, Set[str]]:
+    """
+    Walk the given config packs and collect the keys of the objects they touch that we
+    know how to scope a subscription to, namely interface names and BGP neighbor
+    addresses. Keys given in the pack path itself are collected as well.
+    """
+    touched: Dict[str, Set[str]] = {"interfaces": set(), "neighbors": set()}
+
+    def _walk(content: Any) -> None:
+        if isinstance(content, list):
+            for item in content:
+                _walk(item)
+            return
+        if not isinstance(content, dict):
+            return
+        for key, value in content.items():
+            # strip module prefix, e.g. openconfig-interfaces:interface
+            name = str(key).split(":")[-1]
+            if name == "interface" and isinstance(value, list):
+                for interface in value:
+                    if not isinstance(interface, dict):
+                        continue
+                    if if_name := interface.get(
+                        "name", interface.get("interface-name")
+                    ):
+                        touched["interfaces"].add(str(if_name))
+            elif name == "neighbor-address" and not isinstance(value, (dict, list)):
+                touched["neighbors"].add(str(value))
+            _walk(value)
+
+    for pack in packs:
+        touched["interfaces"].update(
+            re.findall(r"interface\[(?:interface-)?name=([^\]]+)\]", pack.path)
+        )
+        touched["neighbors"].update(
+            re.findall(r"neighbor\[neighbor-address=([^\]]+)\]", pack.path)
+        )
+        _walk(pack.content)
+    return touched
+
+
+def scope_paths(paths: List[str], packs: List[ConfigPack]) -> List[str]:
+    """
+    Narrow the configured post check paths down to the objects touched by the given
+    packs. A path listing all interfaces becomes one path per touched interface, and
+    likewise for BGP neighbors. Paths for which nothing could be derived from the packs
+    are kept as they are, so they are still monitored globally.
+    """
+    touched = touched_objects(packs)
+    scoped: List[str] = []
+    for path in paths:
+        if INTERFACE_LIST.search(path) and touched["interfaces"]:
+            scoped.extend(
+                INTERFACE_LIST.sub(f"interfaces/interface[name={name}]", path, count=1)
+                for name in sorted(touched["interfaces"])
+            )
+        elif BGP_NEIGHBOR_LIST.search(path) and touched["neighbors"]:
+            scoped.extend(
+                BGP_NEIGHBOR_LIST.sub(
+                    f"bgp/neighbors/neighbor[neighbor-address={address}]",
+                    path,
+                    count=1,
+                )
+                for address in sorted(touched["neighbors"])
+            )
+        else:
+            scoped.append(path)
+    return scoped
+
+
 def init_check_object(target_dicts: Any, paths: List[str]) -> CheckSubscriber:
     """
     Wrapper to initialize the check object, for use with concurrent.futures
@@ -264,12 +340,23 @@ class StatusCheck:
         self,
         targets: List[Target],
         paths: List[str],
+        scoped: bool = False,
     ):
         self.targets = targets
         self.paths = paths
+        self.scoped = scoped
         self.check_objects: List[CheckSubscriber] = []
         self.init_check_objects()
 
+    def target_paths(self, target: Target) -> List[str]:
+        """
+        Return the paths to subscribe to for a given target. In scoped mode these are
+        narrowed down to the objects touched by the target's config packs.
+        """
+        if not self.scoped:
+            return self.paths
+        return scope_paths(self.paths, target.config.packs)
+
     def init_check_objects(self) -> None:
         """
         Initializes the check objects for each host concurrently
@@ -279,17 +366,88 @@ class StatusCheck:
             for check_object in executor.map(
                 init_check_object,
                 target_dicts,
-                [self.paths] * len(self.targets),
+                [self.target_paths(target) for target in self.targets],
             ):
                 self.check_objects.append(check_object)
 
-    def poll(self, tolerance: Optional[int]) -> Any:
+    def poll(
+        self,
+        tolerance: Optional[int],
+        check_objects: Optional[List[CheckSubscriber]] = None,
+    ) -> Any:
         """
-        Polls each check object and diffs against initial state
+        Polls each check object (or only the given subset) and diffs against initial
+        state
         """
-        self.results = {}
+        if check_objects is None:
+            check_objects = self.check_objects
+            self.results = {}
         with concurrent.futures.ProcessPoolExecutor() as executor:
             for hostname, diffs in executor.map(
-                poll_device, self.check_objects, [tolerance] * len(self.check_objects)
+                poll_device, check_objects, [tolerance] * len(check_objects)
             ):
                 self.results[hostname] = diffs
+
+    def scheduled_poll(
+        self, tolerance: Optional[int], interval: float, count: int
+    ) -> Generator[Tuple[int, Dict[str, List[Any]], bool], None, None]:
+        """
+        Poll all devices a fixed number of times, sleeping interval seconds before each
+        poll. Yields the poll number, the results and whether this was the last poll.
+        """
+        for poll_number in range(count):
+            sleep(interval)
+            self.poll(tolerance=tolerance)
+            yield poll_number, self.results, poll_number == count - 1
+
+    def adaptive_poll(
+        self,
+        tolerance: Optional[int],
+        max_polls: int,
+        min_interval: float = 2,
+        max_interval: float = 60,
+        backoff: float = 2,
+        stable_polls: int = 3,
+    ) -> Generator[Tuple[int, Dict[str, List[Any]], bool], None, None]:
+        """
+        Poll devices until their state has converged. Polling starts at min_interval
+        and backs off towards max_interval while no device changes, dropping back to
+        min_interval as soon as one does. A device is considered converged once
+        stable_polls consecutive polls return the same diffs, after which it is no
+        longer polled. Devices that are still converging are polled until max_polls is
+        reached. Yields the poll number, the results and whether this was the last poll.
+        """
+        self.results = {}
+        self.converged: Set[str] = set()
+        # initial state is the reference, so "no diffs" counts as unchanged
+        previous: Dict[str, List[str]] = defaultdict(list)
+        stable: Dict[str, int] = defaultdict(int)
+        interval = min_interval
+        for poll_number in range(max_polls):
+            sleep(interval)
+            pending = [
+                check_object
+                for check_object in self.check_objects
+                if check_object.target_dict["target"][0] not in self.converged
+            ]
+            self.poll(tolerance=tolerance, check_objects=pending)
+            changed = False
+            for check_object in pending:
+                hostname = check_object.target_dict["target"][0]
+                # device responses aren't ordered, so compare independent of order
+                current = sorted(str(path_diff) for path_diff in self.results[hostname])
+                if current == previous[hostname]:
+                    stable[hostname] += 1
+                else:
+                    stable[hostname] = 0
+                    changed = True
+                previous[hostname] = current
+                if stable[hostname] >= stable_polls:
+                    self.converged.add(hostname)
+            done = len(self.converged) == len(self.check_objects)
+            yield poll_number, self.results, done or poll_number == max_polls - 1
+            if done:
+                return
+            interval = (
+                min_interval if changed else min(interval * backoff, max_interval)
+            )
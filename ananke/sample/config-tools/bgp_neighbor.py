@@ -1,4 +1,3 @@
-from typing import Optional, List, Any
 from ananke.config_api.network_config import RepoConfigInterface, RepoConfigSection
 from ananke.bindings.oc_network_instance import network_instances
 
@@ -70,55 +69,22 @@ class OcBgpNeighborNoBind:
         self, rcs: RepoConfigSection, address: str, description: str, asn: int
     ):
         """
-        Here we skip the rcs.populate_binding() step and instead just refer directly
-        to the config dict in rcs.content
+        Here we skip the rcs.populate_binding() step and instead work directly on the
+        config dict in rcs.content, through rcs.keyed() which finds YANG list entries
+        by their keys
         """
-        ni = rcs.content["openconfig:/network-instances"][
-            "openconfig-network-instance:network-instance"
-        ]
-        default_index = self.get_yang_list_element(
-            yang_list=ni, key="name", match="default"
-        )
-        self.default = ni[default_index]
+        self.content = rcs.keyed()
         self.add(address, description, asn)
+        rcs.changed = True
 
-    @staticmethod
-    def get_yang_list_element(
-        yang_list: List[Any], key: Any, match: Any
-    ) -> Optional[int]:
-        """
-        A common problem with YANG lists is trying to find an element within the list in
-        order to update it. This same pattern needs to be used all over the place so we
-        define a generic one here.
-        Args:
-            yang_list: A YANG list
-            key: Not necessarily the YANG key, but the element within the list that we
-                want to compare against
-            match: The match criteria that we compare with the key
-        Returns:
-            Either the index of the list with our desired element or None if not found
+    def add(self, address: str, description: str, asn: int) -> None:
         """
-        target_index = next(
-            (index for index, item in enumerate(yang_list) if item[key] == match),
-            None,
-        )
-        return target_index
-
-    def add(self, address: str, description: str, asn: str) -> None:
-        """
-        Extremely simple example of a BGP neighbor tool
+        Extremely simple example of a BGP neighbor tool. Missing containers and list
+        entries along the path are created.
         """
-        protocols = self.default["protocols"]["protocol"]
-        bgp_index = self.get_yang_list_element(
-            yang_list=protocols, key="identifier", match="BGP"
+        self.content.insert(
+            "network-instance[name=default]/protocols/"
+            "protocol[identifier=BGP][name=BGP]/bgp/neighbors/"
+            f"neighbor[neighbor-address={address}]",
+            {"config": {"peer-as": asn, "description": description}},
         )
-        bgp = protocols[bgp_index]
-        neighbors = bgp["bgp"]["neighbors"]["neighbor"]
-        neighbor = {
-            "neighbor-address": address,
-            "config": {
-                "peer-as": asn,
-                "description": description,
-            },
-        }
-        neighbors.append(neighbor)
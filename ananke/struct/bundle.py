@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import mmap
+import struct
+import shutil
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+from ananke.struct.config import ConfigPack
+from ananke.struct.plan import TargetPlan
+
+logger = logging.getLogger(__name__)
+
+# File layout: magic, 8 byte big-endian index length, JSON index, then one JSON blob
+# per device. The index maps target IDs to the offset (from the end of the index) and
+# length of their blob, so a single device can be read without parsing the others, and
+# to the path before transform and template files of each pack for matching sections.
+MAGIC = b"ANANKEB1"
+HEADER = struct.Struct(">8sQ")
+
+
+def write_bundle(path: str, plans: Iterable[TargetPlan]) -> Dict[str, Any]:
+    """
+    Write target plans (post-transform packs) to a bundle file and return its index.
+    Blobs are streamed to a temporary file as plans come in, then the header and index
+    are written in front of them.
+    """
+    index: Dict[str, Any] = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "targets": {},
+    }
+    offset = 0
+    with open(f"{path}.data.tmp", "wb") as data:
+        for plan in plans:
+            blob = json.dumps(
+                [
+                    {
+                        "path": pack.path,
+                        "write-method": pack.write_method,
+                        "content": pack.content,
+                        "original-content": pack.original_content,
+                    }
+                    for pack in plan.packs
+                ],
+                default=str,
+            ).encode()
+            data.write(blob)
+            index["targets"][plan.source] = {
+                "offset": offset,
+                "length": len(blob),
+                "digest": hashlib.sha256(blob).hexdigest(),
+                "packs": [
+                    {"path": pack.source_path or pack.path, "files": pack.files}
+                    for pack in plan.packs
+                ],
+            }
+            offset += len(blob)
+    encoded = json.dumps(index, sort_keys=True).encode()
+    with open(f"{path}.tmp", "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(encoded)))
+        file.write(encoded)
+        with open(f"{path}.data.tmp", "rb") as data:
+            shutil.copyfileobj(data, file)
+    os.replace(f"{path}.tmp", path)
+    os.remove(f"{path}.data.tmp")
+    return index
+
+
+class Bundle:
+    """
+    Read access to a bundle file written by write_bundle(). The file is memory-mapped
+    and only the header index is parsed up front, device blobs are parsed on access.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, length = HEADER.unpack(self.mmap[: HEADER.size])
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an ananke build artifact")
+        self.index: Dict[str, Any] = json.loads(
+            self.mmap[HEADER.size : HEADER.size + length]
+        )
+        self.data_offset = HEADER.size + length
+
+    def __enter__(self) -> "Bundle":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.mmap.close()
+
+    @property
+    def targets(self) -> List[str]:
+        return list(self.index["targets"])
+
+    def packs(
+        self, target_id: str, sections: Optional[Set[str]] = None
+    ) -> List[ConfigPack]:
+        """
+        Config packs of a target in deploy order, optionally limited to sections. As
+        in Config, sections ending in .yaml.j2 are template files and resolve to the
+        paths rendered from them, and packs whose path before transform contains one of
+        the resolved sections are selected.
+        """
+        if target_id not in self.index["targets"]:
+            raise KeyError(f"Target {target_id} not found in artifact {self.path}")
+        entry = self.index["targets"][target_id]
+        start = self.data_offset + entry["offset"]
+        blob = self.mmap[start : start + entry["length"]]
+        if hashlib.sha256(blob).hexdigest() != entry["digest"]:
+            raise ValueError(f"Artifact {self.path} is corrupt for target {target_id}")
+        packs = json.loads(blob)
+        sources = entry.get("packs") or [
+            {"path": pack["path"], "files": []} for pack in packs
+        ]
+        resolved = self._resolve_sections(sources, sections or set())
+        return [
+            ConfigPack(
+                path=pack["path"],
+                original_content=pack["original-content"],
+                content=pack["content"],
+                write_method=pack["write-method"],
+            )
+            for pack, source in zip(packs, sources)
+            if not sections or any(section in source["path"] for section in resolved)
+        ]
+
+    @staticmethod
+    def _resolve_sections(
+        sources: List[Dict[str, Any]], sections: Set[str]
+    ) -> Set[str]:
+        """
+        Replace template file names with the paths rendered from them, like
+        Config._resolve_sections
+        """
+        resolved = set()
+        for section in sections:
+            if re.search(r"\.yaml\.j2$", section):
+                resolved.update(
+                    source["path"] for source in sources if section in source["files"]
+                )
+            else:
+                resolved.add(section)
+        return resolved
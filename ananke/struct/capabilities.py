@@ -0,0 +1,148 @@
+import re
+import json
+import logging
+import concurrent.futures
+from time import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from ananke.connectors.shared import Target
+from ananke.connectors.retry import classify_error
+from ananke.struct.util import cache_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 86400
+
+
+def pack_model(path: str) -> Optional[str]:
+    """
+    YANG model a config pack path targets, taken from its origin or the module prefix
+    of its first element, e.g. openconfig for openconfig:/interfaces or
+    Cisco-IOS-XR-um-interface-cfg for Cisco-IOS-XR-um-interface-cfg:/interfaces.
+    Returns None for paths without a prefix (e.g. native paths like /System).
+    """
+    if match := re.match(r"^/?([A-Za-z][\w.-]*):", path):
+        return match.groups()[0]
+    return None
+
+
+def model_supported(model: str, models: List[str]) -> bool:
+    """
+    Whether a model is among a device's supported models. The bare openconfig origin
+    is supported if any openconfig model is.
+    """
+    if model == "openconfig":
+        return any(name.startswith("openconfig-") for name in models)
+    return model in models
+
+
+class CapabilitiesCache:
+    """
+    On-disk cache of device capabilities, one file per device that is refreshed from
+    the device once older than ttl seconds
+    """
+
+    def __init__(self, ttl: int = DEFAULT_TTL, directory: Optional[Path] = None):
+        self.ttl = ttl
+        self.directory = directory or cache_dir("capabilities")
+
+    @classmethod
+    def from_settings(cls, settings: Dict[Any, Any]) -> "CapabilitiesCache":
+        """
+        Build cache from the capabilities section of settings.yaml
+        """
+        capabilities = settings.get("capabilities") or {}
+        return cls(ttl=capabilities.get("ttl", DEFAULT_TTL))
+
+    def _file(self, target_id: str) -> Path:
+        return self.directory / f"{target_id}.json"
+
+    def cached(self, target_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cached capabilities of a device, or None if missing or expired
+        """
+        try:
+            with open(self._file(target_id)) as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if time() - entry["fetched"] > self.ttl:
+            return None
+        return entry["capabilities"]
+
+    def get(self, target: Target, refresh: bool = False) -> Dict[str, Any]:
+        """
+        Capabilities of a target, from the cache unless expired or refresh is set
+        """
+        target_id = target.connector.target_id
+        if not refresh and (capabilities := self.cached(target_id)) is not None:
+            return capabilities
+        capabilities = target.connector.get_capabilities()
+        with open(f"{self._file(target_id)}.tmp", "w") as file:
+            json.dump({"fetched": time(), "capabilities": capabilities}, file)
+        Path(f"{self._file(target_id)}.tmp").replace(self._file(target_id))
+        return capabilities
+
+    def fill(
+        self, targets: List[Target], refresh: bool = False, max_workers: int = 32
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Get capabilities for many targets at once, only contacting the devices whose
+        cache entries are missing or expired. Devices that can't be reached map to None.
+        """
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.get, target, refresh): target.connector.target_id
+                for target in targets
+            }
+            for future in concurrent.futures.as_completed(futures):
+                target_id = futures[future]
+                try:
+                    results[target_id] = future.result()
+                except Exception as err:
+                    logger.warning(
+                        "Could not get capabilities for {target}: {error}".format(
+                            target=target_id, error=str(err) or classify_error(err)
+                        )
+                    )
+                    results[target_id] = None
+        return results
+
+
+def preflight(targets: List[Target], cache: CapabilitiesCache) -> Dict[str, List[str]]:
+    """
+    Check each pack's model against the capabilities of its device and move packs the
+    device doesn't support from the target's config packs to its rejected packs. Packs
+    are checked as they would be sent, i.e. after the platform transform. Devices
+    without known capabilities are left alone. Returns rejected pack paths per target.
+    """
+    capabilities = cache.fill(targets)
+    rejected: Dict[str, List[str]] = {}
+    for target in targets:
+        connector = target.connector
+        if not (device_capabilities := capabilities.get(connector.target_id)):
+            continue
+        models = [
+            model["name"] for model in device_capabilities.get("supported_models", [])
+        ]
+        packs = []
+        for pack in target.config.packs:
+            path = pack.path
+            if connector.config_transform and not target.config.transformed:
+                transformed = connector._transform_config(pack.writable())
+                path = transformed.path if transformed else path
+            model = pack_model(path)
+            if model and not model_supported(model, models):
+                reason = f"model {model} not supported by device"
+                target.config.rejected[pack.path] = reason
+                rejected.setdefault(connector.target_id, []).append(pack.path)
+                logger.warning(
+                    "Rejecting {path} for {target}: {reason}".format(
+                        path=pack.path, target=connector.target_id, reason=reason
+                    )
+                )
+                continue
+            packs.append(pack)
+        target.config.packs = packs
+    return rejected
@@ -0,0 +1,159 @@
+import os
+import gzip
+import json
+import logging
+import concurrent.futures
+from time import monotonic
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Generator, List, Optional
+from ananke.connectors.shared import Target
+from ananke.connectors.retry import classify_error
+from ananke.struct.util import content_hash
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CollectResult:
+    """
+    source: Target ID
+    digest: SHA-256 of the collected content, also the artifact file name
+    artifact: Path of the artifact file
+    changed: Whether the content differs from the last collected artifact
+    duration: Seconds taken to fetch and write the artifact
+    error: Error message if the device could not be collected
+    """
+
+    source: str
+    digest: Optional[str] = None
+    artifact: Optional[str] = None
+    changed: bool = False
+    duration: float = 0
+    error: Optional[str] = None
+
+
+def sort_updates(content: Any) -> Any:
+    """
+    Updates ({"path": ..., "val": ...}) in path order, devices don't always return
+    them in the same order. Other content is returned as is.
+    """
+    if not isinstance(content, list) or not all(
+        isinstance(update, dict) and "path" in update for update in content
+    ):
+        return content
+    return sorted(
+        content,
+        key=lambda update: (str(update["path"]), content_hash(update.get("val"))),
+    )
+
+
+def write_artifact(directory: str, source: str, content: Any) -> CollectResult:
+    """
+    Write content to a gzipped, content-addressed artifact under directory/source.
+    Updates are sorted by path first, so the same updates in another order give the
+    same artifact. Nothing is written if an artifact with the same content exists, and
+    the latest file in the device directory points to the most recent artifact.
+    """
+    content = sort_updates(content)
+    digest = content_hash(content)
+    device_dir = os.path.join(directory, source)
+    artifact = os.path.join(device_dir, f"{digest}.json.gz")
+    latest = os.path.join(device_dir, "latest")
+    result = CollectResult(source=source, digest=digest, artifact=artifact)
+    previous = None
+    if os.path.exists(latest):
+        with open(latest) as file:
+            previous = file.read().strip()
+    result.changed = previous != digest
+    if not os.path.exists(artifact):
+        os.makedirs(device_dir, exist_ok=True)
+        data = json.dumps(content, sort_keys=True, indent=2, default=str).encode()
+        # zero mtime so the same content always compresses to the same bytes
+        with open(f"{artifact}.tmp", "wb") as file:
+            file.write(gzip.compress(data, mtime=0))
+        os.replace(f"{artifact}.tmp", artifact)
+    if result.changed:
+        with open(f"{latest}.tmp", "w") as file:
+            file.write(digest)
+        os.replace(f"{latest}.tmp", latest)
+    return result
+
+
+def collect_target(
+    target: Target, paths: List[str], directory: str, operational: bool = False
+) -> CollectResult:
+    """
+    Get the given paths from a target in a single request and write them to an
+    artifact. Timestamps are left out so unchanged config gives the same artifact.
+    """
+    connector = target.connector
+    start = monotonic()
+    try:
+        content = [
+            {"path": update["path"], "val": update["val"]}
+            for update in connector.iter_config(paths=paths, operational=operational)
+        ]
+        result = write_artifact(directory, connector.target_id, content)
+    except Exception as err:
+        error = str(err) or classify_error(err)
+        logger.warning(
+            "Could not collect {target}: {error}".format(
+                target=connector.target_id, error=error
+            )
+        )
+        result = CollectResult(source=connector.target_id, error=error)
+    result.duration = monotonic() - start
+    return result
+
+
+def concurrent_collect(
+    targets: List[Target],
+    paths: List[str],
+    directory: str,
+    operational: bool = False,
+    max_workers: int = 32,
+) -> Generator[CollectResult, None, None]:
+    """
+    Collect many targets at once, yielding results as they complete
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(collect_target, target, paths, directory, operational)
+            for target in targets
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+def write_manifest(
+    directory: str,
+    results: List[CollectResult],
+    paths: List[str],
+    started: datetime,
+    duration: float,
+) -> Dict[str, Any]:
+    """
+    Write manifest.json describing a collect run to directory and return it
+    """
+    manifest = {
+        "started": started.astimezone(timezone.utc).isoformat(),
+        "duration": round(duration, 3),
+        "paths": paths,
+        "failed": sorted(result.source for result in results if result.error),
+        "changed": sorted(result.source for result in results if result.changed),
+        "targets": {
+            result.source: {
+                "digest": result.digest,
+                "artifact": result.artifact,
+                "changed": result.changed,
+                "duration": round(result.duration, 3),
+                "error": result.error,
+            }
+            for result in sorted(results, key=lambda result: result.source)
+        },
+    }
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
@@ -0,0 +1,69 @@
+import os
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyController:
+    """
+    Additive increase/multiplicative decrease controller for the number of devices
+    being deployed to at once. The limit is raised by one for every deploy that
+    completes with a healthy latency, lowered by one for slow deploys and halved when
+    a deploy reports congestion (timeouts, unavailable or resource exhausted errors).
+
+    Latency is judged against a target latency if one is given, otherwise against a
+    moving average of the latencies seen so far.
+    """
+
+    def __init__(
+        self,
+        initial: Optional[int] = None,
+        minimum: int = 1,
+        maximum: Optional[int] = None,
+        target_latency: Optional[float] = None,
+    ):
+        cpus = os.cpu_count() or 1
+        self.minimum = minimum
+        self.maximum = maximum or cpus * 4
+        self.limit = max(self.minimum, min(initial or cpus, self.maximum))
+        self.target_latency = target_latency
+        self.average_latency: Optional[float] = None
+
+    @classmethod
+    def from_settings(cls, settings: Dict[Any, Any]) -> "ConcurrencyController":
+        """
+        Build controller from the concurrency section of settings.yaml
+        """
+        concurrency = settings.get("concurrency") or {}
+        return cls(
+            initial=concurrency.get("initial"),
+            minimum=concurrency.get("minimum", 1),
+            maximum=concurrency.get("maximum"),
+            target_latency=concurrency.get("target-latency"),
+        )
+
+    def record(self, latency: float, congested: bool = False) -> int:
+        """
+        Record the outcome of a deploy and return the new limit
+        """
+        threshold = self.target_latency
+        if threshold is None and self.average_latency is not None:
+            threshold = self.average_latency * 2
+        if congested:
+            self.limit = max(self.minimum, self.limit // 2)
+        elif threshold is not None and latency > threshold:
+            self.limit = max(self.minimum, self.limit - 1)
+        else:
+            self.limit = min(self.maximum, self.limit + 1)
+        if not congested:
+            self.average_latency = (
+                latency
+                if self.average_latency is None
+                else 0.8 * self.average_latency + 0.2 * latency
+            )
+        logger.debug(
+            "Deploy took {latency:.2f}s (congested: {congested}), concurrency limit now "
+            "{limit}".format(latency=latency, congested=congested, limit=self.limit)
+        )
+        return self.limit
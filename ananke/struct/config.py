@@ -2,18 +2,98 @@ import jinja2  # type: ignore
 import re
 import json
 import os
+import copy
+import pickle
+import hashlib
 import logging
+from functools import lru_cache
+from jinja2 import meta  # type: ignore
 from pathlib import Path, PosixPath
 from ruamel.yaml import YAML  # type: ignore
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from collections import defaultdict
-from typing import Any, Tuple, Dict, List, Set, Literal
+from typing import (
+    Any,
+    Tuple,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Literal,
+    TYPE_CHECKING,
+)
+from ananke.struct.util import cache_dir, content_hash
+from ananke.struct.content_pool import CONTENT_POOL
+from ananke.struct.structured import (
+    is_structured,
+    render_structured,
+    structured_variables,
+)
+
+if TYPE_CHECKING:
+    from ananke.struct.overlay import Overlay
 
 CONFIG_PACK = Tuple[str, Any]
 CONFIG_DIR = os.environ.get("ANANKE_CONFIG")
 
 logger = logging.getLogger(__name__)
 
+# shared so templates are only compiled once per process, jinja2 recompiles a template
+# if its file changes
+ENVIRONMENT = jinja2.Environment(loader=jinja2.FileSystemLoader("/"))
+TEMPLATE_DEPENDENCIES: Dict[str, Tuple[Dict[str, int], Any]] = {}
+
+
+@lru_cache(maxsize=None)
+def template_files(config_dir: str) -> Tuple[PosixPath, ...]:
+    """
+    All template files in the config repo, scanned once per process
+    """
+    return tuple(Path(config_dir).rglob("*.yaml.j2"))
+
+
+def template_dependencies(file: str) -> Optional[Tuple[List[str], Set[str], str]]:
+    """
+    Templates a template file depends on (itself and anything it includes, imports or
+    extends, recursively), the variables they reference and a digest of their sources.
+    Returns None if the dependencies can't be determined statically, e.g. for an
+    include with a variable name. Results are kept per process until one of the
+    templates changes.
+    """
+    if file in TEMPLATE_DEPENDENCIES:
+        mtimes, dependencies = TEMPLATE_DEPENDENCIES[file]
+        try:
+            if all(
+                os.stat(name).st_mtime_ns == mtime for name, mtime in mtimes.items()
+            ):
+                return dependencies
+        except OSError:
+            pass
+    templates: List[str] = []
+    variables: Set[str] = set()
+    digest = hashlib.sha256()
+    mtimes = {}
+    pending = [file]
+    while pending:
+        name = pending.pop()
+        if name in templates:
+            continue
+        source, filename, _ = ENVIRONMENT.loader.get_source(ENVIRONMENT, name)
+        templates.append(name)
+        mtimes[filename] = os.stat(filename).st_mtime_ns
+        digest.update(f"{name}\0{source}\0".encode())
+        ast = ENVIRONMENT.parse(source)
+        variables |= meta.find_undeclared_variables(ast)
+        for referenced in meta.find_referenced_templates(ast):
+            if referenced is None:
+                TEMPLATE_DEPENDENCIES[file] = (mtimes, None)
+                return None
+            pending.append(referenced)
+    dependencies = (templates, variables, digest.hexdigest())
+    TEMPLATE_DEPENDENCIES[file] = (mtimes, dependencies)
+    return dependencies
+
 
 @dataclass
 class ConfigPack:
@@ -22,15 +102,24 @@ class ConfigPack:
     original_content: Original content before transform, sometimes needed late in the
         game for comparison on fields we don't send
     content: Modified content after transform
-    write_method: Either replace or update
+    write_method: Either replace, update or delta (only the differences to the
+        running config)
     """
 
     path: str
     original_content: Any
     content: Any
-    write_method: Literal["replace", "update"] = "replace"
+    write_method: Literal["replace", "update", "delta"] = "replace"
     tags: List[str] = field(default_factory=list)
 
+    def writable(self) -> "ConfigPack":
+        """
+        Copy of the pack whose content can be modified, e.g. by a transform. Content is
+        shared between packs and targets (see ContentPool) and must not be modified in
+        place, original content stays shared.
+        """
+        return replace(self, content=copy.deepcopy(self.content), tags=list(self.tags))
+
 
 class Config:
     """
@@ -44,19 +133,38 @@ class Config:
         settings: Dict[Any, Any],
         variables: Dict[str, str],
         sections: Tuple[str] = (),
+        render: bool = True,
+        overlay: Optional["Overlay"] = None,
+        secret_keys: Iterable[str] = (),
     ):
         if not CONFIG_DIR:
             raise ValueError("ANANKE_CONFIG environment variable must be set")
         self.target_id = target_id.split(".")[0]
         self.settings = settings
         self.variables = variables
+        # variables that came from vault, templates referencing them are never cached
+        self.secret_keys = set(secret_keys)
+        # in-memory files rendered on top of the repo, see ananke.struct.overlay
+        self.overlay = overlay
         self.file_paths = defaultdict(list)
         self.mapping = defaultdict(list)
+        # templates and variables each path was rendered from, see _render()
+        self.dependencies: Dict[str, Dict[str, Set[str]]] = {}
+        self.render_stats = {"rendered": 0, "cached": 0}
         self.roles: List[str] = self._get_device_roles()
-        self.parse_config()
+        self.packs: List[ConfigPack] = []
+        # packs dropped before deploy (e.g. by capabilities preflight), path to reason
+        self.rejected: Dict[str, str] = {}
+        # packs loaded from a build artifact have already been transformed
+        self.transformed = False
+        # without rendering the object only carries settings and variables, which is
+        # all connectors need for read-only operations such as get
+        if render:
+            self.parse_config()
         self.sections = self._resolve_sections(sections)
-        self.merge_paths()
-        self.packs: List[ConfigPack] = self.build_packs()
+        if render:
+            self.merge_paths()
+            self.packs = self.build_packs()
         logger.info(
             "Config object initialized for {target_id} and section {section}".format(
                 target_id=self.target_id, section=self.sections
@@ -95,7 +203,10 @@ class Config:
         Helper method to compute list of files for config. Hostname directory, followed
         by all applicable roles, followed by all, in that order.
         """
-        files = [file for file in Path(CONFIG_DIR).rglob("*.yaml.j2")]
+        if self.overlay:
+            files = self.overlay.template_files()
+        else:
+            files = template_files(CONFIG_DIR)
         host_files = [str(file) for file in files if file.parts[-2] == self.target_id]
         role_files = [str(file) for file in files if file.parts[-2] in self.roles]
         all_files = [str(file) for file in files if file.parts[-2] == "all"]
@@ -131,10 +242,7 @@ class Config:
                         )
                     )
                     continue
-            # render the data using jinja2 with vars from self.variables
-            env = jinja2.Environment(loader=jinja2.FileSystemLoader("/"))
-            template = env.get_template(file)
-            spec = YAML().load(template.render(self.variables))
+            spec = self._render(file)
             if not spec:
                 logger.warning(
                     "No content found in file {file}, skipping".format(file=file)
@@ -142,7 +250,90 @@ class Config:
                 continue
             for path, content in spec.items():
                 self.file_paths[str(Path(file).parts[-1])].append(path)
-                self.mapping[path].append(content)
+                self.mapping[path].append(CONTENT_POOL.intern(content))
+
+    def intern_content(self) -> None:
+        """
+        Intern content into this process' content pool, e.g. after the object has been
+        unpickled from another process
+        """
+        for path, contents in self.mapping.items():
+            self.mapping[path] = [CONTENT_POOL.intern(content) for content in contents]
+        for pack in self.packs:
+            pack.content = CONTENT_POOL.intern(pack.content)
+            pack.original_content = CONTENT_POOL.intern(pack.original_content)
+
+    def _render(self, file: str) -> Any:
+        """
+        Render a template file with self.variables and load the result as YAML. With
+        render-cache enabled in settings.yaml the loaded content is cached on disk,
+        keyed by the template sources (including includes and imports) and the values
+        of the variables they reference, so a template is only rendered again if one
+        of those changed. Templates referencing vault secrets are not cached, nor are
+        templates involving the overlay, which are rendered from memory. The templates
+        and variables that went into each path are recorded in self.dependencies.
+        """
+        if self.overlay and self.overlay.affects(file):
+            self.render_stats["rendered"] += 1
+            source = self.overlay.source(file)
+            if is_structured(file, source):
+                return render_structured(file, self.variables, source)
+            template = self.overlay.environment.get_template(file)
+            return YAML().load(template.render(self.variables))
+        if is_structured(file):
+            self.render_stats["rendered"] += 1
+            spec = render_structured(file, self.variables)
+            self._record_dependencies(spec, [file], structured_variables(file))
+            return spec
+        if not self.settings.get("render-cache") or not (
+            dependencies := template_dependencies(file)
+        ):
+            self.render_stats["rendered"] += 1
+            return YAML().load(ENVIRONMENT.get_template(file).render(self.variables))
+        templates, variables, digest = dependencies
+        if self.secret_keys & variables:
+            # rendered content contains secrets, which are never written to disk
+            self.render_stats["rendered"] += 1
+            spec = YAML().load(ENVIRONMENT.get_template(file).render(self.variables))
+            self._record_dependencies(spec, templates, variables)
+            return spec
+        key = content_hash(
+            {
+                "templates": digest,
+                "variables": {name: self.variables.get(name) for name in variables},
+            }
+        )
+        cache_file = cache_dir("render") / f"{key}.pickle"
+        try:
+            with open(cache_file, "rb") as cached:
+                spec = pickle.load(cached)
+            self.render_stats["cached"] += 1
+            logger.debug("Using cached render of {file}".format(file=file))
+        except (OSError, pickle.UnpicklingError, EOFError):
+            spec = YAML().load(ENVIRONMENT.get_template(file).render(self.variables))
+            temporary = f"{cache_file}.{os.getpid()}.tmp"
+            flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+            with os.fdopen(os.open(temporary, flags, 0o600), "wb") as output:
+                pickle.dump(spec, output)
+            os.replace(temporary, cache_file)
+            self.render_stats["rendered"] += 1
+        self._record_dependencies(spec, templates, variables)
+        return spec
+
+    def _record_dependencies(
+        self, spec: Any, templates: Iterable[str], variables: Set[str]
+    ) -> None:
+        """
+        Record the templates and variables a rendered file depends on for its paths
+        """
+        for path in spec or {}:
+            path_dependencies = self.dependencies.setdefault(
+                path, {"templates": set(), "variables": set()}
+            )
+            path_dependencies["templates"].update(templates)
+            path_dependencies["variables"].update(
+                name for name in variables if name in self.variables
+            )
 
     def merge_paths(self):
         """
@@ -203,7 +394,11 @@ class Config:
                     content, None, None, obj=binding_object
                 )
             self.mapping[path] = [
-                json.loads(pybindJSON.dumps(binding_object, mode="ietf", indent=None))
+                CONTENT_POOL.intern(
+                    json.loads(
+                        pybindJSON.dumps(binding_object, mode="ietf", indent=None)
+                    )
+                )
             ]
             logger.info("Merge complete for path {path}".format(path=path))
 
@@ -220,7 +415,7 @@ class Config:
         packs = [
             ConfigPack(
                 path=path,
-                original_content=dict(content[0]),
+                original_content=content[0],
                 content=content[0],
                 write_method=write_methods.get(path, write_methods["default"]),
             )
@@ -249,7 +444,7 @@ class Config:
                             packs.append(
                                 ConfigPack(
                                     path=path,
-                                    original_content=dict(content[0]),
+                                    original_content=content[0],
                                     content=content[0],
                                     write_method=write_method,
                                 )
@@ -258,7 +453,7 @@ class Config:
                     packs.append(
                         ConfigPack(
                             path=path,
-                            original_content=dict(content[0]),
+                            original_content=content[0],
                             content=content[0],
                             write_method=write_method,
                         )
@@ -0,0 +1,60 @@
+import sys
+import hashlib
+from typing import Any, Dict, Tuple
+
+
+class ContentPool:
+    """
+    Interns config content so that identical subtrees (e.g. role packs rendered for
+    hundreds of devices) are stored once. Content is interned bottom-up by a digest of
+    its structure, and loaded YAML is replaced with plain dicts and lists on the way.
+
+    Interned content is shared and must be treated as read-only, anything that modifies
+    it (i.e. transforms) has to work on a deep copy.
+    """
+
+    def __init__(self):
+        self.nodes: Dict[bytes, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def clear(self) -> None:
+        self.nodes.clear()
+
+    def intern(self, content: Any) -> Any:
+        """
+        Shared instance of content
+        """
+        return self._intern(content)[0]
+
+    def _intern(self, content: Any) -> Tuple[Any, bytes]:
+        if isinstance(content, dict):
+            items = []
+            digest = hashlib.blake2b(b"d", digest_size=16)
+            for key, value in content.items():
+                if isinstance(key, str):
+                    key = sys.intern(str(key))
+                value, value_digest = self._intern(value)
+                items.append((key, value))
+                digest.update(repr(key).encode() + b"\0" + value_digest)
+        elif isinstance(content, list):
+            items = []
+            digest = hashlib.blake2b(b"l", digest_size=16)
+            for value in content:
+                value, value_digest = self._intern(value)
+                items.append(value)
+                digest.update(value_digest)
+        else:
+            if isinstance(content, str):
+                content = sys.intern(str(content))
+            scalar = f"{type(content).__name__}:{content!r}".encode()
+            return content, hashlib.blake2b(scalar, digest_size=16).digest()
+        key = digest.digest()
+        if (node := self.nodes.get(key)) is None:
+            node = self.nodes[key] = dict(items) if isinstance(content, dict) else items
+        return node, key
+
+
+# one pool per process, so content is shared across all Config objects
+CONTENT_POOL = ContentPool()
@@ -0,0 +1,275 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# Common YANG list keys in order of preference, used to match list entries between
+# running and intended config since we don't have the schema at hand. Lists whose
+# entries don't share one of these fall back to the first unique scalar field.
+LIST_KEYS: List[Tuple[str, ...]] = [
+    ("identifier", "name"),
+    ("name",),
+    ("interface-name",),
+    ("neighbor-address",),
+    ("afi-safi-name",),
+    ("af-name",),
+    ("as-number",),
+    ("index",),
+    ("id",),
+    ("ip",),
+    ("prefix",),
+    ("address",),
+    ("sequence-id",),
+    ("set-name",),
+    ("route-policy-name",),
+    ("virtual-router-id",),
+    ("vlan-id",),
+]
+IDENTITY_VALUE = re.compile(r"^[A-Za-z][\w.-]*:[A-Za-z][\w.-]*$")
+
+
+@dataclass
+class Delta:
+    """
+    Minimal set of gNMI operations to get from running to intended config
+    updates: (path, value) pairs for changed leaves and new containers/list entries
+    replaces: (path, value) pairs for leaf-lists and unkeyed lists, which can't be
+        merged element by element
+    deletes: Paths present in running config but not in intended config
+    """
+
+    updates: List[Tuple[str, Any]] = field(default_factory=list)
+    replaces: List[Tuple[str, Any]] = field(default_factory=list)
+    deletes: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.updates or self.replaces or self.deletes)
+
+    def set_kwargs(self) -> Dict[str, List[Any]]:
+        """
+        Keyword arguments for a single gNMI set call
+        """
+        kwargs: Dict[str, List[Any]] = {}
+        if self.updates:
+            kwargs["update"] = self.updates
+        if self.replaces:
+            kwargs["replace"] = self.replaces
+        if self.deletes:
+            kwargs["delete"] = self.deletes
+        return kwargs
+
+
+def local_name(name: Any) -> str:
+    """
+    Strip the module prefix from a key, e.g. openconfig-interfaces:interface
+    """
+    return str(name).split(":")[-1]
+
+
+def canonical_value(value: Any) -> str:
+    """
+    Canonical form of a scalar for comparison. Devices don't agree on types in JSON
+    (e.g. uint64 as string) or on prefixing identity values with their module.
+    """
+    if isinstance(value, bool):
+        return str(value).lower()
+    value = str(value)
+    if IDENTITY_VALUE.match(value):
+        return local_name(value)
+    return value
+
+
+def canonical(content: Any) -> Any:
+    """
+    Canonical form of config content that ignores module prefixes, list order and
+    scalar types
+    """
+    if isinstance(content, dict):
+        return {local_name(key): canonical(value) for key, value in content.items()}
+    if isinstance(content, list):
+        items = [canonical(item) for item in content]
+        return sorted(items, key=lambda item: repr(item))
+    return canonical_value(content)
+
+
+def list_keys(entries: List[Any]) -> Optional[Tuple[str, ...]]:
+    """
+    Figure out the key fields of a YANG list from its entries. Returns None if the list
+    isn't a list of keyed entries (e.g. a leaf-list).
+    """
+    if not entries or not all(isinstance(entry, dict) for entry in entries):
+        return None
+    fields = [
+        {local_name(key): value for key, value in entry.items()} for entry in entries
+    ]
+
+    def _unique(candidate: Tuple[str, ...]) -> bool:
+        if not all(key in entry for entry in fields for key in candidate):
+            return False
+        values = [
+            tuple(canonical_value(entry[key]) for key in candidate) for entry in fields
+        ]
+        return len(set(values)) == len(values)
+
+    for candidate in LIST_KEYS:
+        if _unique(candidate):
+            return candidate
+    for key, value in fields[0].items():
+        if not isinstance(value, (dict, list)) and _unique((key,)):
+            return (key,)
+    return None
+
+
+def _entry_key(entry: Dict[str, Any], keys: Tuple[str, ...]) -> Tuple[str, ...]:
+    fields = {local_name(key): value for key, value in entry.items()}
+    return tuple(canonical_value(fields[key]) for key in keys)
+
+
+def _keyed(entries: Any, keys: Tuple[str, ...]) -> bool:
+    """
+    Whether all entries of a (running) list carry the given keys
+    """
+    if not isinstance(entries, list):
+        return False
+    return all(
+        isinstance(entry, dict)
+        and all(key in map(local_name, entry.keys()) for key in keys)
+        for entry in entries
+    )
+
+
+def _key_path(keys: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    return "".join(f"[{key}={value}]" for key, value in zip(keys, values))
+
+
+def _diff(running: Any, intended: Any, path: str, delta: Delta) -> None:
+    """
+    Recursively diff running against intended content at a given path
+    """
+    if isinstance(intended, dict):
+        if not isinstance(running, dict):
+            delta.updates.append((path, intended))
+            return
+        running_map = {local_name(key): (key, value) for key, value in running.items()}
+        intended_names = set()
+        for key, value in intended.items():
+            intended_names.add(local_name(key))
+            child_path = f"{path}/{key}"
+            if local_name(key) not in running_map:
+                delta.updates.append((child_path, value))
+                continue
+            _diff(running_map[local_name(key)][1], value, child_path, delta)
+        for name, (key, _) in running_map.items():
+            if name not in intended_names:
+                delta.deletes.append(f"{path}/{key}")
+    elif isinstance(intended, list):
+        keys = list_keys(intended)
+        if not keys or not _keyed(running, keys):
+            if canonical(running) != canonical(intended):
+                delta.replaces.append((path, intended))
+            return
+        running_entries = {_entry_key(entry, keys): entry for entry in (running or [])}
+        intended_entries = set()
+        for entry in intended:
+            entry_key = _entry_key(entry, keys)
+            intended_entries.add(entry_key)
+            entry_path = path + _key_path(keys, entry_key)
+            if entry_key not in running_entries:
+                delta.updates.append((entry_path, entry))
+                continue
+            _diff(running_entries[entry_key], entry, entry_path, delta)
+        for entry_key in running_entries:
+            if entry_key not in intended_entries:
+                delta.deletes.append(path + _key_path(keys, entry_key))
+    elif isinstance(running, (dict, list)):
+        delta.updates.append((path, intended))
+    elif canonical_value(running) != canonical_value(intended):
+        delta.updates.append((path, intended))
+
+
+def compute_delta(path: str, running: Any, intended: Any) -> Delta:
+    """
+    Compute the gNMI update/replace/delete operations needed to get from running config
+    to intended config at a given path. List entries are matched on their YANG keys,
+    so only the changed leaves, added/removed entries and removed leaves are sent.
+    """
+    delta = Delta()
+    _diff(running if running is not None else {}, intended, path.rstrip("/"), delta)
+    return delta
+
+
+def split_path(path: str) -> List[Tuple[str, Dict[str, str]]]:
+    """
+    Split a gNMI path (without origin) into its elements and their keys, ignoring
+    slashes inside key values
+    """
+    elements: List[Tuple[str, Dict[str, str]]] = []
+    for element in re.findall(r"(?:[^/\[]|\[[^\]]*\])+", path):
+        name = element.split("[")[0]
+        keys = dict(re.findall(r"\[([^=\]]+)=([^\]]*)\]", element))
+        elements.append((name, keys))
+    return elements
+
+
+def strip_origin(path: str) -> str:
+    """
+    Strip the origin (e.g. openconfig:) and leading slash from a gNMI path
+    """
+    if re.match(r"^[\w.-]+:/", path):
+        path = path.split(":", 1)[1]
+    return path.strip("/")
+
+
+def nest(elements: List[Tuple[str, Dict[str, str]]], value: Any) -> Any:
+    """
+    Wrap a value in the containers and list entries described by path elements, so
+    content returned for a deeper path can be compared to content for a shallower one
+    """
+    for name, keys in reversed(elements):
+        if keys:
+            entry = dict(keys)
+            if isinstance(value, dict):
+                entry.update(value)
+            value = {name: [entry]}
+        else:
+            value = {name: value}
+    return value
+
+
+def descend(value: Any, elements: List[Tuple[str, Dict[str, str]]]) -> Any:
+    """
+    Walk down into content along path elements, the counterpart of nest() for content
+    returned for a shallower path than requested. Returns None if not found.
+    """
+    for name, keys in elements:
+        if not isinstance(value, dict):
+            return None
+        value = next(
+            (child for key, child in value.items() if local_name(key) == name), None
+        )
+        if keys:
+            value = next(
+                (
+                    entry
+                    for entry in value or []
+                    if all(
+                        canonical_value(entry.get(key)) == canonical_value(match)
+                        for key, match in keys.items()
+                    )
+                ),
+                None,
+            )
+    return value
+
+
+def merge(base: Any, addition: Any) -> Any:
+    """
+    Merge content from multiple notifications. Dicts are merged recursively and lists
+    concatenated.
+    """
+    if isinstance(base, dict) and isinstance(addition, dict):
+        for key, value in addition.items():
+            base[key] = merge(base[key], value) if key in base else value
+        return base
+    if isinstance(base, list) and isinstance(addition, list):
+        return base + addition
+    return addition
@@ -1,13 +1,27 @@
 import os
 import logging
 import concurrent.futures
+from functools import cached_property
 from pathlib import Path
 from ruamel.yaml import YAML  # type: ignore
-from typing import Any, Tuple, Dict, List, Optional, Set
-from ananke.struct.config import Config
-from ananke.connectors.gnmi import GnmiDevice
-from ananke.connectors.shared import Connector, AnankeResponse, get_connector, Target
-from ananke.post_checks.telemetry import StatusCheck
+from typing import Any, Tuple, Dict, Generator, List, Optional, Set
+from ananke.struct.config import (
+    Config,
+    ENVIRONMENT,
+    template_dependencies,
+    template_files,
+)
+from ananke.struct.structured import is_structured, structured_variables
+from ananke.struct.bundle import Bundle
+from ananke.connectors.shared import (
+    Connector,
+    AnankeResponse,
+    get_connector,
+    get_connector_credentials,
+    Target,
+)
+from ananke.struct.concurrency import ConcurrencyController
+from ananke.connectors.retry import CONGESTION_ERRORS, classify_error
 
 CONFIG_PACK = Tuple[str, Any]
 CONFIG_DIR = os.environ.get("ANANKE_CONFIG")
@@ -15,6 +29,27 @@ CONFIG_DIR = os.environ.get("ANANKE_CONFIG")
 logger = logging.getLogger(__name__)
 
 
+def build_config(
+    target_id: str,
+    sections: Set[str],
+    settings: Dict[Any, Any],
+    variables: Dict[str, Any],
+    render: bool,
+    secret_keys: Set[str] = set(),
+) -> Config:
+    """
+    Module level so it can be run in a process pool
+    """
+    return Config(
+        target_id=target_id,
+        sections=sections,
+        settings=settings,
+        variables=variables,
+        render=render,
+        secret_keys=secret_keys,
+    )
+
+
 class Dispatch:
     """
     Object for preparing execution. Reads global and target settings and populates
@@ -26,50 +61,229 @@ class Dispatch:
         targets: Dict[Optional[str], Set[str]],
         deploy_tags: List[str] = [],
         post_checks: bool = False,
+        scoped_post_checks: bool = False,
+        render: bool = True,
+        connect: bool = True,
+        artifact: Optional[str] = None,
+        settings: Optional[Dict[Any, Any]] = None,
+        variables: Optional[Dict[str, Any]] = None,
+        secrets: Optional[Dict[str, str]] = None,
+        processes: bool = True,
     ):
-        self.settings = self.get_settings()
-        self.secrets = None
-        self.variables: Dict[str, Any] = self.get_variables()
-        if self.settings["vault"]:
+        # settings, variables and secrets can be handed in by a long-running process
+        # that keeps them (see ananke.struct.service), otherwise they are read here
+        self.settings = settings if settings is not None else self.get_settings()
+        self.secrets = secrets
+        # packs come ready-made from the artifact, so nothing is rendered
+        self.artifact = artifact
+        self.render = render and not artifact
+        self.connect = connect
+        # render and deploy in processes, or in this process and threads
+        self.processes = processes
+        self.variables: Dict[str, Any] = (
+            variables if variables is not None else self.get_variables()
+        )
+        if not self.secrets and self.settings["vault"] and self.needs_secrets():
             self.secrets = self.build_vault()
         parsed_targets = self.parse_targets(targets, self.settings.get("domain-name"))
         self.targets: List[Target] = self.build_targets(
             targets=parsed_targets, deploy_tags=deploy_tags
         )
+        self.deploy_results: List[AnankeResponse] = []
         if post_checks and "dry-run" not in deploy_tags:
-            check_hosts: List[Target] = []
-            for target in self.targets:
-                short_name = target.connector.target_id.split(".")[0]
-                management = self.variables[short_name]["management"]
-                if "disable-set" in management and management["disable-set"]:
-                    continue
-                check_hosts.append(target)
             if "paths" not in self.settings["post-checks"]:
                 raise ValueError("No paths specified for post-checks")
+            from ananke.post_checks.telemetry import StatusCheck
+
             self.post_status = StatusCheck(
-                check_hosts,
+                self.post_check_targets(self.targets),
                 self.settings["post-checks"]["paths"],
+                scoped=scoped_post_checks,
             )
 
-    def concurrent_deploy(self, method: str) -> List[AnankeResponse]:
+    def post_check_targets(self, targets: List[Target]) -> List[Target]:
         """
-        Deploy config for all targets concurrently
+        Filter out targets that post checks should not run against (write disabled)
         """
-        self.deploy_results: List[AnankeResponse] = []
-        iter_len = range(len(self.targets))
-        with concurrent.futures.ProcessPoolExecutor() as executor:
-            for result in executor.map(
-                Connector.deploy,
-                self.targets,
-                [method for _ in iter_len],
-            ):
-                self.deploy_results.append(result)
+        check_hosts: List[Target] = []
+        for target in targets:
+            short_name = target.connector.target_id.split(".")[0]
+            management = self.variables[short_name]["management"]
+            if "disable-set" in management and management["disable-set"]:
+                continue
+            check_hosts.append(target)
+        return check_hosts
+
+    def concurrent_deploy(
+        self, method: str, targets: Optional[List[Target]] = None
+    ) -> List[AnankeResponse]:
+        """
+        Deploy config for all targets, or the given subset of them, concurrently. The
+        number of targets deployed to at once is adjusted by a ConcurrencyController
+        based on deploy latencies and congestion errors.
+        """
+        if targets is None:
+            targets = self.targets
+            self.deploy_results = []
+        controller = ConcurrencyController.from_settings(self.settings)
+        queue = list(targets)
+        results: List[AnankeResponse] = []
+        executor_class: Any = concurrent.futures.ProcessPoolExecutor
+        if not self.processes:
+            executor_class = concurrent.futures.ThreadPoolExecutor
+        with executor_class(max_workers=controller.maximum) as executor:
+            pending: Set[concurrent.futures.Future] = set()
+            while queue or pending:
+                while queue and len(pending) < controller.limit:
+                    pending.add(executor.submit(Connector.deploy, queue.pop(0), method))
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    result = future.result()
+                    controller.record(
+                        result.duration,
+                        congested=any(
+                            error in CONGESTION_ERRORS for error in result.errors
+                        ),
+                    )
+                    results.append(result)
+                    self.deploy_results.append(result)
+        return results
+
+    def concurrent_get(
+        self, paths: List[str], operational: bool = False, max_workers: int = 32
+    ) -> Generator[Tuple[str, Dict[str, Any]], None, None]:
+        """
+        Get paths from all targets concurrently, with one GetRequest per target.
+        Yields (target ID, update) pairs one target at a time as they complete, so only
+        the responses of targets currently being fetched are held in memory. Targets
+        that fail yield a single {"error": ...} entry.
+        """
+
+        from pygnmi.client import gNMIException
+        from grpc import FutureTimeoutError  # type: ignore
+
+        def _get(target: Target) -> List[Dict[str, Any]]:
+            return list(
+                target.connector.iter_config(paths=paths, operational=operational)
+            )
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(_get, target): target.connector.target_id
+                for target in self.targets
+            }
+            for future in concurrent.futures.as_completed(futures):
+                target_id = futures.pop(future)
+                try:
+                    updates = future.result()
+                except (gNMIException, FutureTimeoutError) as err:
+                    # connect timeouts carry no message
+                    error = str(err) or classify_error(err)
+                    logger.warning(
+                        "Get from {target} failed: {error}".format(
+                            target=target_id, error=error
+                        )
+                    )
+                    yield target_id, {"error": error}
+                    continue
+                for update in updates:
+                    yield target_id, update
+
+    def needs_secrets(self) -> bool:
+        """
+        Whether vault secrets are needed. Deploys always read vault, read-only
+        operations that don't render config only need it if it is where the connector
+        credentials come from, and offline operations only if templates reference
+        variables that aren't defined in any vars.yaml.
+        """
+        if self.connect and self.render:
+            return True
+        if self.connect:
+            return not self.environment_credentials()
+        return self.render and self.templates_need_secrets()
+
+    def templates_need_secrets(self) -> bool:
+        """
+        Whether any template references a variable not defined in vars.yaml
+        """
+        if (referenced := self.referenced_variables) is None:
+            logger.debug("Template variables can't be determined, reading vault")
+            return True
+        defined: Set[str] = set(ENVIRONMENT.globals)
+        for device_vars in self.variables.values():
+            defined.update(device_vars or {})
+        if undefined := referenced - defined:
+            logger.debug(
+                "Templates reference undefined variables {undefined}, reading "
+                "vault".format(undefined=sorted(undefined))
+            )
+            return True
+        return False
+
+    @cached_property
+    def referenced_variables(self) -> Optional[Set[str]]:
+        """
+        Variables referenced by the templates in the config repo and anything they
+        include or import, or None if that can't be determined statically (e.g. an
+        include with a variable name)
+        """
+        referenced: Set[str] = set()
+        for file in template_files(CONFIG_DIR):
+            if is_structured(str(file)):
+                referenced |= structured_variables(str(file))
+            elif (dependencies := template_dependencies(str(file))) is not None:
+                referenced |= dependencies[1]
+            else:
+                return None
+        return referenced
+
+    def secret_keys(self, secrets: Dict[str, str] = {}) -> Optional[Set[str]]:
+        """
+        Names of the vault keys this run uses, or None for all of them: variables
+        templates reference when rendering (vault takes precedence over vars.yaml, so
+        also the ones some vars.yaml defines) and connector credentials when
+        connecting. A username read from vault (in secrets) adds its password key.
+        """
+        keys: Set[str] = set()
+        if self.render:
+            if (referenced := self.referenced_variables) is None:
+                return None
+            keys |= referenced
+        if self.connect:
+            usernames = {
+                self.settings.get("username"),
+                os.environ.get("ANANKE_CONNECTOR_USERNAME"),
+                secrets.get("ANANKE_CONNECTOR_USERNAME"),
+            }
+            for device_vars in self.variables.values():
+                usernames.add((device_vars or {}).get("ANANKE_CONNECTOR_USERNAME"))
+            keys |= {"ANANKE_CONNECTOR_USERNAME", "ANANKE_CONNECTOR_PASSWORD"}
+            keys |= {
+                f"ANANKE_CONNECTOR_PASSWORD_{username}"
+                for username in usernames
+                if username
+            }
+        return keys
+
+    def environment_credentials(self) -> bool:
+        """
+        Whether connector credentials can be derived without vault secrets
+        """
+        try:
+            get_connector_credentials({}, self.settings)
+        except ValueError:
+            return False
+        return True
 
     def build_vault(self) -> Dict[str, str]:
         """
-        Instantiate and return vault secrets
+        Instantiate vault and return the secrets this run uses (see secret_keys), so
+        targets only get a copy of those. Tokens and secrets are cached in the process
+        for vault.cache-ttl seconds.
         """
-        from ananke.struct.vault import Vault  # type: ignore
+        from ananke.struct.vault import SECRET_TTL, Vault  # type: ignore
 
         role_id = self.settings["vault"]["role-id"]
         paths = self.settings["vault"]["paths"]
@@ -79,13 +293,20 @@ class Dispatch:
             raise ValueError(
                 "ANANKE_VAULT_SECRET env variable must be populated for vault use"
             )
-        return Vault(
+        vault = Vault(
             vault_role_id=role_id,
             paths=paths,
             url=self.settings["vault"]["url"],
             mount_point=mount_point,
             vault_secret=vault_secret,
-        ).keys
+            ttl=self.settings["vault"].get("cache-ttl", SECRET_TTL),
+        )
+        if (keys := self.secret_keys()) is None:
+            return dict(vault.keys)
+        secrets = vault.resolve(keys)
+        if "ANANKE_CONNECTOR_USERNAME" in secrets:
+            secrets.update(vault.resolve(self.secret_keys(secrets) or ()))
+        return secrets
 
     def build_targets(
         self, targets: Dict[Optional[str], Set[str]], deploy_tags: List[str] = []
@@ -95,29 +316,59 @@ class Dispatch:
         to the target
         """
         target_list = []
-        for target, sections in targets.items():
-            target_vars = self.variables[target.split(".")[0]]
-
-            if self.secrets:
-                target_vars.update(self.secrets)
-            config = Config(
-                target_id=target,
-                sections=sections,
-                settings=self.settings,
-                variables=target_vars,
-            )
+        bundle = Bundle(self.artifact) if self.artifact else None
+        for target, config in zip(targets, self.build_configs(targets)):
+            if bundle:
+                config.packs = bundle.packs(config.target_id, targets[target])
+                config.transformed = True
             # this is kind of a dumb hack, but currently the only use we have for deploy
             # tags is universal to all packs belonging to a Config object, so we just
             # set them here
             for pack in config.packs:
                 pack.tags = deploy_tags
-            connector = get_connector(
-                target_id=target, config=config, connector_cls=GnmiDevice
-            )
+            # offline operations (e.g. validate) only need the rendered config
+            connector = None
+            if self.connect:
+                from ananke.connectors.gnmi import GnmiDevice
+
+                connector = get_connector(
+                    target_id=target, config=config, connector_cls=GnmiDevice
+                )
             target = Target(connector=connector, config=config)
             target_list.append(target)
+        if bundle:
+            bundle.close()
         return target_list
 
+    def build_configs(self, targets: Dict[Optional[str], Set[str]]) -> List[Config]:
+        """
+        Render Config objects for targets. Rendering is CPU bound, so with more than
+        one target it is done in parallel processes.
+        """
+        arguments = []
+        for target, sections in targets.items():
+            target_vars = self.variables[target.split(".")[0]]
+            if self.secrets:
+                target_vars = {**target_vars, **self.secrets}
+            arguments.append(
+                (
+                    target,
+                    sections,
+                    self.settings,
+                    target_vars,
+                    self.render,
+                    set(self.secrets or ()),
+                )
+            )
+        if len(arguments) < 2 or not self.render or not self.processes:
+            return [build_config(*argument) for argument in arguments]
+        with concurrent.futures.ProcessPoolExecutor() as executor:
+            configs = list(executor.map(build_config, *zip(*arguments)))
+        # content is shared within each process, so share it again across targets
+        for config in configs:
+            config.intern_content()
+        return configs
+
     def get_variable_files(self) -> List[Path]:
         """
         Get all variable files
@@ -133,6 +384,16 @@ class Dispatch:
             )
         return variable_paths
 
+    def get_sites(self) -> Dict[str, Optional[str]]:
+        """
+        Map devices to the site (or org unit) directory they live in, if the devices
+        directory is hierarchical
+        """
+        return {
+            file.parts[-2]: (file.parts[-3] if file.parts[-3] != "devices" else None)
+            for file in self.get_variable_files()
+        }
+
     def get_variables(self) -> Dict[str, str]:
         """
         Get local device variables from vars.yaml
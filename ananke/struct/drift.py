@@ -0,0 +1,107 @@
+import logging
+import concurrent.futures
+from dataclasses import dataclass, field
+from typing import Any, Dict, Generator, List, Optional
+from ananke.connectors.shared import Target
+from ananke.struct.delta import compute_delta
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PathDrift:
+    """
+    path: gNMI path of the config pack
+    changed: Paths whose running value differs from intended, or that are missing
+    extra: Paths present in running config but not in intended config
+    error: Error message if running config could not be fetched
+    """
+
+    path: str
+    changed: List[str] = field(default_factory=list)
+    extra: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def drifted(self) -> bool:
+        return bool(self.changed or self.extra or self.error)
+
+
+@dataclass
+class DriftResult:
+    """
+    source: Target ID
+    paths: Drift per config pack path
+    """
+
+    source: str
+    paths: List[PathDrift] = field(default_factory=list)
+
+    @property
+    def drifted(self) -> bool:
+        return any(path.drifted for path in self.paths)
+
+
+def check_drift(target: Target) -> DriftResult:
+    """
+    Compare the running config of a target with its intended config. Packs are run
+    through the platform transform first, since that is what would be sent to the
+    device, and compared in canonical form (see ananke.struct.delta).
+    """
+    connector = target.connector
+    result = DriftResult(source=connector.target_id)
+    for pack in target.config.packs:
+        if connector.config_transform and not target.config.transformed:
+            pack = connector._transform_config(pack.writable())
+            if not pack:
+                continue
+        path_drift = PathDrift(path=pack.path)
+        try:
+            delta = compute_delta(
+                pack.path, connector._running_config(pack.path), pack.content
+            )
+        except Exception as err:
+            logger.warning(
+                "Could not fetch running config for {target} {path}: {err}".format(
+                    target=connector.target_id, path=pack.path, err=err
+                )
+            )
+            path_drift.error = str(err)
+        else:
+            path_drift.changed = [path for path, _ in delta.updates + delta.replaces]
+            path_drift.extra = list(delta.deletes)
+        result.paths.append(path_drift)
+    return result
+
+
+def concurrent_drift(
+    targets: List[Target], max_workers: int = 32
+) -> Generator[DriftResult, None, None]:
+    """
+    Check drift for many targets at once, yielding results as they complete. Fetching
+    running config is I/O bound so this runs in threads.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(check_drift, target) for target in targets]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+def drift_summary(results: List[DriftResult]) -> Dict[str, Any]:
+    """
+    Machine-readable summary of drift results
+    """
+    return {
+        "drifted": sorted(result.source for result in results if result.drifted),
+        "targets": {
+            result.source: {
+                path.path: {
+                    "changed": path.changed,
+                    "extra": path.extra,
+                    "error": path.error,
+                }
+                for path in result.paths
+            }
+            for result in results
+        },
+    }
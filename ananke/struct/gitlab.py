@@ -0,0 +1,187 @@
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Generator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+GITLAB_URL = "https://gitlab.com/api/v4"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# methods that are safe to send again after a server error or a dropped connection,
+# other methods (e.g. commits) are only retried when rate limited, as GitLab did not
+# process them then
+IDEMPOTENT_METHODS = {"GET", "HEAD", "DELETE"}
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 60
+PER_PAGE = 100
+
+# one session per (base URL, token) so every GitLabRepo in the process shares the same
+# keep-alive connection pool
+_SESSIONS: Dict[Tuple[str, str], Any] = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def get_session(base_url: str, token: str, pool_size: int = 32) -> Any:
+    """
+    Shared requests.Session for a GitLab instance and token
+    """
+    import requests  # type: ignore
+    from requests.adapters import HTTPAdapter  # type: ignore
+
+    with _SESSIONS_LOCK:
+        if (session := _SESSIONS.get((base_url, token))) is None:
+            session = requests.Session()
+            session.headers["PRIVATE-TOKEN"] = token
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session = _SESSIONS[(base_url, token)] = session
+        return session
+
+
+def retry_delay(response: Any, attempt: int) -> float:
+    """
+    Seconds to wait before retrying a response. Retry-After (seconds or HTTP date) is
+    preferred, then RateLimit-Reset (epoch seconds), otherwise exponential backoff with
+    jitter.
+    """
+    headers = response.headers if response is not None else {}
+    if retry_after := headers.get("Retry-After"):
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                return min(max(delay, 0), BACKOFF_MAX)
+            except (TypeError, ValueError):
+                pass
+    if reset := headers.get("RateLimit-Reset"):
+        try:
+            return min(max(float(reset) - time.time(), 0), BACKOFF_MAX)
+        except ValueError:
+            pass
+    delay = min(BACKOFF_BASE * 2**attempt, BACKOFF_MAX)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class GitLabClient:
+    """
+    Transport for the GitLab REST API of a project. Uses a pooled keep-alive session,
+    retries rate limited and failed requests with backoff and pauses on its own when
+    GitLab reports the rate limit as exhausted.
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        token: str,
+        base_url: str = GITLAB_URL,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.url = f"{base_url.rstrip('/')}/projects/{project_id}"
+        self.session = get_session(base_url, token)
+        self.max_retries = max_retries
+        self.paused_until = 0.0
+
+    def _throttle(self, response: Any) -> None:
+        """
+        Record the rate limit reset time once no requests remain in the window
+        """
+        if response.headers.get("RateLimit-Remaining") == "0":
+            try:
+                self.paused_until = float(response.headers["RateLimit-Reset"])
+            except (KeyError, ValueError):
+                pass
+
+    def request(self, method: str, suffix: str, **kwargs: Any) -> Any:
+        """
+        Send a request relative to the project URL (or to an absolute URL), retrying
+        429 responses and, for idempotent methods, 5xx responses and connection errors
+        """
+        import requests  # type: ignore
+
+        url = suffix if suffix.startswith("http") else f"{self.url}/{suffix}"
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_statuses = RETRY_STATUSES if idempotent else {429}
+        attempt = 0
+        while True:
+            if (wait := self.paused_until - time.time()) > 0:
+                logger.info(
+                    "GitLab rate limit reached, waiting {wait:.1f}s".format(wait=wait)
+                )
+                time.sleep(min(wait, BACKOFF_MAX))
+            response = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as err:
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                logger.warning(
+                    "GitLab {method} {url} failed: {error}".format(
+                        method=method.upper(), url=url, error=err
+                    )
+                )
+            else:
+                self._throttle(response)
+                if (
+                    response.status_code not in retry_statuses
+                    or attempt >= self.max_retries
+                ):
+                    return response
+                logger.warning(
+                    "GitLab {method} {url} returned {status}, retrying".format(
+                        method=method.upper(), url=url, status=response.status_code
+                    )
+                )
+            time.sleep(retry_delay(response, attempt))
+            attempt += 1
+
+    def conditional_get(
+        self, suffix: str, cache: Any, params: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """
+        GET a JSON resource with If-None-Match, returning the cached body when GitLab
+        answers 304 Not Modified. cache is a RepoCache.
+        """
+        key = f"{self.url}/{suffix}?{sorted((params or {}).items())}"
+        etag, body = cache.etag(key)
+        headers = {"If-None-Match": etag} if etag else {}
+        response = self.request("get", suffix, params=params, headers=headers)
+        if response.status_code == 304 and body is not None:
+            return body
+        response.raise_for_status()
+        body = response.json()
+        if etag := response.headers.get("ETag"):
+            cache.store_etag(key, etag, body)
+        return body
+
+    def paginate(
+        self,
+        suffix: str,
+        params: Optional[Dict[str, Any]] = None,
+        keyset: bool = False,
+    ) -> Generator[Any, None, None]:
+        """
+        Yield the items of a list endpoint across all pages. Follows the Link header,
+        which covers keyset pagination (used where the endpoint supports it, as offset
+        pagination gets slower with every page) and offset pagination, and falls back
+        to X-Next-Page.
+        """
+        params = {"per_page": PER_PAGE, **(params or {})}
+        if keyset:
+            params["pagination"] = "keyset"
+        url: Optional[str] = suffix
+        while url:
+            response = self.request("get", url, params=params)
+            response.raise_for_status()
+            yield from response.json()
+            if "next" in response.links:
+                # the next link carries all query parameters itself
+                url, params = response.links["next"]["url"], None
+            elif next_page := response.headers.get("X-Next-Page"):
+                params = {**(params or {}), "page": next_page}
+            else:
+                url = None
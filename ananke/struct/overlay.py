@@ -0,0 +1,259 @@
+import os
+import logging
+import jinja2  # type: ignore
+from pathlib import Path, PosixPath
+from ruamel.yaml import YAML  # type: ignore
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from ananke.struct import config
+from ananke.struct.config import Config, template_dependencies, template_files
+from ananke.struct.delta import Delta, compute_delta
+
+logger = logging.getLogger(__name__)
+
+
+class OverlayLoader(jinja2.BaseLoader):
+    """
+    Loads templates from the overlay first and from disk otherwise. Templates deleted
+    in the overlay are not found.
+    """
+
+    def __init__(self, files: Dict[str, Optional[str]]):
+        self.files = files
+        self.disk = jinja2.FileSystemLoader("/")
+
+    def get_source(
+        self, environment: jinja2.Environment, template: str
+    ) -> Tuple[str, str, Callable[[], bool]]:
+        if template in self.files:
+            if (source := self.files[template]) is None:
+                raise jinja2.TemplateNotFound(template)
+            return source, template, lambda: True
+        return self.disk.get_source(environment, template)
+
+
+class Overlay:
+    """
+    Files held in memory on top of the config repo on disk, e.g. uncommitted edits from
+    the config API. Keys are paths relative to the config directory (or absolute), a
+    value of None marks a file as deleted. Config objects given an overlay render the
+    templates it touches from memory and everything else as usual.
+    """
+
+    def __init__(
+        self, files: Dict[str, Optional[str]], config_dir: Optional[str] = None
+    ):
+        if not (config_dir := config_dir or config.CONFIG_DIR):
+            raise ValueError("ANANKE_CONFIG environment variable must be set")
+        self.config_dir = config_dir
+        self.files = {
+            str(Path(config_dir) / path) if not os.path.isabs(path) else path: source
+            for path, source in files.items()
+        }
+        self.environment = jinja2.Environment(loader=OverlayLoader(self.files))
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # the environment holds compiled templates, rebuilt after unpickling
+        return {"config_dir": self.config_dir, "files": self.files}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.config_dir = state["config_dir"]
+        self.files = state["files"]
+        self.environment = jinja2.Environment(loader=OverlayLoader(self.files))
+
+    def relative(self, path: str) -> PosixPath:
+        return Path(path).relative_to(self.config_dir)
+
+    def source(self, file: str) -> Optional[str]:
+        """
+        Overlay source of a file, or None if the overlay doesn't have it
+        """
+        return self.files.get(file)
+
+    def template_files(self) -> Tuple[PosixPath, ...]:
+        """
+        Template files of the config repo with the overlay applied
+        """
+        deleted = {path for path, source in self.files.items() if source is None}
+        files = [
+            file for file in template_files(self.config_dir) if str(file) not in deleted
+        ]
+        existing = {str(file) for file in files}
+        files += [
+            Path(path)
+            for path, source in self.files.items()
+            if source is not None and path.endswith(".yaml.j2") and path not in existing
+        ]
+        return tuple(files)
+
+    def affects(self, file: str) -> bool:
+        """
+        Whether rendering a template file involves the overlay, i.e. the file or
+        anything it includes or imports is in the overlay. Templates whose includes
+        can't be determined statically are assumed to be affected.
+        """
+        if file in self.files:
+            return True
+        try:
+            dependencies = template_dependencies(file)
+        except jinja2.TemplateNotFound:
+            # includes a template that only exists in the overlay
+            return True
+        if dependencies is None:
+            return True
+        return any(template in self.files for template in dependencies[0])
+
+    def settings(self) -> Dict[Any, Any]:
+        """
+        Contents of settings.yaml with the overlay applied
+        """
+        file = f"{self.config_dir}/settings.yaml"
+        if (source := self.source(file)) is not None:
+            return YAML().load(source)
+        with open(file) as settings:
+            return YAML().load(settings)
+
+    def variables(self) -> Dict[str, Any]:
+        """
+        Device variables from all vars.yaml files with the overlay applied
+        """
+        files = {
+            str(path): None
+            for path in Path(self.config_dir).rglob("vars.yaml")
+            if "devices" in path.parts
+        }
+        files.update(
+            {
+                path: source
+                for path, source in self.files.items()
+                if path.endswith("/vars.yaml") and "devices" in Path(path).parts
+            }
+        )
+        variables = {}
+        for path, source in files.items():
+            if path in self.files and source is None:
+                continue
+            if source is None:
+                with open(path) as file:
+                    source = file.read()
+            variables[Path(path).parts[-2]] = YAML().load(source)
+        return variables
+
+    def affected_targets(self, variables: Dict[str, Any]) -> Set[str]:
+        """
+        Devices whose rendered config may change with the overlay: devices whose own
+        files or vars.yaml changed, devices with a role whose files changed, and the
+        owners of any template that includes a changed file. Changes to settings.yaml
+        or the all role affect every device.
+        """
+        owners: Set[str] = set()
+        for path in self.files:
+            relative = self.relative(path)
+            if relative.name == "settings.yaml" and len(relative.parts) == 1:
+                return set(variables)
+            if "devices" in relative.parts or "roles" in relative.parts:
+                owners.add(relative.parts[-2])
+        # templates elsewhere (e.g. macros) count for everything that includes them
+        for file in template_files(self.config_dir):
+            if str(file) not in self.files and self.affects(str(file)):
+                owners.add(file.parts[-2])
+        if "all" in owners:
+            return set(variables)
+        return {
+            device
+            for device, device_vars in variables.items()
+            if device in owners or owners & set(device_vars.get("roles") or [])
+        }
+
+
+@dataclass
+class PackChange:
+    """
+    path: gNMI path of the config pack
+    change: added, removed or changed
+    delta: Operations to get from the current to the proposed content
+    current: Content rendered from the config repo on disk
+    proposed: Content rendered with the overlay
+    """
+
+    path: str
+    change: str
+    delta: Delta = field(default_factory=Delta)
+    current: Any = None
+    proposed: Any = None
+
+
+def _packs(config: Config) -> Dict[str, Any]:
+    return {pack.path: pack.content for pack in config.packs}
+
+
+def preview(
+    overlay: Overlay,
+    targets: Optional[Iterable[str]] = None,
+    sections: Set[str] = set(),
+) -> Dict[str, List[PackChange]]:
+    """
+    Render the devices affected by an overlay (or the given devices) with and without
+    it and return the changed packs per device. Secrets from vault aren't available,
+    so templates referencing them render as they would with the keys undefined.
+    """
+    variables = overlay.variables()
+    settings = overlay.settings()
+    affected = set(targets) if targets else overlay.affected_targets(variables)
+    logger.info(
+        "Previewing {count} affected devices: {targets}".format(
+            count=len(affected), targets=sorted(affected)
+        )
+    )
+    base = Overlay({}, overlay.config_dir)
+    base_settings, base_variables = base.settings(), base.variables()
+    changes: Dict[str, List[PackChange]] = {}
+    for target in sorted(affected):
+        current: Dict[str, Any] = {}
+        if target in base_variables:
+            current = _packs(
+                Config(
+                    target,
+                    base_settings,
+                    base_variables[target],
+                    sections=set(sections),
+                )
+            )
+        proposed: Dict[str, Any] = {}
+        if target in variables:
+            proposed = _packs(
+                Config(
+                    target,
+                    settings,
+                    variables[target],
+                    sections=set(sections),
+                    overlay=overlay,
+                )
+            )
+        target_changes = []
+        for path in list(current) + [path for path in proposed if path not in current]:
+            if path not in proposed:
+                target_changes.append(
+                    PackChange(path=path, change="removed", current=current[path])
+                )
+            elif path not in current:
+                target_changes.append(
+                    PackChange(
+                        path=path,
+                        change="added",
+                        delta=compute_delta(path, None, proposed[path]),
+                        proposed=proposed[path],
+                    )
+                )
+            elif delta := compute_delta(path, current[path], proposed[path]):
+                target_changes.append(
+                    PackChange(
+                        path=path,
+                        change="changed",
+                        delta=delta,
+                        current=current[path],
+                        proposed=proposed[path],
+                    )
+                )
+        changes[target] = target_changes
+    return changes
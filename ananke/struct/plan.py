@@ -0,0 +1,123 @@
+import json
+import logging
+import concurrent.futures
+from dataclasses import dataclass, field
+from typing import Any, Dict, Generator, List, Optional
+from ananke.struct.config import Config
+from ananke.struct.util import content_hash
+from ananke.connectors.shared import (
+    WRITE_METHODS,
+    get_platform_id,
+    has_transform,
+    transform_pack,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PackPlan:
+    """
+    path: gNMI path of the config pack as it would be sent, i.e. after transform
+    write_method: Write method the pack would be sent with
+    size: Size in bytes of the JSON content
+    digest: SHA-256 of the content, see ananke.struct.util.content_hash
+    content: Content as it would be sent
+    original_content: Content before transform
+    source_path: Path of the pack before transform, as sections are matched against
+    files: Template files the pack was rendered from
+    """
+
+    path: str
+    write_method: str
+    size: int
+    digest: str
+    content: Any = None
+    original_content: Any = None
+    source_path: str = ""
+    files: List[str] = field(default_factory=list)
+
+
+@dataclass
+class TargetPlan:
+    """
+    source: Target ID
+    packs: Plan per config pack, packs dropped by the transform are left out
+    """
+
+    source: str
+    packs: List[PackPlan] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        return sum(pack.size for pack in self.packs)
+
+
+def plan_config(config: Config, write_method: WRITE_METHODS = None) -> TargetPlan:
+    """
+    Transform the packs of a Config object as a deploy would and describe them,
+    without a connector
+    """
+    plan = TargetPlan(source=config.target_id)
+    transform = has_transform(config.settings, config.variables)
+    platform_id = get_platform_id(config.variables)
+    for pack in config.packs:
+        source_path = pack.path
+        pack = pack.writable()
+        if write_method:
+            pack.write_method = write_method
+        if transform:
+            pack = transform_pack(config.settings, platform_id, pack)
+            if not pack:
+                continue
+        plan.packs.append(
+            PackPlan(
+                path=pack.path,
+                write_method=pack.write_method,
+                size=len(json.dumps(pack.content, default=str)),
+                digest=content_hash(pack.content),
+                content=pack.content,
+                original_content=pack.original_content,
+                source_path=source_path,
+                files=sorted(
+                    file
+                    for file, paths in config.file_paths.items()
+                    if source_path in paths
+                ),
+            )
+        )
+    return plan
+
+
+def concurrent_plan(
+    configs: List[Config],
+    write_method: WRITE_METHODS = None,
+    max_workers: Optional[int] = None,
+) -> Generator[TargetPlan, None, None]:
+    """
+    Plan many Config objects at once in processes, yielding plans as they complete
+    """
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(plan_config, config, write_method) for config in configs
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+def plan_summary(plans: List[TargetPlan]) -> Dict[str, Any]:
+    """
+    Machine-readable summary of plans
+    """
+    return {
+        plan.source: [
+            {
+                "path": pack.path,
+                "write-method": pack.write_method,
+                "size": pack.size,
+                "digest": pack.digest,
+            }
+            for pack in plan.packs
+        ]
+        for plan in sorted(plans, key=lambda plan: plan.source)
+    }
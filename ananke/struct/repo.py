@@ -1,7 +1,20 @@
 #!/usr/bin/env python3
+import io
+import time
+import random
+import tarfile
 import datetime
-from typing import Any, Optional, Literal, List, Dict, Union, Iterable
+import concurrent.futures
+from typing import Any, Optional, Literal, List, Dict, Union, Iterable, TYPE_CHECKING
 from pathlib import Path, PosixPath
+from ananke.struct.gitlab import GitLabClient
+from ananke.struct.repo_cache import RepoCache, git_blob_sha
+
+if TYPE_CHECKING:
+    import requests  # type: ignore
+
+# fetch files from a repository archive instead of one by one from this many files on
+ARCHIVE_THRESHOLD = 100
 
 
 def get_branch_name() -> str:
@@ -21,16 +34,25 @@ class LocalRepo:
     There is probably a better way to handle both GitLabRepo and LocalRepo using
     inheritance since many of the methods are at least superficially similar, but I have
     not been able to figure out a good way, so we have two unrelated classes for now.
+
+    With odb set, files are read from the branch (or HEAD) in the object database
+    rather than the working tree, and commits are built in memory and put on the
+    branch ref without a checkout. The working tree is never touched, so many
+    branches can be written to concurrently from the same clone.
     """
 
-    from git import Repo  # type: ignore
     import os
 
-    def __init__(self, repo_dir: str, branch: Union[bool, str] = True):
+    def __init__(
+        self, repo_dir: str, branch: Union[bool, str] = True, odb: bool = False
+    ):
         if not self.os.path.exists(repo_dir):
             raise ValueError(f"The provided repo directory {repo_dir} does not exist")
+        from git import Repo  # type: ignore
+
         self.repo_dir = repo_dir
-        self.repo = self.Repo(repo_dir)
+        self.repo = Repo(repo_dir)
+        self.odb = odb
         self.create_branch(branch)
 
     def create_branch(self, branch_name: Union[bool, str]) -> Optional[str]:
@@ -52,6 +74,14 @@ class LocalRepo:
         """
         Get raw content of a file
         """
+        if self.odb:
+            try:
+                blob = self.repo.commit(self.branch_name or "HEAD").tree / path
+            except KeyError:
+                if create:
+                    return False
+                raise FileNotFoundError(f"{path} not found in {self.repo_dir}")
+            return blob.data_stream.read()
         try:
             with open(f"{self.repo_dir}/{path}", "rb") as file:
                 return file.read()
@@ -60,6 +90,23 @@ class LocalRepo:
                 return False
             raise FileNotFoundError(err)
 
+    def get_files(
+        self, paths: List[str], max_workers: int = 16
+    ) -> Dict[str, Union[Any, bool]]:
+        """
+        Get raw content of many files, False for files that don't exist
+        """
+        if not self.odb:
+            return {path: self.get_file(path, create=True) for path in paths}
+        tree = self.repo.commit(self.branch_name or "HEAD").tree
+        files: Dict[str, Union[Any, bool]] = {}
+        for path in paths:
+            try:
+                files[path] = (tree / path).data_stream.read()
+            except KeyError:
+                files[path] = False
+        return files
+
     def get_branches(self) -> Any:
         """
         List branches in the project
@@ -80,8 +127,18 @@ class LocalRepo:
         """
         Lists the contents of a repo.
         """
-        config_dir = Path(self.repo_dir)
-        return [Path(path).relative_to(config_dir) for path in config_dir.rglob("*")]
+        if self.odb:
+            listing = self.repo.git.ls_tree(
+                "-r", "-t", "--name-only", "-z", self.branch_name or "HEAD"
+            )
+            return [Path(path) for path in listing.split("\0") if path]
+        objects = []
+        for root, directories, files in self.os.walk(self.repo_dir):
+            # don't descend into git internals
+            directories[:] = [name for name in directories if name != ".git"]
+            relative = Path(root).relative_to(self.repo_dir)
+            objects.extend(relative / name for name in directories + files)
+        return objects
 
     def update_file(
         self,
@@ -96,6 +153,15 @@ class LocalRepo:
         """
         if not self.branch_name:
             raise ValueError("Cannot commit without creating branch first")
+        if self.odb:
+            action = {
+                "file_path": path,
+                "content": content,
+                "author_email": author_email,
+                "author_name": author_name,
+            }
+            self.bulk_commit(commit_message, [action])
+            return
         self.repo.git.checkout(self.branch_name)
         with open(f"{self.repo_dir}/{path}", "w") as file:
             file.write(content)
@@ -111,6 +177,9 @@ class LocalRepo:
         """
         if not self.branch_name:
             raise ValueError("Cannot commit without branch")
+        if self.odb:
+            self._commit_odb(commit_message, actions)
+            return
 
         self.repo.git.checkout(self.branch_name)
         for action in actions:
@@ -126,6 +195,61 @@ class LocalRepo:
             ).release()
         self.repo.index.commit(commit_message)
 
+    def _commit_odb(
+        self, commit_message: str, actions: List[Any], attempts: int = 20
+    ) -> None:
+        """
+        Commit actions to the branch without a checkout. Blobs are written to the
+        object database, the tree is built in an in-memory index based on the branch
+        tip (.git/index is neither read nor written) and the ref is only moved if it
+        still points to that tip, otherwise the commit is rebuilt on the new tip.
+        """
+        from git import Actor, Blob, Commit, GitCommandError, IndexFile  # type: ignore
+        from git.index.typ import BaseIndexEntry, IndexEntry  # type: ignore
+        from gitdb import IStream  # type: ignore
+
+        entries = []
+        for action in actions:
+            data = action["content"].encode()
+            stream = self.repo.odb.store(
+                IStream(Blob.type, len(data), io.BytesIO(data))
+            )
+            entries.append(
+                IndexEntry.from_base(
+                    BaseIndexEntry((0o100644, stream.binsha, 0, action["file_path"]))
+                )
+            )
+        author = None
+        if actions[0].get("author_name") or actions[0].get("author_email"):
+            author = Actor(
+                actions[0].get("author_name"), actions[0].get("author_email")
+            )
+        for attempt in range(attempts):
+            parent = self.repo.commit(self.branch_name)
+            index = IndexFile.new(self.repo, parent.tree)
+            index.entries.update({(entry.path, 0): entry for entry in entries})
+            commit = Commit.create_from_tree(
+                self.repo,
+                index.write_tree(),
+                commit_message,
+                parent_commits=[parent],
+                head=False,
+                author=author,
+                committer=author,
+            )
+            try:
+                # only moves the ref if it still points to the parent
+                self.repo.git.update_ref(
+                    f"refs/heads/{self.branch_name}", commit.hexsha, parent.hexsha
+                )
+                return
+            except GitCommandError:
+                # another writer moved the branch, back off briefly and rebuild
+                time.sleep(random.uniform(0, 0.05 * (attempt + 1)))
+        raise RuntimeError(
+            f"Could not commit to {self.branch_name}, branch kept moving"
+        )
+
     def create_pr(self, title: str, description: Optional[str] = None) -> str:
         """
         Returns not supported message
@@ -145,13 +269,26 @@ class LocalRepo:
 class GitLabRepo:
     """
     Class for interacting with GitLab Repo API
-    """
 
-    import requests  # type: ignore
+    With cache enabled, the tree of the branch commit and file contents are kept in a
+    RepoCache on disk. Only the commit the branch points to is looked up (with a
+    conditional request), which is done once and again after each commit through
+    this object, so reads see a consistent snapshot of the branch.
+    """
 
-    def __init__(self, project_id: str, token: str, branch: Union[bool, str] = True):
+    def __init__(
+        self,
+        project_id: str,
+        token: str,
+        branch: Union[bool, str] = True,
+        cache: bool = True,
+    ):
         self.project_id = project_id
         self.token = token
+        self.client = GitLabClient(project_id, token)
+        self.cache = RepoCache() if cache else None
+        self.commits: Dict[str, str] = {}
+        self.trees: Dict[str, Dict[str, Dict[str, str]]] = {}
         self.create_branch(branch)
 
     def _api(
@@ -161,16 +298,11 @@ class GitLabRepo:
         body: Optional[Any] = None,
         params: Optional[Dict[str, Optional[str]]] = None,
         raise_on_error: bool = True,
-    ) -> requests.Response:
+    ) -> "requests.Response":
         """
         Generic API component for GitLab
         """
-        headers = {"PRIVATE-TOKEN": self.token}
-        url_base = f"https://gitlab.com/api/v4/projects/{self.project_id}/"
-        params = params
-        response = getattr(self.requests, method)(
-            url=f"{url_base}/{suffix}", headers=headers, json=body, params=params
-        )
+        response = self.client.request(method, suffix, json=body, params=params)
         if raise_on_error:
             response.raise_for_status()
         return response
@@ -220,9 +352,51 @@ class GitLabRepo:
         """
         List branches in the project
         """
-        return self._api(
-            method="get", suffix=f"repository/branches", params={"per_page": 1000}
-        ).json()
+        return list(self.client.paginate("repository/branches"))
+
+    def resolve_commit(self, ref: Optional[str] = None) -> str:
+        """
+        Commit SHA a ref (by default the branch, or main) points to
+        """
+        ref = ref or self.branch_name or "main"
+        if ref not in self.commits:
+            self.commits[ref] = self.client.conditional_get(
+                f"repository/commits/{ref.replace('/', '%2F')}", self.cache
+            )["id"]
+        return self.commits[ref]
+
+    def tree(self, ref: Optional[str] = None) -> Dict[str, Dict[str, str]]:
+        """
+        Recursive tree of a ref, mapping paths to their object ID and type. Requires
+        the cache to be enabled.
+        """
+        if not self.cache:
+            raise ValueError("Tree lookups require the repo cache")
+        commit = self.resolve_commit(ref)
+        if (tree := self.trees.get(commit)) is None:
+            if (tree := self.cache.tree(commit)) is None:
+                tree = {
+                    object["path"]: {"id": object["id"], "type": object["type"]}
+                    for object in self.client.paginate(
+                        "repository/tree",
+                        params={"recursive": True, "ref": commit},
+                        keyset=True,
+                    )
+                }
+                self.cache.store_tree(commit, tree)
+            self.trees[commit] = tree
+        return tree
+
+    def _get_blob(self, sha: str) -> bytes:
+        """
+        Content of a blob, from the cache if possible
+        """
+        if self.cache and (content := self.cache.blob(sha)) is not None:
+            return content
+        content = self._api(method="get", suffix=f"repository/blobs/{sha}/raw").content
+        if self.cache:
+            self.cache.store_blob(sha, content)
+        return content
 
     def get_file(
         self, path: str, branch: Optional[str] = None, create: bool = False
@@ -230,6 +404,12 @@ class GitLabRepo:
         """
         Get raw content of a file, return False if not found
         """
+        if self.cache:
+            entry = self.tree(branch).get(path)
+            if entry and entry["type"] == "blob":
+                return self._get_blob(entry["id"])
+            if create:
+                return False
         path = path.replace("/", "%2F")
         branch_name = "main"
         if self.branch_name:
@@ -246,20 +426,77 @@ class GitLabRepo:
             return False
         return response.content
 
+    def get_files(
+        self, paths: List[str], max_workers: int = 16
+    ) -> Dict[str, Union[Any, bool]]:
+        """
+        Get raw content of many files, False for files that don't exist. Files are
+        fetched concurrently, or from a single repository archive when there are at
+        least ARCHIVE_THRESHOLD of them. With the cache enabled only files whose
+        content isn't cached yet are fetched.
+        """
+        files: Dict[str, Union[Any, bool]] = {}
+        if self.cache:
+            tree = self.tree()
+            for path in paths:
+                entry = tree.get(path)
+                if not entry or entry["type"] != "blob":
+                    files[path] = False
+                elif (content := self.cache.blob(entry["id"])) is not None:
+                    files[path] = content
+            paths = [path for path in paths if path not in files]
+        if len(paths) >= ARCHIVE_THRESHOLD:
+            files.update(self._get_archive_files(paths))
+        elif paths:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_workers
+            ) as executor:
+                contents = executor.map(
+                    lambda path: self.get_file(path, create=True), paths
+                )
+                files.update(zip(paths, contents))
+        return files
+
+    def _get_archive_files(self, paths: List[str]) -> Dict[str, Union[Any, bool]]:
+        """
+        Download the branch as a tar.gz archive and pick the requested files from it
+        """
+        wanted = set(paths)
+        files: Dict[str, Union[Any, bool]] = {path: False for path in paths}
+        response = self._api(
+            method="get",
+            suffix="repository/archive.tar.gz",
+            params={
+                "sha": (
+                    self.resolve_commit() if self.cache else self.branch_name or "main"
+                )
+            },
+        )
+        with tarfile.open(fileobj=io.BytesIO(response.content), mode="r:gz") as archive:
+            for member in archive:
+                # members are prefixed with a <project>-<ref>-<sha> directory
+                path = member.name.partition("/")[2]
+                if member.isfile() and path in wanted:
+                    files[path] = archive.extractfile(member).read()  # type: ignore
+                    if self.cache:
+                        self.cache.store_blob(git_blob_sha(files[path]), files[path])
+        return files
+
     def list_objects(self) -> List[PosixPath]:
         """
         Lists the contents of a repo.
         """
-        params = {"recursive": True, "per_page": 10000}
+        if self.cache:
+            return [Path(path) for path in self.tree()]
+        params: Dict[str, Any] = {"recursive": True}
         if self.branch_name:
             params["ref"] = self.branch_name
-        response = self._api(
-            method="get",
-            params=params,
-            suffix="repository/tree",
-        )
-        objects = [Path(object["path"]) for object in response.json()]
-        return objects
+        return [
+            Path(object["path"])
+            for object in self.client.paginate(
+                "repository/tree", params=params, keyset=True
+            )
+        ]
 
     def update_file(
         self,
@@ -283,6 +520,7 @@ class GitLabRepo:
         }
         path = path.replace("/", "%2F")
         self._api(method="put", suffix=f"repository/files/{path}", body=body)
+        self.commits.pop(self.branch_name, None)
 
     def bulk_commit(self, commit_message: str, actions: List[Any]) -> None:
         """
@@ -302,14 +540,13 @@ class GitLabRepo:
             body=body,
             raise_on_error=False,
         )
+        self.commits.pop(self.branch_name, None)
 
     def get_prs(self) -> Any:
         """
         Return opened PRs
         """
-        return self._api(
-            method="get", suffix="merge_requests", params={"state": "opened"}
-        ).json()
+        return list(self.client.paginate("merge_requests", params={"state": "opened"}))
 
     def create_pr(self, title: str, description: Optional[str] = None) -> str:
         """
@@ -354,14 +591,18 @@ class GitLabRepo:
 
 
 def get_repo(
-    target: str, token: Optional[str] = None, branch: Union[bool, str] = True
+    target: str,
+    token: Optional[str] = None,
+    branch: Union[bool, str] = True,
+    odb: bool = False,
 ) -> Union[LocalRepo, GitLabRepo]:
     """
     A unified interface for getting a repo back. It returns a LocalRepo if the target
-    is a local path and it returns a GitLabRepo if given a numerical target and token
+    is a local path and it returns a GitLabRepo if given a numerical target and token.
+    odb selects the object database mode of LocalRepo.
     """
     if target.isnumeric() and not token:
         raise ValueError("If target is a GitLab project ID a token must be supplied")
     if target.isnumeric() and token:
         return GitLabRepo(target, token, branch)
-    return LocalRepo(target, branch)
+    return LocalRepo(target, branch, odb=odb)
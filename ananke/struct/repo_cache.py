@@ -0,0 +1,87 @@
+import os
+import json
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from ananke.struct.util import cache_dir
+
+
+def git_blob_sha(content: bytes) -> str:
+    """
+    SHA-1 git uses as object ID for a blob with the given content
+    """
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def _write(file: Path, content: bytes) -> None:
+    """
+    Write a file atomically, so concurrent readers never see partial content
+    """
+    file.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=file.parent, suffix=".tmp")
+    with os.fdopen(descriptor, "wb") as handle:
+        handle.write(content)
+    os.replace(temporary, file)
+
+
+class RepoCache:
+    """
+    On-disk cache of repo trees keyed by commit SHA and file content keyed by blob SHA.
+    Both are immutable, so entries never expire. Only the commit a ref points to can
+    change, which is looked up with a conditional request whose ETag and response are
+    kept here as well.
+    """
+
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = directory or cache_dir("repo")
+
+    def tree(self, commit: str) -> Optional[Dict[str, Dict[str, str]]]:
+        """
+        Tree of a commit, mapping paths to their object ID and type
+        """
+        try:
+            with open(self.directory / "trees" / f"{commit}.json") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def store_tree(self, commit: str, tree: Dict[str, Dict[str, str]]) -> None:
+        _write(self.directory / "trees" / f"{commit}.json", json.dumps(tree).encode())
+
+    def _blob_file(self, sha: str) -> Path:
+        return self.directory / "blobs" / sha[:2] / sha
+
+    def blob(self, sha: str) -> Optional[bytes]:
+        """
+        Content of a blob, or None if not cached
+        """
+        try:
+            with open(self._blob_file(sha), "rb") as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def store_blob(self, sha: str, content: bytes) -> None:
+        """
+        Store blob content, ignoring content that doesn't match its SHA
+        """
+        if git_blob_sha(content) == sha:
+            _write(self._blob_file(sha), content)
+
+    def _etag_file(self, url: str) -> Path:
+        return self.directory / "etags" / f"{hashlib.sha256(url.encode()).hexdigest()}"
+
+    def etag(self, url: str) -> Tuple[Optional[str], Any]:
+        """
+        ETag and body of the last response for a URL
+        """
+        try:
+            with open(self._etag_file(url)) as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None, None
+        return entry["etag"], entry["body"]
+
+    def store_etag(self, url: str, etag: str, body: Any) -> None:
+        _write(self._etag_file(url), json.dumps({"etag": etag, "body": body}).encode())
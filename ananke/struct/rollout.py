@@ -0,0 +1,187 @@
+import math
+import logging
+import concurrent.futures
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Literal, Optional, Generator
+from ananke.struct.dispatch import Dispatch
+from ananke.connectors.shared import AnankeResponse, Target
+from ananke.post_checks.telemetry import StatusCheck
+
+WAVE_STRATEGIES = Literal["role", "site", "percent"]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RolloutPolicy:
+    """
+    max_unhealthy: Fraction of hosts in a wave that may be unhealthy for the rollout to
+        be promoted to the next wave
+    critical_only: Only count critical diffs (removed paths, interfaces or BGP sessions
+        going down) as unhealthy, rather than any diff
+    """
+
+    max_unhealthy: float = 0.0
+    critical_only: bool = True
+
+
+@dataclass
+class WaveResult:
+    """
+    number: Index of the wave in the rollout
+    targets: Target IDs in the wave
+    deploy_results: Deploy responses for the wave
+    check_results: Post check diffs for the wave per host
+    unhealthy: Hosts that failed the deploy or the post checks
+    promoted: Whether the rollout continued past this wave
+    """
+
+    number: int
+    targets: List[str]
+    deploy_results: List[AnankeResponse]
+    check_results: Dict[str, List[Any]] = field(default_factory=dict)
+    unhealthy: List[str] = field(default_factory=list)
+    promoted: bool = False
+
+
+def plan_waves(
+    targets: List[Target],
+    strategy: WAVE_STRATEGIES,
+    percent: int = 10,
+    sites: Optional[Dict[str, Optional[str]]] = None,
+) -> List[List[Target]]:
+    """
+    Split targets into waves. Role and site waves are ordered from smallest to largest
+    so the smallest group acts as the canary. Devices with multiple roles are grouped
+    by their first role. Percent waves are chunks of the given percentage of targets.
+    """
+    if strategy == "percent":
+        if not 0 < percent <= 100:
+            raise ValueError("Wave percentage must be between 1 and 100")
+        size = math.ceil(len(targets) * percent / 100)
+        return [targets[index : index + size] for index in range(0, len(targets), size)]
+    groups: Dict[Optional[str], List[Target]] = defaultdict(list)
+    for target in targets:
+        if strategy == "role":
+            group = target.config.roles[0] if target.config.roles else None
+        elif strategy == "site":
+            if sites is None:
+                raise ValueError("Site waves require a device to site mapping")
+            group = sites.get(target.config.target_id)
+        else:
+            raise ValueError(f"Unknown wave strategy {strategy}")
+        groups[group].append(target)
+    return sorted(groups.values(), key=len)
+
+
+def is_critical(path_diffs: Any) -> bool:
+    """
+    Whether a post check diff indicates a problem rather than just a change, i.e. a
+    removed path or an interface or BGP session going down
+    """
+    if path_diffs == "REMOVED":
+        return True
+    if not isinstance(path_diffs, list):
+        return False
+    for path_diff in path_diffs:
+        if path_diff[0] != "change":
+            continue
+        key = path_diff[1] if isinstance(path_diff[1], str) else path_diff[1][-1]
+        if key in ["oper-status", "session-state"] and path_diff[2][1] == "DOWN":
+            return True
+    return False
+
+
+class Rollout:
+    """
+    Deploys targets wave by wave. Each wave is deployed with full parallelism and post
+    checked, and the rollout is only promoted to the next wave if the results are within
+    the given policy. The baseline for the next wave is captured while the current wave
+    is being checked.
+    """
+
+    def __init__(
+        self,
+        dispatch: Dispatch,
+        waves: List[List[Target]],
+        policy: RolloutPolicy = RolloutPolicy(),
+        tolerance: Optional[int] = 10,
+        max_polls: int = 5,
+        scoped: bool = False,
+    ):
+        if "paths" not in dispatch.settings.get("post-checks", {}):
+            raise ValueError("No paths specified for post-checks")
+        self.dispatch = dispatch
+        self.waves = waves
+        self.policy = policy
+        self.tolerance = tolerance
+        self.max_polls = max_polls
+        self.scoped = scoped
+        self.results: List[WaveResult] = []
+
+    def _baseline(self, wave: List[Target]) -> StatusCheck:
+        """
+        Capture the initial state for the hosts of a wave
+        """
+        return StatusCheck(
+            self.dispatch.post_check_targets(wave),
+            self.dispatch.settings["post-checks"]["paths"],
+            scoped=self.scoped,
+        )
+
+    def _unhealthy(self, result: WaveResult) -> List[str]:
+        """
+        Hosts of a wave that had a failed deploy or diffs not allowed by the policy
+        """
+        unhealthy = set()
+        for response in result.deploy_results:
+            if any(message.priority == 1 for message in response.messages):
+                unhealthy.add(response.source)
+        for host, diffs in result.check_results.items():
+            if not self.policy.critical_only and diffs:
+                unhealthy.add(host)
+            elif any(is_critical(path_diffs) for _, path_diffs in diffs):
+                unhealthy.add(host)
+        return sorted(unhealthy)
+
+    def run(self, method: Optional[str]) -> Generator[WaveResult, None, None]:
+        """
+        Run the rollout, yielding the result of each wave as it completes. Stops after
+        the first wave that is not within policy.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            baseline = executor.submit(self._baseline, self.waves[0])
+            for number, wave in enumerate(self.waves):
+                status_check = baseline.result()
+                logger.info(
+                    "Deploying wave {number} to {targets}".format(
+                        number=number,
+                        targets=[target.connector.target_id for target in wave],
+                    )
+                )
+                result = WaveResult(
+                    number=number,
+                    targets=[target.connector.target_id for target in wave],
+                    deploy_results=self.dispatch.concurrent_deploy(
+                        method, targets=wave
+                    ),
+                )
+                if number + 1 < len(self.waves):
+                    baseline = executor.submit(self._baseline, self.waves[number + 1])
+                for _ in status_check.adaptive_poll(
+                    tolerance=self.tolerance, max_polls=self.max_polls
+                ):
+                    pass
+                result.check_results = dict(status_check.results)
+                result.unhealthy = self._unhealthy(result)
+                allowed = self.policy.max_unhealthy * len(wave)
+                result.promoted = len(result.unhealthy) <= allowed
+                self.results.append(result)
+                yield result
+                if not result.promoted:
+                    logger.warning(
+                        "Wave {number} not within policy, halting rollout. Unhealthy "
+                        "hosts: {hosts}".format(number=number, hosts=result.unhealthy)
+                    )
+                    return
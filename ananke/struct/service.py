@@ -0,0 +1,414 @@
+import os
+import hmac
+import json
+import hashlib
+import logging
+import threading
+import socketserver
+from contextlib import contextmanager
+from dataclasses import asdict, is_dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Generator, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8151
+MAX_BODY = 16 * 1024 * 1024
+# bearer token clients must send, required when listening on a TCP port
+TOKEN_ENV = "ANANKE_SERVICE_TOKEN"
+
+
+class Busy(Exception):
+    """
+    Raised when no slot for a request frees up in time
+    """
+
+
+def fingerprint(config_dir: str) -> str:
+    """
+    Hash over path, size and mtime of every file in the config repo, changes whenever
+    a file is added, removed or modified (e.g. by git pull or checkout)
+    """
+    digest = hashlib.sha1()
+    for root, directories, files in os.walk(config_dir):
+        directories[:] = sorted(d for d in directories if d != ".git")
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode())
+    return digest.hexdigest()
+
+
+def _targets(body: Dict[str, Any]) -> Dict[Optional[str], Set[str]]:
+    """
+    Dispatch targets from a request body, like parse_cli_targets for the CLI
+    """
+    targets = body.get("targets") or []
+    if isinstance(targets, str):
+        targets = targets.split()
+    sections = set(body.get("sections") or [])
+    return (
+        {target: set(sections) for target in targets} if targets else {None: sections}
+    )
+
+
+def service_token(token_file: Optional[str] = None) -> Optional[str]:
+    """
+    Token from a file if given, otherwise from the ANANKE_SERVICE_TOKEN environment
+    variable
+    """
+    if token_file:
+        with open(token_file) as file:
+            return file.read().strip() or None
+    return os.environ.get(TOKEN_ENV) or None
+
+
+def _jsonable(value: Any) -> Any:
+    if is_dataclass(value) and not isinstance(value, type):
+        return asdict(value)
+    return str(value)
+
+
+class Service:
+    """
+    Long-running state for ananke serve. Settings and device variables are read once
+    and kept, as are the module level caches of rendered templates, template
+    dependencies and pooled content, vault tokens and secrets, and gNMI sessions stay
+    connected. Everything but secrets is dropped when the config repo changes on disk
+    (checked every poll_interval seconds), everything on request.
+
+    Requests that render or read from devices share max_requests slots, deploys have
+    their own max_deploys slots. A request that can't get a slot within queue_timeout
+    seconds is rejected as busy.
+    """
+
+    def __init__(
+        self,
+        config_dir: Optional[str] = None,
+        max_requests: int = 4,
+        max_deploys: int = 1,
+        queue_timeout: float = 30,
+        poll_interval: float = 5,
+    ):
+        from ananke.struct import config
+
+        if not (config_dir := config_dir or config.CONFIG_DIR):
+            raise ValueError("ANANKE_CONFIG environment variable must be set")
+        self.config_dir = config_dir
+        self.request_slots = threading.BoundedSemaphore(max_requests)
+        self.deploy_slots = threading.BoundedSemaphore(max_deploys)
+        self.queue_timeout = queue_timeout
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.generation = 0
+        self.load()
+
+    def load(self) -> None:
+        """
+        (Re)read settings and device variables from the config repo
+        """
+        from ananke.struct.overlay import Overlay
+
+        base = Overlay({}, self.config_dir)
+        settings, variables = base.settings(), base.variables()
+        with self.lock:
+            self.settings, self.variables = settings, variables
+            self.fingerprint = fingerprint(self.config_dir)
+            self.generation += 1
+        logger.info(
+            "Loaded config repo {config_dir} ({devices} devices)".format(
+                config_dir=self.config_dir, devices=len(variables)
+            )
+        )
+
+    def invalidate(self, secrets: bool = False) -> None:
+        """
+        Drop everything derived from the config repo and load it again. Vault secrets
+        are kept unless asked for, they don't live in the repo.
+        """
+        from ananke.struct.config import TEMPLATE_DEPENDENCIES, template_files
+        from ananke.struct.content_pool import CONTENT_POOL
+
+        template_files.cache_clear()
+        TEMPLATE_DEPENDENCIES.clear()
+        CONTENT_POOL.clear()
+        if secrets:
+            from ananke.struct.vault import clear_cache
+
+            clear_cache()
+        self.load()
+
+    def watch(self) -> None:
+        """
+        Poll the config repo and invalidate when it changed, until stopped
+        """
+        while not self.stopped.wait(self.poll_interval):
+            try:
+                if fingerprint(self.config_dir) != self.fingerprint:
+                    logger.info("Config repo changed, invalidating caches")
+                    self.invalidate()
+            except Exception as err:
+                logger.error("Reloading config repo failed: {err}".format(err=err))
+
+    def start(self) -> None:
+        if self.poll_interval:
+            threading.Thread(target=self.watch, daemon=True).start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    @contextmanager
+    def slot(self, slots: threading.BoundedSemaphore) -> Generator[None, None, None]:
+        if not slots.acquire(timeout=self.queue_timeout):
+            raise Busy("Too many concurrent requests, try again later")
+        try:
+            yield
+        finally:
+            slots.release()
+
+    def dispatch(self, body: Dict[str, Any], **kwargs: Any) -> Any:
+        """
+        Dispatch with the kept settings and variables, running in threads. Vault
+        tokens and secrets are cached by ananke.struct.vault across dispatches.
+        """
+        from ananke.struct.dispatch import Dispatch
+
+        with self.lock:
+            settings, variables = self.settings, self.variables
+        return Dispatch(
+            targets=_targets(body),
+            settings=settings,
+            variables=variables,
+            processes=False,
+            **kwargs,
+        )
+
+    def health(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "config-dir": self.config_dir,
+            "generation": self.generation,
+            "fingerprint": self.fingerprint,
+            "devices": len(self.variables),
+        }
+
+    def plan(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Render targets and return what would be sent, like ananke plan --json
+        """
+        from ananke.struct.plan import plan_config, plan_summary
+
+        with self.slot(self.request_slots):
+            dispatch = self.dispatch(body, connect=False)
+            return plan_summary(
+                [
+                    plan_config(target.config, body.get("method"))
+                    for target in dispatch.targets
+                ]
+            )
+
+    def get(self, body: Dict[str, Any]) -> Dict[str, List[Any]]:
+        """
+        Get paths from targets, updates are grouped per target
+        """
+        if not (paths := body.get("paths")):
+            raise ValueError("At least one gNMI path must be given")
+        with self.slot(self.request_slots):
+            dispatch = self.dispatch(body, render=False)
+            results: Dict[str, List[Any]] = {}
+            for target_id, update in dispatch.concurrent_get(
+                paths, operational=body.get("operational", False)
+            ):
+                results.setdefault(target_id, []).append(update)
+            return results
+
+    def set(self, body: Dict[str, Any]) -> List[Any]:
+        """
+        Deploy config to targets, like ananke set without post checks or waves
+        """
+        if (method := body.get("method")) not in [None, "replace", "update", "delta"]:
+            raise ValueError("Method must be replace, update or delta")
+        with self.slot(self.deploy_slots):
+            dispatch = self.dispatch(
+                body, deploy_tags=["dry-run"] if body.get("dry-run") else []
+            )
+            return [asdict(result) for result in dispatch.concurrent_deploy(method)]
+
+    def preview(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Changed packs per device for files given in the request on top of the config
+        repo, see ananke.struct.overlay.preview
+        """
+        from ananke.struct.overlay import Overlay, preview
+
+        if not isinstance(files := body.get("files"), dict):
+            raise ValueError("files must map paths to their content (or null)")
+        with self.slot(self.request_slots):
+            changes = preview(
+                Overlay(files, self.config_dir),
+                body.get("targets"),
+                set(body.get("sections") or []),
+            )
+            return {
+                target: [asdict(change) for change in target_changes]
+                for target, target_changes in changes.items()
+            }
+
+    def edit(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Commit files given in the request to a branch of the repo the config API works
+        on, optionally opening a PR
+        """
+        from ananke.config_api.network_config import RepoConfigInterface
+
+        if not isinstance(files := body.get("files"), dict) or not files:
+            raise ValueError("files must map paths to their content")
+        with self.slot(self.request_slots):
+            # commits go through the object database, so concurrent edits never
+            # check out branches in a local repo
+            interface = RepoConfigInterface(branch=body.get("branch", True), odb=True)
+            existing = {str(path) for path in interface.repo_objects}
+            interface.repo.bulk_commit(
+                commit_message=body.get("message", "Automated commit"),
+                actions=[
+                    {
+                        "file_path": path,
+                        "action": "update" if path in existing else "create",
+                        "content": content,
+                        "author_email": body.get("author-email"),
+                        "author_name": body.get("author-name"),
+                    }
+                    for path, content in files.items()
+                ],
+            )
+            result = {"branch": interface.repo.branch_name}
+            if body.get("pr"):
+                result["pr"] = interface.repo.create_pr(
+                    title=body.get("message", "Automated commit")
+                )
+            return result
+
+    def handle_invalidate(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        self.invalidate(secrets=body.get("secrets", False))
+        return self.health(body)
+
+    def routes(self) -> Dict[str, Dict[str, Callable[[Dict[str, Any]], Any]]]:
+        return {
+            "GET": {"/health": self.health},
+            "POST": {
+                "/plan": self.plan,
+                "/get": self.get,
+                "/set": self.set,
+                "/preview": self.preview,
+                "/edit": self.edit,
+                "/invalidate": self.handle_invalidate,
+            },
+        }
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    JSON over HTTP for a Service, requests and responses are JSON objects. If the
+    server has a token, every request must send it as Authorization: Bearer <token>.
+    """
+
+    service: Service
+    token: Optional[str] = None
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self, status: int, body: Any) -> None:
+        content = json.dumps(body, default=_jsonable).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _authorized(self) -> bool:
+        if not self.token:
+            return True
+        scheme, _, token = (self.headers.get("Authorization") or "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(
+            token.strip().encode(), self.token.encode()
+        )
+
+    def _handle(self, method: str) -> None:
+        path = self.path.split("?")[0].rstrip("/")
+        if not self._authorized():
+            self._respond(401, {"error": "Missing or invalid token"})
+            return
+        if (route := self.service.routes()[method].get(path)) is None:
+            self._respond(404, {"error": f"No such endpoint {method} {path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY:
+                raise ValueError("Request body too large")
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("Request body must be a JSON object")
+            self._respond(200, route(body))
+        except Busy as err:
+            self._respond(429, {"error": str(err)})
+        except (ValueError, KeyError) as err:
+            self._respond(400, {"error": str(err)})
+        except Exception as err:
+            logger.exception("{method} {path} failed".format(method=method, path=path))
+            self._respond(500, {"error": str(err)})
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.info(format % args)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    HTTP server on a Unix socket, so only local users with access to it can connect
+    """
+
+    daemon_threads = True
+
+    def get_request(self) -> Any:
+        request, _ = super().get_request()
+        # handlers expect a (host, port) client address
+        return request, ("local", 0)
+
+
+def make_server(
+    service: Service,
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    unix_socket: Optional[str] = None,
+    token: Optional[str] = None,
+) -> socketserver.BaseServer:
+    """
+    HTTP server for a service on a TCP port, or on a Unix socket if given. The API can
+    deploy config, so a TCP port needs a token, while the Unix socket is created
+    accessible to its owner only and the token is optional.
+    """
+    if not unix_socket and not token:
+        raise ValueError(
+            f"Listening on a TCP port requires a token, set {TOKEN_ENV} or listen on "
+            "a Unix socket"
+        )
+    handler = type("Handler", (ServiceHandler,), {"service": service, "token": token})
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        # the socket is created by bind, so there is no window in which others can
+        # connect before its permissions are set
+        umask = os.umask(0o177)
+        try:
+            return UnixHTTPServer(unix_socket, handler)
+        finally:
+            os.umask(umask)
+    return ThreadingHTTPServer((host, port), handler)
@@ -0,0 +1,192 @@
+import os
+import re
+from functools import lru_cache
+from ruamel.yaml import YAML  # type: ignore
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+STRUCTURED_MARKER = "# ananke: structured"
+EXPRESSION = re.compile(r"^\s*\{\{(?P<expression>.*?)\}\}\s*$", re.S)
+LOOP = re.compile(r"^\s*(?P<names>\w+(?:\s*,\s*\w+)*)\s+in\s+(?P<expression>.+)$", re.S)
+# a mapping with one of these keys is a directive rather than content
+DIRECTIVES = {"$for", "$if"}
+SKIP = object()
+
+
+def is_structured(file: str, source: Optional[str] = None) -> bool:
+    """
+    Whether a template file is in structured mode, i.e. starts with the marker line.
+    source is the template source if it doesn't come from the file (e.g. an overlay).
+    """
+    if source is not None:
+        return source.split("\n", 1)[0].strip() == STRUCTURED_MARKER
+    with open(file) as template:
+        return template.readline().strip() == STRUCTURED_MARKER
+
+
+def load_structured(file: str) -> Any:
+    """
+    Parsed YAML of a structured template, parsed once per process until the file
+    changes. The result is shared and never modified.
+    """
+    return _load(file, os.stat(file).st_mtime_ns)
+
+
+@lru_cache(maxsize=None)
+def _load(file: str, mtime: int) -> Any:
+    with open(file) as template:
+        return YAML().load(template)
+
+
+@lru_cache(maxsize=128)
+def load_source(source: str) -> Any:
+    """
+    Parsed YAML of a structured template source that isn't read from a file
+    """
+    return YAML().load(source)
+
+
+@lru_cache(maxsize=None)
+def compile_expression(expression: str) -> Callable[..., Any]:
+    """
+    Compile a jinja2 expression once per process. Expressions evaluate to native
+    values, e.g. a list stays a list rather than becoming its string representation.
+    """
+    from ananke.struct.config import ENVIRONMENT
+
+    return ENVIRONMENT.compile_expression(expression.strip())
+
+
+@lru_cache(maxsize=None)
+def compile_template(source: str) -> Any:
+    """
+    Compile a jinja2 template string once per process
+    """
+    from ananke.struct.config import ENVIRONMENT
+
+    return ENVIRONMENT.from_string(source)
+
+
+def evaluate_scalar(value: Any, context: Dict[str, Any]) -> Any:
+    """
+    Evaluate a scalar. A string that is a single {{ expression }} evaluates to the
+    native value of the expression, other strings containing jinja2 syntax are
+    rendered as strings and anything else is returned as is.
+    """
+    if not isinstance(value, str):
+        return value
+    if (match := EXPRESSION.match(value)) and "{{" not in match["expression"]:
+        return compile_expression(match["expression"])(**context)
+    if "{{" in value or "{%" in value:
+        return compile_template(str(value)).render(**context)
+    return value
+
+
+def _loop(directive: Dict[str, Any]) -> Tuple[List[str], str]:
+    if not (match := LOOP.match(str(directive["$for"]))):
+        raise ValueError(f"Invalid $for directive: {directive['$for']}")
+    names = [name.strip() for name in match["names"].split(",")]
+    return names, match["expression"]
+
+
+def _expand(directive: Dict[str, Any], context: Dict[str, Any]) -> List[Any]:
+    """
+    Evaluate a directive to the list of values it produces, zero or one for $if and
+    one per iteration for $for
+    """
+    if "$if" in directive:
+        if compile_expression(str(directive["$if"]))(**context):
+            values = [evaluate(directive["$then"], context)]
+        elif "$else" in directive:
+            values = [evaluate(directive["$else"], context)]
+        else:
+            values = []
+        return [value for value in values if value is not SKIP]
+    names, expression = _loop(directive)
+    values = []
+    for item in compile_expression(expression)(**context) or []:
+        if len(names) == 1:
+            loop_vars = {names[0]: item}
+        else:
+            loop_vars = dict(zip(names, item))
+        value = evaluate(directive["$each"], {**context, **loop_vars})
+        if value is not SKIP:
+            values.append(value)
+    return values
+
+
+def evaluate(node: Any, context: Dict[str, Any]) -> Any:
+    """
+    Evaluate a parsed structured template against variables, building new structures
+    and leaving the parsed template untouched. Directives:
+
+    - {"$for": "item in items", "$each": ...} in a list adds one element per item
+    - {"$if": expression, "$then": ..., "$else": ...} in a list adds the element of the
+      matching branch, as a mapping value it becomes that value, and without a
+      matching branch the element or key is left out
+    """
+    if isinstance(node, dict):
+        if DIRECTIVES & set(node):
+            values = _expand(node, context)
+            if "$for" in node:
+                return values
+            return values[0] if values else SKIP
+        evaluated = {}
+        for key, value in node.items():
+            value = evaluate(value, context)
+            if value is not SKIP:
+                evaluated[evaluate_scalar(key, context)] = value
+        return evaluated
+    if isinstance(node, list):
+        evaluated_list = []
+        for item in node:
+            if isinstance(item, dict) and DIRECTIVES & set(item):
+                evaluated_list.extend(_expand(item, context))
+            else:
+                evaluated_list.append(evaluate(item, context))
+        return evaluated_list
+    return evaluate_scalar(node, context)
+
+
+def render_structured(
+    file: str, variables: Dict[str, Any], source: Optional[str] = None
+) -> Any:
+    """
+    Render a structured template to Python structures without rendering text and
+    parsing it back as YAML
+    """
+    parsed = load_structured(file) if source is None else load_source(source)
+    spec = evaluate(parsed, variables)
+    return None if spec is SKIP else spec
+
+
+def structured_variables(file: str) -> Set[str]:
+    """
+    Variables referenced by a structured template, the counterpart of
+    jinja2.meta.find_undeclared_variables for a whole template file
+    """
+    from jinja2 import meta  # type: ignore
+    from ananke.struct.config import ENVIRONMENT
+
+    referenced: Set[str] = set()
+    loop_names: Set[str] = set()
+
+    def _walk(node: Any) -> None:
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "$for":
+                    names, expression = _loop(node)
+                    loop_names.update(names)
+                    _walk("{{ " + expression + " }}")
+                elif key == "$if":
+                    _walk("{{ " + str(value) + " }}")
+                else:
+                    _walk(key)
+                    _walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                _walk(item)
+        elif isinstance(node, str) and ("{{" in node or "{%" in node):
+            referenced.update(meta.find_undeclared_variables(ENVIRONMENT.parse(node)))
+
+    _walk(load_structured(file))
+    return referenced - loop_names
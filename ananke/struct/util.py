@@ -1,5 +1,9 @@
-import requests
+import os
+import json
+import hashlib
 import logging
+from pathlib import Path
+from typing import Any
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +16,8 @@ class MegaportAuth:
         self.token = self.get_token()
 
     def get_token(self) -> str:
+        import requests
+
         session = requests.Session()
         if self.staging:
             url = "https://oauth-m2m-staging.auth.ap-southeast-2.amazoncognito.com/oauth2/token"
@@ -26,3 +32,25 @@ class MegaportAuth:
         response = session.post(url=url, headers=headers, data=body)
         logger.debug(response.json())
         return response.json()["access_token"]
+
+
+def content_hash(content: Any) -> str:
+    """
+    SHA-256 of content in canonical JSON form (sorted keys, no whitespace), so equal
+    content hashes the same regardless of key order
+    """
+    data = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def cache_dir(*parts: str) -> Path:
+    """
+    Directory for on-disk caches, created if missing and accessible to its owner only.
+    Lives under ANANKE_CACHE_DIR if set, otherwise ~/.cache/ananke.
+    """
+    base = os.environ.get("ANANKE_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "ananke"
+    )
+    path = Path(base, *parts)
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    return path
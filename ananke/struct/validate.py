@@ -0,0 +1,162 @@
+import os
+import json
+import logging
+import importlib
+import concurrent.futures
+from functools import lru_cache
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Generator, List, Optional
+from ananke.struct.config import Config, ConfigPack
+from ananke.struct.util import cache_dir, content_hash
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PackValidation:
+    """
+    path: gNMI path of the config pack
+    errors: Validation errors, empty if the pack is valid
+    skipped: No binding is configured for the path, so it wasn't validated
+    cached: Result was taken from the validation cache
+    """
+
+    path: str
+    errors: List[str] = field(default_factory=list)
+    skipped: bool = False
+    cached: bool = False
+
+
+@dataclass
+class ValidationResult:
+    """
+    source: Target ID
+    packs: Validation result per config pack
+    """
+
+    source: str
+    packs: List[PackValidation] = field(default_factory=list)
+
+    @property
+    def valid(self) -> bool:
+        return not any(pack.errors for pack in self.packs)
+
+
+def get_bindings(settings: Dict[Any, Any]) -> Dict[str, Dict[str, str]]:
+    """
+    Path to binding mapping used for validation, validation-bindings in settings.yaml
+    on top of merge-bindings
+    """
+    return {
+        **(settings.get("merge-bindings") or {}),
+        **(settings.get("validation-bindings") or {}),
+    }
+
+
+@lru_cache(maxsize=None)
+def binding_factory(binding: str, binding_object: str) -> Callable[[], Any]:
+    """
+    Import a pyangbind binding once per process and return a function creating an
+    empty object of it, see merge bindings in the README for the naming
+    """
+    module = importlib.import_module(binding, package=None)
+    sections = binding_object.split(".")
+    binding_class = getattr(getattr(module, sections[0]), sections[0])
+
+    def _create() -> Any:
+        created = binding_class()
+        for nested in sections[1:]:
+            created = getattr(created, nested)
+        return created
+
+    return _create
+
+
+@lru_cache(maxsize=None)
+def binding_version(binding: str) -> str:
+    """
+    Identifies the generated binding on disk, so cached results are invalidated when a
+    binding is regenerated
+    """
+    module = importlib.import_module(binding, package=None)
+    try:
+        stat = os.stat(module.__file__)
+    except (OSError, TypeError):
+        return binding
+    return f"{binding}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def validate_pack(
+    pack: ConfigPack, bindings: Dict[str, Dict[str, str]], use_cache: bool = True
+) -> PackValidation:
+    """
+    Validate a pack's content by loading it into the pyangbind binding for its path.
+    pyangbind checks element names, types and restrictions on load, and stops at the
+    first error.
+    """
+    result = PackValidation(path=pack.path)
+    if pack.path not in bindings:
+        result.skipped = True
+        return result
+    binding = bindings[pack.path]
+    try:
+        version = binding_version(binding["binding"])
+    except ImportError as err:
+        # not cached, the binding may be installed by the next run
+        result.errors.append(f"{type(err).__name__}: {err}")
+        return result
+    key = content_hash(
+        {"binding": version, "object": binding["object"], "content": pack.content}
+    )
+    cache_file = cache_dir("validation") / f"{key}.json"
+    if use_cache and cache_file.exists():
+        with open(cache_file) as file:
+            result.errors = json.load(file)
+        result.cached = True
+        return result
+    from pyangbind.lib.serialise import pybindJSONDecoder  # type: ignore
+
+    try:
+        pybindJSONDecoder.load_ietf_json(
+            pack.content,
+            None,
+            None,
+            obj=binding_factory(binding["binding"], binding["object"])(),
+        )
+    except Exception as err:
+        # pyangbind type errors carry a dict including the generated class source
+        message = err.args[0] if err.args else str(err)
+        if isinstance(message, dict):
+            message = message.get("error-string", str(message))
+        result.errors.append(f"{type(err).__name__}: {message}")
+    with open(f"{cache_file}.{os.getpid()}.tmp", "w") as file:
+        json.dump(result.errors, file)
+    os.replace(f"{cache_file}.{os.getpid()}.tmp", cache_file)
+    return result
+
+
+def validate_config(config: Config, use_cache: bool = True) -> ValidationResult:
+    """
+    Validate all packs of a Config object
+    """
+    bindings = get_bindings(config.settings)
+    result = ValidationResult(source=config.target_id)
+    for pack in config.packs:
+        result.packs.append(validate_pack(pack, bindings, use_cache=use_cache))
+    return result
+
+
+def concurrent_validate(
+    configs: List[Config], use_cache: bool = True, max_workers: Optional[int] = None
+) -> Generator[ValidationResult, None, None]:
+    """
+    Validate many Config objects at once, yielding results as they complete. Loading
+    content into bindings is CPU bound so this runs in processes, each of which imports
+    a binding only once.
+    """
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(validate_config, config, use_cache) for config in configs
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
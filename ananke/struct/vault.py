@@ -1,11 +1,40 @@
+import time
+import threading
+import concurrent.futures
 import hvac  # type: ignore
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# seconds KV paths are kept in memory, settings can override it with vault.cache-ttl
+SECRET_TTL = 300
+# tokens are renewed this many seconds before they expire
+TOKEN_MARGIN = 30
+
+# tokens per (url, role ID) and KV path contents per (url, mount point, path) with the
+# time they expire, shared by every Vault in the process. Secrets are never written to
+# disk, long-running processes (ananke serve) keep them warm.
+_TOKENS: Dict[Tuple[str, str], Tuple[str, float]] = {}
+_PATHS: Dict[Tuple[str, str, str], Tuple[Dict[str, str], float]] = {}
+_LOCK = threading.Lock()
+
+
+def clear_cache() -> None:
+    """
+    Forget all cached tokens and secrets
+    """
+    with _LOCK:
+        _TOKENS.clear()
+        _PATHS.clear()
 
 
 class Vault:
     """
     A simple Hashicorp Vault integration. Sets up the vault and reads keys from the
     supplied paths at the supplied mount point.
+
+    The AppRole token is reused until shortly before its lease runs out and paths are
+    cached for ttl seconds. Nothing is read until keys are asked for, and then all
+    paths not in the cache are read concurrently. Later paths take precedence over
+    earlier ones for keys they share.
     """
 
     def __init__(
@@ -15,29 +44,92 @@ class Vault:
         url: str,
         vault_role_id: str,
         vault_secret: str,
+        ttl: float = SECRET_TTL,
     ) -> None:
+        self.paths = paths
+        self.mount_point = mount_point
+        self.url = url
+        self.ttl = ttl
+        self.role_id = vault_role_id
+        self.secret_id = vault_secret
         self.client = hvac.Client(url=url)
-        self.client.auth.approle.login(
-            role_id=vault_role_id,
-            secret_id=vault_secret,
+        self.client.token = self.login(vault_role_id, vault_secret)
+        self._keys: Optional[Dict[str, str]] = None
+
+    def login(self, role_id: str, secret_id: str) -> str:
+        """
+        Token for the AppRole, reused while it is valid
+        """
+        with _LOCK:
+            token, expires = _TOKENS.get((self.url, role_id), ("", 0.0))
+        if token and expires - TOKEN_MARGIN > time.time():
+            return token
+        response = self.client.auth.approle.login(
+            role_id=role_id, secret_id=secret_id, use_token=False
         )
+        token = response["auth"]["client_token"]
+        self.client.token = token
         if not self.client.is_authenticated():
             raise RuntimeError("Unable to authenticate to vault")
+        if lease := response["auth"].get("lease_duration"):
+            with _LOCK:
+                _TOKENS[(self.url, role_id)] = (token, time.time() + lease)
+        return token
 
-        self.keys = self.read_keys(paths, mount_point)
+    def read_path(self, path: str, mount_point: Optional[str] = None) -> Dict[str, str]:
+        """
+        Keys of a KV path, from the cache if they were read less than ttl seconds ago
+        """
+        mount_point = mount_point or self.mount_point
+        key = (self.url, mount_point, path)
+        with _LOCK:
+            data, expires = _PATHS.get(key, ({}, 0.0))
+        if expires > time.time():
+            return data
+        try:
+            data = self._read(path, mount_point)
+        except hvac.exceptions.Forbidden:
+            # the cached token was revoked before its lease ran out
+            with _LOCK:
+                _TOKENS.pop((self.url, self.role_id), None)
+            self.client.token = self.login(self.role_id, self.secret_id)
+            data = self._read(path, mount_point)
+        if self.ttl:
+            with _LOCK:
+                _PATHS[key] = (data, time.time() + self.ttl)
+        return data
+
+    def _read(self, path: str, mount_point: str) -> Dict[str, str]:
+        return self.client.secrets.kv.v2.read_secret_version(
+            mount_point=mount_point,
+            path=path,
+            raise_on_deleted_version=False,
+        )["data"]["data"]
 
     def read_keys(self, paths: List[str], mount_point: str) -> Dict[str, str]:
         """
         Read passwords from vault
         """
-        joined: Dict[str, str] = {}
-        for path in paths:
-            joined = (
-                joined
-                | self.client.secrets.kv.v2.read_secret_version(
-                    mount_point=mount_point,
-                    path=path,
-                    raise_on_deleted_version=False,
-                )["data"]["data"]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(paths) or 1) as pool:
+            contents = list(
+                pool.map(lambda path: self.read_path(path, mount_point), paths)
             )
+        joined: Dict[str, str] = {}
+        for content in contents:
+            joined = joined | content
         return joined
+
+    @property
+    def keys(self) -> Dict[str, str]:
+        if self._keys is None:
+            self._keys = self.read_keys(self.paths, self.mount_point)
+        return self._keys
+
+    def resolve(self, names: Iterable[str]) -> Dict[str, str]:
+        """
+        Only the given keys, for the ones that exist in vault
+        """
+        names = set(names)
+        if not names:
+            return {}
+        return {name: value for name, value in self.keys.items() if name in names}
@@ -0,0 +1,82 @@
+import io
+import tarfile
+from typing import Any, Dict, List
+import ruamel.yaml  # type: ignore
+from ananke.struct.repo import GitLabRepo
+from ananke.config_api.network_config import RepoConfigInterface
+
+FILES = {
+    "network-elements/devices/device1/interfaces.yaml": b"---\n/interfaces:\n  a: 1\n",
+    "network-elements/devices/device2/interfaces.yaml": b"---\n/interfaces:\n  a: 2\n",
+}
+
+
+def _archive(files: Dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for path, content in files.items():
+            info = tarfile.TarInfo(f"config-main-abc123/{path}")
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+class Response:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+class Client:
+    def __init__(self):
+        self.calls: List[Any] = []
+
+    def request(self, method: str, suffix: str, **kwargs: Any) -> Response:
+        self.calls.append(suffix)
+        return Response(_archive(FILES))
+
+
+class Repo:
+    def __init__(self):
+        self.requested: List[str] = []
+
+    def get_files(self, paths: List[str], max_workers: int = 16) -> Dict[str, Any]:
+        self.requested.extend(paths)
+        return {path: FILES.get(path, False) for path in paths}
+
+
+def test_archive_files():
+    """
+    Test that files are picked from a repository archive and missing files map to False
+    """
+    repo = GitLabRepo.__new__(GitLabRepo)
+    repo.branch_name = None
+    repo.cache = None
+    repo.client = Client()
+    missing = "network-elements/devices/device3/interfaces.yaml"
+    files = repo._get_archive_files(list(FILES) + [missing])
+    assert repo.client.calls == ["repository/archive.tar.gz"]
+    assert {path: files[path] for path in FILES} == FILES
+    assert files[missing] is False
+
+
+def test_populate_content_maps():
+    """
+    Test that a batch fills the content map, skipping files already in it and marking
+    missing files as new
+    """
+    rci = RepoConfigInterface.__new__(RepoConfigInterface)
+    rci.repo = Repo()
+    rci.yaml = ruamel.yaml.YAML()
+    rci.content_map = {}
+    first, second = list(FILES)
+    rci.populate_content_maps([first])
+    missing = "network-elements/devices/device3/interfaces.yaml"
+    sections = rci.populate_content_maps([first, second, missing])
+    assert rci.repo.requested == [first, second, missing]
+    assert sections[second].hostname == "device2"
+    assert sections[second].path == "/interfaces"
+    assert sections[second].content["/interfaces"]["a"] == 2
+    assert sections[missing].new_file
@@ -0,0 +1,98 @@
+import threading
+from pathlib import Path
+from typing import Any, Dict, List
+from ananke.config_api import network_config
+from ananke.config_api.network_config import RepoConfigInterface, RepoConfigSection
+
+FILES = {
+    "network-elements/devices/device1/ntp.yaml": b"---\n/ntp:\n  server: 10.0.0.1 # old\n",
+    "network-elements/devices/device2/ntp.yaml": b"---\n/ntp:\n  server: 10.0.0.2\n",
+    "network-elements/devices/device2/bgp.yaml": b"---\n/bgp:\n  asn: 1\n",
+}
+
+
+class Repo:
+    def __init__(self):
+        self.branch_name = "feature/test"
+        self.commits: List[Any] = []
+
+    def get_files(self, paths: List[str], max_workers: int = 16) -> Dict[str, Any]:
+        return {path: FILES.get(path, False) for path in paths}
+
+    def bulk_commit(self, commit_message: str, actions: List[Any]) -> None:
+        self.commits.append((commit_message, actions))
+
+
+def set_ntp(section: RepoConfigSection) -> None:
+    if section.content["/ntp"]["server"] == "10.0.0.1":
+        section.content["/ntp"]["server"] = "10.0.0.2"
+
+
+def _rci(monkeypatch) -> RepoConfigInterface:
+    # templated YAML needs the ruamel.yaml.jinja2 plugin, plain round-trip YAML
+    # behaves the same for these files
+    monkeypatch.setattr(network_config, "create_yaml", network_config.create_plain_yaml)
+    monkeypatch.setattr(network_config, "_YAML", threading.local())
+    rci = RepoConfigInterface.__new__(RepoConfigInterface)
+    rci.repo = Repo()
+    rci.repo_objects = [Path(path) for path in FILES]
+    return rci
+
+
+def test_bulk_edit(monkeypatch):
+    """
+    Test that only changed files are committed, in one commit, with comments kept
+    """
+    rci = _rci(monkeypatch)
+    result = rci.bulk_edit("network-elements/devices/*/ntp.yaml", set_ntp, "NTP")
+    assert result.changed == ["network-elements/devices/device1/ntp.yaml"]
+    assert result.unchanged == 1
+    assert {"fetch", "parse", "edit", "dump", "commit"} <= set(result.timings)
+    [(message, actions)] = rci.repo.commits
+    assert message == "NTP" and result.committed
+    assert actions[0]["content"] == "---\n/ntp:\n  server: 10.0.0.2 # old\n"
+
+
+def test_bulk_edit_processes(monkeypatch):
+    """
+    Test that picklable edits run in worker processes and failures are reported and
+    keep the other files from being committed, unless partial commits are allowed
+    """
+    rci = _rci(monkeypatch)
+    monkeypatch.setattr(network_config, "PARALLEL_PARSE_THRESHOLD", 1)
+    selector = lambda path: path.name in ["ntp.yaml", "bgp.yaml"]  # noqa: E731
+    result = rci.bulk_edit(selector, set_ntp)
+    assert result.changed == ["network-elements/devices/device1/ntp.yaml"]
+    assert "KeyError" in result.failed["network-elements/devices/device2/bgp.yaml"]
+    assert not result.committed and rci.repo.commits == []
+    result = rci.bulk_edit(selector, set_ntp, allow_partial=True)
+    assert result.committed
+    [(_, [action])] = rci.repo.commits
+    assert action["file_path"] == "network-elements/devices/device1/ntp.yaml"
+
+
+def test_bulk_edit_threads(monkeypatch):
+    """
+    Test that edits running in many threads each parse and dump correctly
+    """
+    rci = _rci(monkeypatch)
+    files = {
+        f"network-elements/devices/device{number}/ntp.yaml": (
+            f"---\n/ntp:\n  server: 10.0.0.1 # device{number}\n"
+            "  peers:\n    - address: 10.0.1.1\n    - address: 10.0.1.2\n"
+        ).encode()
+        for number in range(48)
+    }
+    monkeypatch.setattr(rci.repo, "get_files", lambda paths, max_workers: files)
+    rci.repo_objects = [Path(path) for path in files]
+    # a lambda can't be pickled, so this runs in threads
+    result = rci.bulk_edit("*/ntp.yaml", lambda section: set_ntp(section))
+    assert not result.failed
+    assert len(result.changed) == 48
+    [(_, actions)] = rci.repo.commits
+    for action in actions:
+        device = action["file_path"].split("/")[-2]
+        assert action["content"] == (
+            f"---\n/ntp:\n  server: 10.0.0.2 # {device}\n"
+            "  peers:\n    - address: 10.0.1.1\n    - address: 10.0.1.2\n"
+        )
@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import pytest
+from pathlib import Path
+import ananke.struct.config as config_module
+from ananke.struct.config import Config
+from ananke.struct.bundle import Bundle, write_bundle
+from ananke.struct.plan import PackPlan, TargetPlan, plan_config
+
+
+def _plan(source: str, paths: list) -> TargetPlan:
+    return TargetPlan(
+        source=source,
+        packs=[
+            PackPlan(
+                path=path,
+                write_method="update",
+                size=0,
+                digest="",
+                content={"path": path},
+                original_content={},
+                source_path=path.replace("native:", "openconfig:"),
+                files=[path.split("/")[-1] + ".yaml.j2"],
+            )
+            for path in paths
+        ],
+    )
+
+
+def test_bundle(tmp_path):
+    """
+    Test that packs are read back per target, filtered by template file or part of
+    the path before transform, and verified
+    """
+    path = str(tmp_path / "fleet.bin")
+    write_bundle(
+        path,
+        [
+            _plan("device1", ["openconfig:/interfaces", "native:/system"]),
+            _plan("device2", ["openconfig:/interfaces"]),
+        ],
+    )
+    with Bundle(path) as bundle:
+        assert bundle.targets == ["device1", "device2"]
+        packs = bundle.packs("device1")
+        assert [pack.path for pack in packs] == [
+            "openconfig:/interfaces",
+            "native:/system",
+        ]
+        assert packs[1].content == {"path": "native:/system"}
+        assert packs[1].write_method == "update"
+        for sections in [{"system.yaml.j2"}, {"openconfig:/system"}, {"system"}]:
+            assert [pack.path for pack in bundle.packs("device1", sections)] == [
+                "native:/system"
+            ]
+        assert bundle.packs("device1", {"native:/system"}) == []
+        with pytest.raises(KeyError):
+            bundle.packs("device3")
+    data = bytearray(open(path, "rb").read())
+    data[-3] ^= 0xFF
+    open(path, "wb").write(bytes(data))
+    with Bundle(path) as bundle:
+        bundle.packs("device1")
+        with pytest.raises(ValueError):
+            bundle.packs("device2")
+
+
+@pytest.fixture
+def repo_dir(monkeypatch):
+    # platform suffixes are matched on any underscore in the path, so the directory
+    # can't be under pytest's tmp_path
+    directory = Path(tempfile.gettempdir()) / f"ananke-bundle-{os.getpid()}"
+    (directory / "devices" / "device1").mkdir(parents=True)
+    for name, path in [
+        ("interfaces", "openconfig:/interfaces"),
+        ("lag", "openconfig:/lacp/interfaces"),
+        ("system", "openconfig:/system"),
+    ]:
+        (directory / "devices" / "device1" / f"{name}.yaml.j2").write_text(
+            f"---\n{path}:\n  name: {name}\n"
+        )
+    monkeypatch.setattr(config_module, "CONFIG_DIR", str(directory))
+    config_module.template_files.cache_clear()
+    yield directory
+    shutil.rmtree(directory)
+    config_module.template_files.cache_clear()
+
+
+def test_bundle_sections_match_config(repo_dir, tmp_path):
+    """
+    Test that sections select the same packs from an artifact as when rendering
+    """
+    settings = {"priority": [], "write-methods": {"default": "replace"}}
+    variables = {"hostname": "device1", "roles": []}
+
+    def _config(sections: set) -> Config:
+        return Config("device1", settings, variables, sections=sections)
+
+    path = str(tmp_path / "fleet.bin")
+    write_bundle(path, [plan_config(_config(set()))])
+    with Bundle(path) as bundle:
+        for sections in [
+            {"interfaces"},
+            {"interfaces.yaml.j2"},
+            {"openconfig:/system", "lag.yaml.j2"},
+            {"nothing"},
+        ]:
+            rendered = sorted(pack.path for pack in _config(sections).packs)
+            bundled = sorted(pack.path for pack in bundle.packs("device1", sections))
+            assert bundled == rendered
+        assert len(bundle.packs("device1", {"interfaces"})) == 2
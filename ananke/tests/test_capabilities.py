@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+from ananke.struct.config import ConfigPack
+from ananke.struct.capabilities import (
+    CapabilitiesCache,
+    model_supported,
+    pack_model,
+    preflight,
+)
+
+CAPABILITIES = {
+    "supported_models": [
+        {"name": "openconfig-interfaces", "version": "3.0.0"},
+        {"name": "Cisco-IOS-XR-um-interface-cfg", "version": "1.0.0"},
+    ]
+}
+
+
+class Connector:
+    def __init__(self, target_id: str):
+        self.target_id = target_id
+        self.config_transform = False
+        self.calls = 0
+
+    def get_capabilities(self):
+        self.calls += 1
+        return CAPABILITIES
+
+
+def _pack(path: str) -> ConfigPack:
+    return ConfigPack(path=path, original_content={}, content={})
+
+
+def test_pack_model():
+    """
+    Test that the model is taken from the origin or module prefix of a path
+    """
+    assert pack_model("openconfig:/interfaces") == "openconfig"
+    assert pack_model("Cisco-IOS-XR-um-bgp-cfg:/router") == "Cisco-IOS-XR-um-bgp-cfg"
+    assert pack_model("/System/fm-items") is None
+    assert model_supported("openconfig", ["openconfig-interfaces"])
+    assert not model_supported("openconfig-bgp", ["openconfig-interfaces"])
+
+
+def test_preflight(tmp_path):
+    """
+    Test that unsupported packs are rejected and capabilities are served from cache
+    """
+    connector = Connector("device1")
+    packs = [
+        _pack("openconfig:/interfaces"),
+        _pack("Cisco-IOS-XR-um-router-bgp-cfg:/router"),
+        _pack("/System/fm-items"),
+    ]
+    target = SimpleNamespace(
+        connector=connector, config=SimpleNamespace(packs=packs, rejected={})
+    )
+    cache = CapabilitiesCache(directory=tmp_path)
+    rejected = preflight([target], cache)
+    assert rejected == {"device1": ["Cisco-IOS-XR-um-router-bgp-cfg:/router"]}
+    assert [pack.path for pack in target.config.packs] == [
+        "openconfig:/interfaces",
+        "/System/fm-items",
+    ]
+    assert list(target.config.rejected) == ["Cisco-IOS-XR-um-router-bgp-cfg:/router"]
+    cache.fill([target])
+    assert connector.calls == 1
+    CapabilitiesCache(ttl=-1, directory=tmp_path).fill([target])
+    assert connector.calls == 2
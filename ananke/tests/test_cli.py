@@ -0,0 +1,49 @@
+import json
+from click.testing import CliRunner
+import ananke.struct.dispatch as dispatch_module
+from ananke.actions.ananke_cli import config_set, gnmi_get
+
+
+def test_set_short_flags():
+    """
+    Test that -C is the number of post checks and preflight is only --preflight
+    """
+    params = config_set.make_context("set", ["-C", "3", "device1"]).params
+    assert params["post_checks"] == 3
+    assert params["targets"] == ("device1",)
+    assert not params["preflight_check"]
+    params = config_set.make_context("set", ["--preflight", "device1"]).params
+    assert params["preflight_check"] and not params["post_checks"]
+
+
+class Dispatch:
+    """
+    Stands in for Dispatch, yielding updates for two targets like concurrent_get
+    """
+
+    def __init__(self, targets, render):
+        self.targets = list(targets)
+
+    def concurrent_get(self, paths, operational, max_workers):
+        yield "device1", {"path": "a", "timestamp": 1, "val": {"a": 1}}
+        yield "device1", {"path": "b", "timestamp": 1, "val": {"b": 2}}
+        yield "device2", {"error": "unreachable"}
+
+
+def test_get_output(monkeypatch):
+    """
+    Test that get prints one document per target by default and one line per update
+    with -n
+    """
+    monkeypatch.setattr(dispatch_module, "Dispatch", Dispatch)
+    runner = CliRunner()
+    result = runner.invoke(gnmi_get, ["device1", "device2", "-O", "openconfig:/a"])
+    assert result.exit_code == 0
+    assert '[{"a": 1}, {"b": 2}]' in result.output
+    assert "unreachable" in result.output
+    result = runner.invoke(gnmi_get, ["device1", "device2", "-n", "openconfig:/a"])
+    assert [json.loads(line)["target"] for line in result.output.splitlines()] == [
+        "device1",
+        "device1",
+        "device2",
+    ]
@@ -0,0 +1,50 @@
+import gzip
+import json
+from ananke.struct.collect import write_artifact
+
+
+def test_write_artifact(tmp_path):
+    """
+    Test that artifacts are content-addressed and only rewritten when content changes
+    """
+    content = [{"path": "interfaces", "val": {"a": 1, "b": 2}}]
+    first = write_artifact(str(tmp_path), "device1", content)
+    assert first.changed
+    with gzip.open(first.artifact) as file:
+        assert json.load(file) == content
+    mtime = (tmp_path / "device1" / f"{first.digest}.json.gz").stat().st_mtime_ns
+
+    same = write_artifact(
+        str(tmp_path), "device1", [{"val": {"b": 2, "a": 1}, "path": "interfaces"}]
+    )
+    assert not same.changed
+    assert same.digest == first.digest
+    assert (
+        tmp_path / "device1" / f"{first.digest}.json.gz"
+    ).stat().st_mtime_ns == mtime
+
+    changed = write_artifact(str(tmp_path), "device1", [])
+    assert changed.changed
+    assert (tmp_path / "device1" / "latest").read_text() == changed.digest
+    assert len(list((tmp_path / "device1").glob("*.json.gz"))) == 2
+
+
+def test_write_artifact_update_order(tmp_path):
+    """
+    Test that the same updates in another order give the same artifact
+    """
+    updates = [
+        {"path": "system", "val": {"hostname": "a"}},
+        {"path": "interfaces", "val": {"a": 1}},
+        {"path": "interfaces", "val": {"b": 2}},
+    ]
+    first = write_artifact(str(tmp_path), "device1", updates)
+    reordered = write_artifact(str(tmp_path), "device1", updates[::-1])
+    assert first.changed and not reordered.changed
+    assert reordered.digest == first.digest
+    with gzip.open(first.artifact) as file:
+        assert [update["path"] for update in json.load(file)] == [
+            "interfaces",
+            "interfaces",
+            "system",
+        ]
@@ -0,0 +1,43 @@
+from ruamel.yaml import YAML  # type: ignore
+from ananke.struct.config import ConfigPack
+from ananke.struct.content_pool import ContentPool
+
+CONTENT = """
+interfaces:
+  - name: Ethernet1
+    config: {mtu: 9000, enabled: true}
+  - name: Ethernet2
+    config: {mtu: 9000, enabled: true}
+"""
+
+
+def test_intern():
+    """
+    Test that identical subtrees are shared and loaded YAML becomes plain structures
+    """
+    pool = ContentPool()
+    first = pool.intern(YAML().load(CONTENT))
+    second = pool.intern(YAML().load(CONTENT))
+    assert first is second
+    assert type(first) is dict and type(first["interfaces"]) is list
+    assert first["interfaces"][0]["config"] is first["interfaces"][1]["config"]
+    assert first == {
+        "interfaces": [
+            {"name": "Ethernet1", "config": {"mtu": 9000, "enabled": True}},
+            {"name": "Ethernet2", "config": {"mtu": 9000, "enabled": True}},
+        ]
+    }
+    assert pool.intern({"mtu": 1}) is not pool.intern({"mtu": True})
+    assert pool.intern({"mtu": 1}) is not pool.intern({"mtu": "1"})
+
+
+def test_writable():
+    """
+    Test that writable packs can be modified without touching shared content
+    """
+    content = ContentPool().intern({"a": {"b": 1}})
+    pack = ConfigPack(path="/a", original_content=content, content=content)
+    writable = pack.writable()
+    del writable.content["a"]["b"]
+    assert pack.content == {"a": {"b": 1}}
+    assert writable.original_content is content
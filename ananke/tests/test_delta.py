@@ -0,0 +1,88 @@
+from ananke.struct.delta import compute_delta, canonical, nest, descend, split_path
+
+running = {
+    "interface": [
+        {
+            "name": "Ethernet1/1",
+            "config": {"name": "Ethernet1/1", "mtu": "9216", "enabled": True},
+        },
+        {
+            "name": "Ethernet1/2",
+            "config": {"name": "Ethernet1/2", "description": "old"},
+        },
+        {"name": "Ethernet1/3", "config": {"name": "Ethernet1/3"}},
+    ]
+}
+intended = {
+    "openconfig-interfaces:interface": [
+        {
+            "name": "Ethernet1/2",
+            "config": {"name": "Ethernet1/2", "description": "new"},
+        },
+        {
+            "name": "Ethernet1/1",
+            "config": {"name": "Ethernet1/1", "mtu": 9216, "enabled": True},
+        },
+        {"name": "Ethernet1/4", "config": {"name": "Ethernet1/4"}},
+    ]
+}
+
+
+def test_compute_delta():
+    """
+    Test that only changed leaves, new entries and removed entries are sent, and that
+    list order, prefixes and scalar types are ignored
+    """
+    delta = compute_delta("openconfig:/interfaces", running, intended)
+    assert delta.updates == [
+        (
+            "openconfig:/interfaces/openconfig-interfaces:interface[name=Ethernet1/2]"
+            "/config/description",
+            "new",
+        ),
+        (
+            "openconfig:/interfaces/openconfig-interfaces:interface[name=Ethernet1/4]",
+            {"name": "Ethernet1/4", "config": {"name": "Ethernet1/4"}},
+        ),
+    ]
+    assert delta.deletes == [
+        "openconfig:/interfaces/openconfig-interfaces:interface[name=Ethernet1/3]"
+    ]
+    assert not delta.replaces
+
+
+def test_compute_delta_in_sync():
+    """
+    Test that identical content in canonical form produces no operations
+    """
+    assert not compute_delta("openconfig:/interfaces", running, running)
+    assert canonical(running) == canonical(
+        {"interface": list(reversed(running["interface"]))}
+    )
+
+
+def test_leaf_list_replaced():
+    """
+    Test that unkeyed lists are replaced as a whole
+    """
+    delta = compute_delta(
+        "openconfig:/system/dns",
+        {"servers": ["1.1.1.1", "8.8.8.8"]},
+        {"servers": ["1.1.1.1"]},
+    )
+    assert delta.replaces == [("openconfig:/system/dns/servers", ["1.1.1.1"])]
+
+
+def test_nest_and_descend():
+    """
+    Test wrapping and unwrapping content returned for different path depths
+    """
+    elements = split_path("interfaces/interface[name=Ethernet1/1]/config")
+    assert elements == [
+        ("interfaces", {}),
+        ("interface", {"name": "Ethernet1/1"}),
+        ("config", {}),
+    ]
+    nested = nest(elements[1:], {"mtu": 9216})
+    assert nested == {"interface": [{"name": "Ethernet1/1", "config": {"mtu": 9216}}]}
+    assert descend(nested, elements[1:]) == {"mtu": 9216}
@@ -0,0 +1,129 @@
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+from ananke.struct.config import ConfigPack
+from ananke.struct.drift import check_drift, concurrent_drift, drift_summary
+
+INTENDED = {
+    "openconfig-interfaces:interface": [
+        {"name": "Ethernet1/2", "config": {"name": "Ethernet1/2", "mtu": 9216}},
+        {"name": "Ethernet1/1", "config": {"name": "Ethernet1/1", "enabled": True}},
+    ]
+}
+# same config as the device returns it, without prefixes, in another order and with
+# other scalar types
+RUNNING = {
+    "interface": [
+        {"name": "Ethernet1/1", "config": {"name": "Ethernet1/1", "enabled": "true"}},
+        {"name": "Ethernet1/2", "config": {"name": "Ethernet1/2", "mtu": "9216"}},
+    ]
+}
+DRIFTED = {
+    "interface": [
+        {"name": "Ethernet1/1", "config": {"name": "Ethernet1/1", "enabled": False}},
+        {"name": "Ethernet1/2", "config": {"name": "Ethernet1/2", "mtu": "9216"}},
+        {"name": "Ethernet1/3", "config": {"name": "Ethernet1/3"}},
+    ]
+}
+
+
+class Connector:
+    """
+    Stands in for a connector, returning running config per path or raising
+    """
+
+    def __init__(
+        self,
+        target_id: str,
+        running: Dict[str, Any],
+        error: Optional[Exception] = None,
+        transform: bool = False,
+    ):
+        self.target_id = target_id
+        self.running = running
+        self.error = error
+        self.config_transform = transform
+
+    def _running_config(self, path: str) -> Any:
+        if self.error:
+            raise self.error
+        return self.running.get(path, {})
+
+    def _transform_config(self, pack: ConfigPack) -> Optional[ConfigPack]:
+        if pack.path == "drop":
+            return None
+        pack.path = "native:" + pack.path
+        return pack
+
+
+def _target(connector: Connector, *paths: str) -> Any:
+    packs = [
+        ConfigPack(path=path, original_content=INTENDED, content=INTENDED)
+        for path in paths
+    ]
+    config = SimpleNamespace(packs=packs, transformed=False)
+    return SimpleNamespace(connector=connector, config=config)
+
+
+def test_check_drift():
+    """
+    Test that equal config in another form is in sync, that changed, missing and
+    extra entries are reported and that connector errors are kept per path
+    """
+    in_sync = check_drift(
+        _target(Connector("device1", {"/interfaces": RUNNING}), "/interfaces")
+    )
+    assert not in_sync.drifted
+    assert [path.path for path in in_sync.paths] == ["/interfaces"]
+
+    drifted = check_drift(
+        _target(Connector("device2", {"/interfaces": DRIFTED}), "/interfaces")
+    )
+    [path] = drifted.paths
+    assert drifted.drifted
+    assert path.changed == [
+        "/interfaces/openconfig-interfaces:interface[name=Ethernet1/1]/config/enabled"
+    ]
+    assert path.extra == [
+        "/interfaces/openconfig-interfaces:interface[name=Ethernet1/3]"
+    ]
+
+    missing = check_drift(_target(Connector("device3", {}), "/interfaces"))
+    assert missing.drifted
+    assert missing.paths[0].changed and not missing.paths[0].extra
+
+    failed = check_drift(
+        _target(Connector("device4", {}, ConnectionError("unreachable")), "/interfaces")
+    )
+    assert failed.drifted
+    assert failed.paths[0].error == "unreachable"
+
+
+def test_check_drift_transform():
+    """
+    Test that packs are compared after the platform transform and dropped packs are
+    skipped, without modifying the shared pack
+    """
+    connector = Connector("device1", {"native:/interfaces": RUNNING}, transform=True)
+    target = _target(connector, "/interfaces", "drop")
+    result = check_drift(target)
+    assert [path.path for path in result.paths] == ["native:/interfaces"]
+    assert not result.drifted
+    assert target.config.packs[0].path == "/interfaces"
+
+
+def test_concurrent_drift_summary():
+    """
+    Test that results of all targets are collected and summarised
+    """
+    targets = [
+        _target(Connector("device1", {"/interfaces": RUNNING}), "/interfaces"),
+        _target(
+            Connector("device2", {}, ConnectionError("unreachable")), "/interfaces"
+        ),
+    ]
+    summary = drift_summary(list(concurrent_drift(targets, max_workers=2)))
+    assert summary["drifted"] == ["device2"]
+    assert summary["targets"]["device1"] == {
+        "/interfaces": {"changed": [], "extra": [], "error": None}
+    }
+    assert summary["targets"]["device2"]["/interfaces"]["error"] == "unreachable"
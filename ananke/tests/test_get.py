@@ -0,0 +1,49 @@
+from ananke.connectors.gnmi import GnmiDevice
+
+
+class Session:
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def get(self, path, datatype=None):
+        self.calls.append((path, datatype))
+        return self.response
+
+
+def test_iter_config():
+    """
+    Test that all paths go in one get request and updates are flattened with their
+    notification prefix and timestamp
+    """
+    device = GnmiDevice.__new__(GnmiDevice)
+    device.session = Session(
+        {
+            "notification": [
+                {
+                    "timestamp": 1,
+                    "prefix": "openconfig:interfaces",
+                    "update": [{"path": "interface[name=Ethernet1]", "val": {}}],
+                },
+                {"timestamp": 2, "update": [{"path": "system", "val": {"a": 1}}]},
+                {"timestamp": 3},
+            ]
+        }
+    )
+    paths = ["openconfig:/interfaces", "openconfig:/system"]
+    updates = list(device.iter_config(paths))
+    assert device.session.calls == [(paths, "config")]
+    assert updates == [
+        {
+            "path": "openconfig:interfaces/interface[name=Ethernet1]",
+            "timestamp": 1,
+            "val": {},
+        },
+        {"path": "system", "timestamp": 2, "val": {"a": 1}},
+    ]
@@ -0,0 +1,93 @@
+import json
+import pytest
+import requests  # type: ignore
+from typing import Any, Dict, List
+from requests.models import Response  # type: ignore
+from ananke.struct import gitlab
+from ananke.struct.gitlab import GitLabClient, retry_delay
+
+
+def _response(status: int, body: Any, headers: Dict[str, str] = {}) -> Response:
+    response = Response()
+    response.status_code = status
+    response._content = json.dumps(body).encode()
+    response.headers.update(headers)
+    return response
+
+
+class Session:
+    def __init__(self, responses: List[Response]):
+        self.responses = responses
+        self.calls: List[Any] = []
+
+    def request(self, method: str, url: str, **kwargs: Any) -> Response:
+        self.calls.append((method, url, kwargs.get("params")))
+        if isinstance(response := self.responses.pop(0), Exception):
+            raise response
+        return response
+
+
+def _client(responses: List[Response]) -> GitLabClient:
+    client = GitLabClient("123", "token")
+    client.session = Session(responses)
+    return client
+
+
+def test_paginate_follows_link(monkeypatch):
+    """
+    Test that pages are followed through the Link header until there is no next page
+    """
+    next_url = "https://gitlab.com/api/v4/projects/123/repository/tree?id_after=b"
+    client = _client(
+        [
+            _response(
+                200,
+                [{"path": "a"}, {"path": "b"}],
+                {"Link": f'<{next_url}>; rel="next"'},
+            ),
+            _response(200, [{"path": "c"}]),
+        ]
+    )
+    items = list(client.paginate("repository/tree", keyset=True))
+    assert [item["path"] for item in items] == ["a", "b", "c"]
+    assert client.session.calls[0][2]["pagination"] == "keyset"
+    assert client.session.calls[1][1] == next_url
+
+
+def test_request_retries_rate_limit(monkeypatch):
+    """
+    Test that 429 responses are retried after Retry-After
+    """
+    sleeps: List[float] = []
+    monkeypatch.setattr(gitlab.time, "sleep", sleeps.append)
+    client = _client(
+        [
+            _response(429, {}, {"Retry-After": "3"}),
+            _response(503, {}),
+            _response(200, {"ok": True}),
+        ]
+    )
+    assert client.request("get", "repository/branches").json() == {"ok": True}
+    assert len(client.session.calls) == 3
+    assert sleeps[0] == 3
+    assert retry_delay(_response(429, {}, {"RateLimit-Reset": "0"}), 0) == 0
+
+
+def test_request_retries_writes_only_when_rate_limited(monkeypatch):
+    """
+    Test that writes are retried on 429 but not on server errors or dropped
+    connections, which may have been processed
+    """
+    monkeypatch.setattr(gitlab.time, "sleep", lambda seconds: None)
+    client = _client(
+        [
+            _response(429, {}),
+            _response(502, {}),
+            _response(201, {}),
+        ]
+    )
+    assert client.request("post", "repository/commits").status_code == 502
+    assert len(client.session.calls) == 2
+    client = _client([requests.ConnectionError("reset"), _response(201, {})])
+    with pytest.raises(requests.ConnectionError):
+        client.request("post", "repository/commits")
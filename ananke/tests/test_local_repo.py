@@ -0,0 +1,54 @@
+import os
+from git import Actor, Repo  # type: ignore
+from ananke.struct.repo import LocalRepo
+
+PATH = "network-elements/devices/device1/interfaces.yaml"
+
+
+def _init(directory: str) -> Repo:
+    repo = Repo.init(directory, initial_branch="main")
+    os.makedirs(f"{directory}/network-elements/devices/device1")
+    with open(f"{directory}/{PATH}", "w") as file:
+        file.write("a: 1\n")
+    repo.index.add([PATH])
+    actor = Actor("test", "test@example.com")
+    repo.index.commit("init", author=actor, committer=actor)
+    return repo
+
+
+def test_odb_commit(tmp_path):
+    """
+    Test that object database mode commits to the branch without checking it out or
+    touching the working tree, and lists objects from the branch tree
+    """
+    repo = _init(str(tmp_path))
+    local = LocalRepo(str(tmp_path), branch="feature/test", odb=True)
+    local.bulk_commit(
+        "Update",
+        [
+            {
+                "file_path": PATH,
+                "content": "a: 2\n",
+                "author_email": "test@example.com",
+                "author_name": "test",
+            },
+            {
+                "file_path": "network-elements/devices/device2/interfaces.yaml",
+                "content": "b: 1\n",
+                "author_email": "test@example.com",
+                "author_name": "test",
+            },
+        ],
+    )
+    assert repo.active_branch.name == "main"
+    assert not repo.is_dirty(untracked_files=True)
+    assert local.get_file(PATH) == b"a: 2\n"
+    assert local.get_file("missing.yaml", create=True) is False
+    objects = {str(path) for path in local.list_objects()}
+    assert "network-elements/devices/device2/interfaces.yaml" in objects
+    commit = repo.commit("feature/test")
+    assert commit.message == "Update"
+    assert commit.parents[0] == repo.commit("main")
+    worktree = LocalRepo(str(tmp_path), branch=False)
+    assert not any(".git" in path.parts for path in worktree.list_objects())
+    assert worktree.get_file(PATH) == b"a: 1\n"
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import pytest
+from pathlib import Path
+import ananke.struct.config as config_module
+from ananke.struct.overlay import Overlay, preview
+
+SETTINGS = "---\npriority: []\nwrite-methods:\n  default: replace\n"
+SYSTEM = "---\nopenconfig:/system:\n  config:\n    {% include 'macros/hostname.j2' %}\n"
+
+
+@pytest.fixture
+def repo_dir(monkeypatch, tmp_path):
+    # platform suffixes are matched on any underscore in the path, so the directory
+    # can't be under pytest's tmp_path
+    directory = Path(tempfile.gettempdir()) / f"ananke-overlay-{os.getpid()}"
+    for device, role in [("device1", "spine"), ("device2", "leaf")]:
+        (directory / "devices" / device).mkdir(parents=True)
+        (directory / "devices" / device / "vars.yaml").write_text(
+            f"---\nhostname: {device}\nroles:\n  - {role}\n"
+        )
+    (directory / "roles" / "spine").mkdir(parents=True)
+    (directory / "macros").mkdir()
+    (directory / "settings.yaml").write_text(SETTINGS)
+    (directory / "macros" / "hostname.j2").write_text("hostname: {{ hostname }}")
+    # includes are resolved relative to the root of the template loader
+    system = SYSTEM.replace("macros/", f"{directory}/macros/")
+    (directory / "roles" / "spine" / "system.yaml.j2").write_text(system)
+    monkeypatch.setattr(config_module, "CONFIG_DIR", str(directory))
+    config_module.template_files.cache_clear()
+    yield directory
+    shutil.rmtree(directory)
+    config_module.template_files.cache_clear()
+
+
+def test_overlay_preview(repo_dir):
+    """
+    Test that only devices affected by the overlay are rendered and that changed and
+    added packs are reported, without touching the files on disk
+    """
+    overlay = Overlay(
+        {
+            "macros/hostname.j2": "hostname: {{ hostname }}-new",
+            "devices/device2/ntp.yaml.j2": "---\nopenconfig:/ntp:\n  enabled: true\n",
+        }
+    )
+    assert overlay.affected_targets(overlay.variables()) == {"device1", "device2"}
+    changes = preview(overlay)
+    [system] = changes["device1"]
+    assert system.change == "changed"
+    assert system.delta.updates == [
+        ("openconfig:/system/config/hostname", "device1-new")
+    ]
+    [ntp] = changes["device2"]
+    assert (ntp.path, ntp.change) == ("openconfig:/ntp", "added")
+    assert "new" not in (repo_dir / "macros" / "hostname.j2").read_text()
+    only_vars = Overlay({"devices/device2/vars.yaml": "---\nhostname: other\n"})
+    assert only_vars.affected_targets(only_vars.variables()) == {"device2"}
@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+from ananke.struct.config import ConfigPack
+from ananke.struct.plan import plan_config
+from ananke.struct.util import content_hash
+
+TRANSFORM = """
+def transform(pack):
+    if pack.path == "drop":
+        return None
+    pack.path = "native:" + pack.path
+    pack.content["transformed"] = True
+    return pack
+"""
+
+
+def test_plan_config(monkeypatch, tmp_path):
+    """
+    Test that packs are transformed without a connector and the originals are kept
+    """
+    (tmp_path / "plan_os.py").write_text(TRANSFORM)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    packs = [
+        ConfigPack(path="/interfaces", original_content={}, content={"a": 1}),
+        ConfigPack(path="drop", original_content={}, content={}),
+    ]
+    config = SimpleNamespace(
+        target_id="device1",
+        settings={"transforms": {"module-directory": str(tmp_path)}},
+        variables={"platform": {"os": "plan-os"}},
+        packs=packs,
+        file_paths={"interfaces.yaml.j2": ["/interfaces"]},
+    )
+    plan = plan_config(config, write_method="update")
+    assert [(pack.path, pack.write_method) for pack in plan.packs] == [
+        ("native:/interfaces", "update")
+    ]
+    assert plan.packs[0].source_path == "/interfaces"
+    assert plan.packs[0].files == ["interfaces.yaml.j2"]
+    assert plan.packs[0].digest == content_hash({"a": 1, "transformed": True})
+    assert plan.size == len('{"a": 1, "transformed": true}')
+    assert packs[0].path == "/interfaces" and packs[0].content == {"a": 1}
@@ -0,0 +1,110 @@
+import ananke.post_checks.telemetry as telemetry
+from types import SimpleNamespace
+from ananke.struct.config import ConfigPack
+from ananke.post_checks.telemetry import StatusCheck, scope_paths, touched_objects
+
+interface_pack = ConfigPack(
+    path="openconfig:/interfaces",
+    original_content={},
+    content={
+        "openconfig-interfaces:interface": [
+            {"name": "Ethernet1/1", "config": {"name": "Ethernet1/1"}},
+            {"name": "Ethernet1/2", "config": {"name": "Ethernet1/2"}},
+        ]
+    },
+)
+bgp_pack = ConfigPack(
+    path="Cisco-IOS-XR-um-router-bgp-cfg:/router/bgp",
+    original_content={},
+    content={
+        "Cisco-IOS-XR-um-router-bgp-cfg:as": [
+            {
+                "as-number": 64512,
+                "neighbors": {
+                    "neighbor": [{"neighbor-address": "1.2.3.4", "remote-as": 64513}]
+                },
+            }
+        ]
+    },
+)
+policy_pack = ConfigPack(
+    path="Cisco-IOS-XR-policy-repository-cfg:/routing-policy",
+    original_content={},
+    content={"Cisco-IOS-XR-policy-repository-cfg:route-policies": {}},
+)
+paths = [
+    "openconfig:/interfaces/interface/state",
+    "openconfig:/network-instances/network-instance/protocols/protocol/bgp/neighbors/"
+    "neighbor/state",
+    "openconfig:/lldp/interfaces/interface/neighbors/neighbor/state",
+]
+
+
+def test_touched_objects():
+    """
+    Test that interface names and neighbor addresses are collected from pack content
+    and pack paths
+    """
+    keyed_pack = ConfigPack(
+        path="openconfig:/interfaces/interface[name=po1000]",
+        original_content={},
+        content={},
+    )
+    touched = touched_objects([interface_pack, bgp_pack, keyed_pack])
+    assert touched["interfaces"] == {"Ethernet1/1", "Ethernet1/2", "po1000"}
+    assert touched["neighbors"] == {"1.2.3.4"}
+
+
+def test_scope_paths():
+    """
+    Test that list paths are narrowed per touched object
+    """
+    scoped = scope_paths(paths, [interface_pack, bgp_pack])
+    assert scoped == [
+        "openconfig:/interfaces/interface[name=Ethernet1/1]/state",
+        "openconfig:/interfaces/interface[name=Ethernet1/2]/state",
+        "openconfig:/network-instances/network-instance/protocols/protocol/bgp/"
+        "neighbors/neighbor[neighbor-address=1.2.3.4]/state",
+        "openconfig:/lldp/interfaces/interface[name=Ethernet1/1]/neighbors/neighbor/"
+        "state",
+        "openconfig:/lldp/interfaces/interface[name=Ethernet1/2]/neighbors/neighbor/"
+        "state",
+    ]
+
+
+def test_scope_paths_fallback():
+    """
+    Test that configured paths are kept when nothing can be derived from the packs
+    """
+    assert scope_paths(paths, [policy_pack]) == paths
+
+
+def test_adaptive_poll(monkeypatch):
+    """
+    Test that devices stop being polled once they have converged, and that polling
+    finishes early once all devices have converged
+    """
+    device_diffs = {
+        "device1": [[], [], []],
+        "device2": [[("path", "ADDED")], [], [], [], []],
+    }
+    polled = []
+
+    def _poll(self, tolerance, check_objects=None):
+        for check_object in check_objects:
+            hostname = check_object.target_dict["target"][0]
+            polled.append(hostname)
+            self.results[hostname] = device_diffs[hostname].pop(0)
+
+    monkeypatch.setattr(telemetry, "sleep", lambda _: None)
+    monkeypatch.setattr(StatusCheck, "poll", _poll)
+    status_check = StatusCheck.__new__(StatusCheck)
+    status_check.check_objects = [
+        SimpleNamespace(target_dict={"target": (hostname, 50051)})
+        for hostname in device_diffs
+    ]
+    rounds = list(status_check.adaptive_poll(tolerance=10, max_polls=10))
+    assert len(rounds) == 5
+    assert rounds[-1][2]
+    assert polled.count("device1") == 3
+    assert polled.count("device2") == 5
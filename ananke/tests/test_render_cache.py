@@ -0,0 +1,107 @@
+import os
+import stat
+import shutil
+import tempfile
+import pytest
+from pathlib import Path
+import ananke.struct.config as config_module
+from ananke.struct.config import Config
+
+SETTINGS = {
+    "render-cache": True,
+    "priority": [],
+    "write-methods": {"default": "replace"},
+}
+
+
+def _config(variables: dict) -> Config:
+    return Config(
+        target_id="device1", settings=SETTINGS, variables=variables, sections=set()
+    )
+
+
+@pytest.fixture
+def repo_dir():
+    # platform suffixes are matched on any underscore in the path, so the directory
+    # can't be under pytest's tmp_path
+    directory = os.path.join(tempfile.gettempdir(), f"ananke-render-{os.getpid()}")
+    os.makedirs(directory)
+    yield directory
+    shutil.rmtree(directory)
+
+
+def test_render_cache(monkeypatch, repo_dir, tmp_path):
+    """
+    Test that templates are only rendered again when the template, an included
+    template or a referenced variable changes, and dependencies are recorded
+    """
+    repo = Path(repo_dir) / "repo"
+    (repo / "devices" / "device1").mkdir(parents=True)
+    include = Path(repo_dir) / "hostname.j2"
+    include.write_text("hostname: {{ hostname }}")
+    template = repo / "devices" / "device1" / "system.yaml.j2"
+    template.write_text(
+        "openconfig:/system:\n  config:\n    {% include '" + str(include) + "' %}\n"
+    )
+    monkeypatch.setattr(config_module, "CONFIG_DIR", str(repo))
+    monkeypatch.setenv("ANANKE_CACHE_DIR", str(tmp_path / "cache"))
+    config_module.template_files.cache_clear()
+
+    first = _config({"hostname": "leaf1", "unused": 1})
+    assert first.render_stats == {"rendered": 1, "cached": 0}
+    assert first.packs[0].content == {"config": {"hostname": "leaf1"}}
+    assert first.dependencies["openconfig:/system"] == {
+        "templates": {str(template), str(include)},
+        "variables": {"hostname"},
+    }
+    cached = _config({"hostname": "leaf1", "unused": 2})
+    assert cached.render_stats == {"rendered": 0, "cached": 1}
+    assert cached.packs[0].content == first.packs[0].content
+    assert _config({"hostname": "leaf2"}).render_stats["rendered"] == 1
+
+    include.write_text("hostname: {{ hostname | upper }}")
+    changed = _config({"hostname": "leaf1"})
+    assert changed.render_stats["rendered"] == 1
+    assert changed.packs[0].content == {"config": {"hostname": "LEAF1"}}
+
+
+def test_render_cache_secrets(monkeypatch, repo_dir, tmp_path):
+    """
+    Test that templates referencing vault secrets aren't cached, that cache files are
+    only readable by their owner and that structured templates record dependencies
+    """
+    repo = Path(repo_dir) / "repo"
+    (repo / "devices" / "device1").mkdir(parents=True)
+    (repo / "devices" / "device1" / "aaa.yaml.j2").write_text(
+        "openconfig:/system/aaa:\n  key: {{ tacacs_key }}\n"
+    )
+    (repo / "devices" / "device1" / "system.yaml.j2").write_text(
+        "openconfig:/system/config:\n  hostname: {{ hostname }}\n"
+    )
+    structured = repo / "devices" / "device1" / "ntp.yaml.j2"
+    structured.write_text(
+        "# ananke: structured\nopenconfig:/system/ntp:\n  server: '{{ ntp }}'\n"
+    )
+    monkeypatch.setattr(config_module, "CONFIG_DIR", str(repo))
+    monkeypatch.setenv("ANANKE_CACHE_DIR", str(tmp_path / "cache"))
+    config_module.template_files.cache_clear()
+
+    variables = {"hostname": "leaf1", "tacacs_key": "secret", "ntp": "10.0.0.1"}
+    for _ in range(2):
+        config = Config(
+            target_id="device1",
+            settings=SETTINGS,
+            variables=variables,
+            sections=set(),
+            secret_keys={"tacacs_key"},
+        )
+    assert config.render_stats == {"rendered": 2, "cached": 1}
+    [cache_file] = (tmp_path / "cache" / "render").iterdir()
+    assert b"secret" not in cache_file.read_bytes()
+    assert stat.S_IMODE(cache_file.stat().st_mode) == 0o600
+    assert stat.S_IMODE((tmp_path / "cache" / "render").stat().st_mode) == 0o700
+    assert config.dependencies["openconfig:/system/aaa"]["variables"] == {"tacacs_key"}
+    assert config.dependencies["openconfig:/system/ntp"] == {
+        "templates": {str(structured)},
+        "variables": {"ntp"},
+    }
@@ -0,0 +1,74 @@
+import json
+from typing import Any, Dict, List
+from requests.models import Response  # type: ignore
+from ananke.struct.repo import GitLabRepo
+from ananke.struct.gitlab import GitLabClient
+from ananke.struct.repo_cache import RepoCache, git_blob_sha
+
+CONTENT = b"---\n/interfaces:\n  a: 1\n"
+SHA = git_blob_sha(CONTENT)
+PATH = "network-elements/devices/device1/interfaces.yaml"
+
+
+def _response(status: int, content: bytes, headers: Dict[str, str] = {}) -> Response:
+    response = Response()
+    response.status_code = status
+    response._content = content
+    response.headers.update(headers)
+    return response
+
+
+class Session:
+    """
+    Serves a single commit of a GitLab project, answering 304 to matching ETags
+    """
+
+    def __init__(self):
+        self.calls: List[str] = []
+
+    def request(self, method: str, url: str, **kwargs: Any) -> Response:
+        suffix = url.split("/projects/123/")[1]
+        self.calls.append(suffix)
+        if suffix == "repository/commits/main":
+            if kwargs["headers"].get("If-None-Match") == "etag1":
+                return _response(304, b"")
+            return _response(200, json.dumps({"id": "c1"}).encode(), {"ETag": "etag1"})
+        if suffix == "repository/tree":
+            tree = [{"path": PATH, "id": SHA, "type": "blob"}]
+            return _response(200, json.dumps(tree).encode())
+        if suffix == f"repository/blobs/{SHA}/raw":
+            return _response(200, CONTENT)
+        raise AssertionError(f"Unexpected request {suffix}")
+
+
+def _repo(cache: RepoCache) -> GitLabRepo:
+    repo = GitLabRepo.__new__(GitLabRepo)
+    repo.branch_name = None
+    repo.client = GitLabClient("123", "token")
+    repo.client.session = Session()
+    repo.cache = cache
+    repo.commits = {}
+    repo.trees = {}
+    return repo
+
+
+def test_repo_cache(tmp_path):
+    """
+    Test that a second repo object gets the tree and file contents from the cache,
+    only checking the branch commit with a conditional request
+    """
+    cache = RepoCache(tmp_path)
+    first = _repo(cache)
+    assert first.list_objects()[0].name == "interfaces.yaml"
+    assert first.get_file(PATH) == CONTENT
+    assert first.get_file("missing.yaml", create=True) is False
+    assert first.client.session.calls == [
+        "repository/commits/main",
+        "repository/tree",
+        f"repository/blobs/{SHA}/raw",
+    ]
+    second = _repo(cache)
+    assert second.get_files([PATH]) == {PATH: CONTENT}
+    assert second.client.session.calls == ["repository/commits/main"]
+    cache.store_blob("0" * 40, b"other content")
+    assert cache.blob("0" * 40) is None
@@ -0,0 +1,55 @@
+import pytest
+import ananke.connectors.retry as retry
+from ananke.connectors.retry import RetryPolicy, call_with_retries, classify_error
+from ananke.struct.concurrency import ConcurrencyController
+
+
+class StatusError(Exception):
+    def __init__(self, message: str, orig_exc: Exception = None):
+        super().__init__(message)
+        self.orig_exc = orig_exc
+
+
+def test_classify_error():
+    """
+    Test that status codes are found in the error text when there is no gRPC error
+    """
+    assert (
+        classify_error(StatusError("Error: RESOURCE_EXHAUSTED")) == "RESOURCE_EXHAUSTED"
+    )
+    assert classify_error(StatusError("Operation failed")) == "UNKNOWN"
+
+
+def test_call_with_retries(monkeypatch):
+    """
+    Test that matching errors are retried up to the policy's attempts and others are
+    raised immediately
+    """
+    monkeypatch.setattr(retry, "sleep", lambda _: None)
+    calls = []
+
+    def _fail():
+        calls.append(1)
+        raise StatusError("UNAVAILABLE: connection reset")
+
+    policies = [RetryPolicy(error_class="UNAVAILABLE", attempts=2, base_delay=1)]
+    with pytest.raises(StatusError):
+        call_with_retries(_fail, policies)
+    assert len(calls) == 3
+    calls.clear()
+    with pytest.raises(StatusError):
+        call_with_retries(_fail, [RetryPolicy(error_class="ABORTED", attempts=2)])
+    assert len(calls) == 1
+
+
+def test_concurrency_controller():
+    """
+    Test additive increase on healthy deploys and multiplicative decrease on
+    congestion
+    """
+    controller = ConcurrencyController(initial=8, maximum=10, target_latency=5)
+    assert controller.record(1) == 9
+    assert controller.record(1) == 10
+    assert controller.record(1) == 10
+    assert controller.record(10) == 9
+    assert controller.record(1, congested=True) == 4
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+from ananke.struct.rollout import plan_waves, is_critical
+
+
+def _target(name: str, roles: list) -> SimpleNamespace:
+    return SimpleNamespace(
+        config=SimpleNamespace(target_id=name, roles=roles),
+        connector=SimpleNamespace(target_id=name),
+    )
+
+
+targets = [
+    _target("leaf1", ["leaf"]),
+    _target("leaf2", ["leaf"]),
+    _target("leaf3", ["leaf"]),
+    _target("spine1", ["spine", "leaf"]),
+    _target("edge1", []),
+]
+
+
+def test_role_waves():
+    """
+    Test that role waves are grouped by first role and ordered smallest first
+    """
+    waves = plan_waves(targets, strategy="role")
+    assert [[target.config.target_id for target in wave] for wave in waves] == [
+        ["spine1"],
+        ["edge1"],
+        ["leaf1", "leaf2", "leaf3"],
+    ]
+
+
+def test_site_waves():
+    """
+    Test that site waves are grouped by the given site mapping
+    """
+    sites = {"leaf1": "site1", "leaf2": "site1", "leaf3": "site2", "spine1": "site1"}
+    waves = plan_waves(targets, strategy="site", sites=sites)
+    assert [len(wave) for wave in waves] == [1, 1, 3]
+
+
+def test_percent_waves():
+    """
+    Test that percent waves are chunks of the given percentage, rounded up
+    """
+    waves = plan_waves(targets, strategy="percent", percent=25)
+    assert [len(wave) for wave in waves] == [2, 2, 1]
+
+
+def test_is_critical():
+    """
+    Test that only removed paths and state going down are considered critical
+    """
+    assert is_critical("REMOVED")
+    assert not is_critical("ADDED")
+    assert is_critical([("change", "oper-status", ("UP", "DOWN"))])
+    assert is_critical([("change", ["state", "session-state"], ("UP", "DOWN"))])
+    assert not is_critical([("change", "oper-status", ("DOWN", "UP"))])
+    assert not is_critical([("add", "", [("counters", {})])])
@@ -0,0 +1,108 @@
+import os
+import json
+import stat
+import shutil
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+import pytest
+from pathlib import Path
+from typing import Any, Tuple
+import ananke.struct.config as config_module
+import ananke.struct.dispatch as dispatch_module
+from ananke.struct.service import Service, make_server
+
+SETTINGS = "---\nvault: false\ndomain-name: example.net\npriority: []\nwrite-methods:\n  default: replace\n"
+TOKEN = "secret-token"
+SYSTEM = "---\nopenconfig:/system:\n  config:\n    hostname: {{ hostname }}\n"
+
+
+@pytest.fixture
+def repo_dir(monkeypatch):
+    # platform suffixes are matched on any underscore in the path, so the directory
+    # can't be under pytest's tmp_path
+    directory = Path(tempfile.gettempdir()) / f"ananke-service-{os.getpid()}"
+    (directory / "devices" / "device1").mkdir(parents=True)
+    (directory / "devices" / "device1" / "vars.yaml").write_text(
+        "---\nhostname: device1\nroles: []\nmanagement: {}\n"
+    )
+    (directory / "devices" / "device1" / "system.yaml.j2").write_text(SYSTEM)
+    (directory / "settings.yaml").write_text(SETTINGS)
+    monkeypatch.setattr(config_module, "CONFIG_DIR", str(directory))
+    monkeypatch.setattr(dispatch_module, "CONFIG_DIR", str(directory))
+    config_module.template_files.cache_clear()
+    yield directory
+    shutil.rmtree(directory)
+    config_module.template_files.cache_clear()
+
+
+@pytest.fixture
+def service(repo_dir):
+    service = Service(queue_timeout=0, poll_interval=0)
+    server = make_server(service, port=0, token=TOKEN)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    service.url = "http://127.0.0.1:{}".format(server.server_address[1])
+    yield service
+    server.shutdown()
+    server.server_close()
+
+
+def _call(
+    service: Service, path: str, body: Any = None, token: str = TOKEN
+) -> Tuple[int, Any]:
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(
+        service.url + path, data=data, headers={"Authorization": f"Bearer {token}"}
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as err:
+        return err.code, json.loads(err.read())
+
+
+def test_plan_and_invalidate(service, repo_dir):
+    """
+    Test that plans are served from the kept state and that changes to the repo are
+    picked up after invalidating
+    """
+    status, plan = _call(service, "/plan", {"targets": ["device1"]})
+    assert status == 200
+    [pack] = plan["device1"]
+    vars_file = repo_dir / "devices" / "device1" / "vars.yaml"
+    vars_file.write_text("---\nhostname: renamed\nroles: []\nmanagement: {}\n")
+    assert _call(service, "/plan", {"targets": ["device1"]})[1] == plan
+    status, health = _call(service, "/invalidate", {})
+    assert (status, health["generation"]) == (200, 2)
+    [changed] = _call(service, "/plan", {"targets": ["device1"]})[1]["device1"]
+    assert changed["digest"] != pack["digest"]
+
+
+def test_errors_and_limits(service):
+    """
+    Test that bad requests, unknown endpoints, requests without the token and
+    requests over the concurrency limit are rejected
+    """
+    assert _call(service, "/get", {"targets": ["device1"]})[0] == 400
+    assert _call(service, "/nothing", {})[0] == 404
+    assert _call(service, "/set", {"targets": ["device1"]}, token="wrong")[0] == 401
+    for _ in range(4):
+        service.request_slots.acquire()
+    status, body = _call(service, "/plan", {"targets": ["device1"]})
+    assert status == 429
+    assert "try again" in body["error"]
+
+
+def test_listeners(service, tmp_path):
+    """
+    Test that a TCP port needs a token and that the Unix socket is only accessible to
+    its owner
+    """
+    with pytest.raises(ValueError):
+        make_server(service, port=0)
+    server = make_server(service, unix_socket=str(tmp_path / "ananke.sock"))
+    try:
+        assert stat.S_IMODE(os.stat(tmp_path / "ananke.sock").st_mode) == 0o600
+    finally:
+        server.server_close()
@@ -0,0 +1,58 @@
+import os
+import sys
+import subprocess
+from typing import Dict, Tuple
+import pytest
+
+# modules that only the code paths talking to devices, vault, Slack or GitLab need
+HEAVY = {"grpc", "pygnmi", "requests", "hvac", "dictdiffer", "git"}
+# microseconds ananke_cli may take to import, it took about 400ms with everything
+# imported at module load
+CLI_BUDGET = 150_000
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Self and cumulative import time in microseconds of every module imported along
+    with module, from a fresh interpreter with -X importtime
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": os.getcwd()},
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        if own.strip().isdigit():
+            times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+@pytest.mark.parametrize(
+    "module, heavy",
+    [
+        ("ananke.actions.ananke_cli", HEAVY),
+        ("ananke.struct.dispatch", HEAVY),
+        ("ananke.struct.plan", HEAVY),
+        ("ananke.config_api.network_config", {"hvac", "git", "requests", "grpc"}),
+    ],
+)
+def test_no_heavy_imports(module, heavy):
+    """
+    Test that modules on the startup path don't import heavy dependencies until the
+    code that needs them runs
+    """
+    assert not heavy & set(import_times(module))
+
+
+def test_cli_import_budget():
+    """
+    Test that the CLI imports within its time budget
+    """
+    times = import_times("ananke.actions.ananke_cli")
+    assert times["ananke.actions.ananke_cli"][1] < CLI_BUDGET
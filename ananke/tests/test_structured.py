@@ -0,0 +1,99 @@
+import jinja2  # type: ignore
+from ruamel.yaml import YAML  # type: ignore
+from ananke.struct.structured import (
+    is_structured,
+    render_structured,
+    structured_variables,
+)
+
+STRUCTURED = """# ananke: structured
+openconfig:/network-instances:
+  network-instance:
+    - name: default
+      protocols:
+        protocol:
+          - identifier: BGP
+            bgp:
+              global:
+                config:
+                  as: "{{ asn }}"
+                  router-id: "{{ loopback.split('/')[0] }}"
+              neighbors:
+                neighbor:
+                  - $for: neighbor in neighbors
+                    $each:
+                      neighbor-address: "{{ neighbor.address }}"
+                      config:
+                        peer-as: "{{ neighbor.asn }}"
+                        description: "{{ neighbor.name }} ({{ neighbor.asn }})"
+                        enabled:
+                          $if: neighbor.shutdown
+                          $then: false
+                  - $if: route_server is defined
+                    $then:
+                      neighbor-address: "{{ route_server }}"
+"""
+
+TEXT = """openconfig:/network-instances:
+  network-instance:
+    - name: default
+      protocols:
+        protocol:
+          - identifier: BGP
+            bgp:
+              global:
+                config:
+                  as: {{ asn }}
+                  router-id: {{ loopback.split('/')[0] }}
+              neighbors:
+                neighbor:
+{% for neighbor in neighbors %}
+                  - neighbor-address: {{ neighbor.address }}
+                    config:
+                      peer-as: {{ neighbor.asn }}
+                      description: {{ neighbor.name }} ({{ neighbor.asn }})
+{% if neighbor.shutdown %}
+                      enabled: false
+{% endif %}
+{% endfor %}
+"""
+
+VARIABLES = {
+    "asn": 65000,
+    "loopback": "10.0.0.1/32",
+    "neighbors": [
+        {"address": "10.1.0.1", "asn": 65001, "name": "spine1", "shutdown": False},
+        {"address": "10.1.0.2", "asn": 65002, "name": "spine2", "shutdown": True},
+    ],
+}
+
+
+def test_render_structured(tmp_path):
+    """
+    Test that structured templates give the same content as the equivalent text
+    template rendered and parsed as YAML, with native types for expressions
+    """
+    template = tmp_path / "bgp.yaml.j2"
+    template.write_text(STRUCTURED)
+    assert is_structured(str(template))
+    expected = YAML().load(jinja2.Template(TEXT).render(VARIABLES))
+    assert render_structured(str(template), VARIABLES) == expected
+    neighbors = render_structured(
+        str(template), {**VARIABLES, "route_server": "10.2.0.1"}
+    )["openconfig:/network-instances"]["network-instance"][0]["protocols"]["protocol"][
+        0
+    ][
+        "bgp"
+    ][
+        "neighbors"
+    ][
+        "neighbor"
+    ]
+    assert neighbors[0]["config"]["peer-as"] == 65001
+    assert neighbors[-1] == {"neighbor-address": "10.2.0.1"}
+    assert structured_variables(str(template)) == {
+        "asn",
+        "loopback",
+        "neighbors",
+        "route_server",
+    }
@@ -0,0 +1,49 @@
+import pytest
+import ananke.struct.validate as validate
+from ananke.struct.config import ConfigPack
+from ananke.struct.validate import validate_pack
+
+serialise = pytest.importorskip("pyangbind.lib.serialise")
+
+
+def _pack(content: dict) -> ConfigPack:
+    return ConfigPack(path="demo:system", original_content=content, content=content)
+
+
+def test_validate_pack(monkeypatch, tmp_path):
+    """
+    Test that binding errors are reported per pack and results are cached by content
+    """
+    monkeypatch.setenv("ANANKE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(validate, "binding_version", lambda binding: binding)
+    monkeypatch.setattr(validate, "binding_factory", lambda *args: lambda: None)
+    loads = []
+
+    def _load(content, parent, name, obj=None):
+        loads.append(content)
+        if "mtu" in content:
+            raise ValueError({"error-string": "mtu must be of a type uint16"})
+
+    monkeypatch.setattr(serialise.pybindJSONDecoder, "load_ietf_json", _load)
+    bindings = {"demo:system": {"binding": "demo", "object": "demo"}}
+
+    assert validate_pack(_pack({"hostname": "a"}), bindings).errors == []
+    invalid = validate_pack(_pack({"mtu": "big"}), bindings)
+    assert invalid.errors == ["ValueError: mtu must be of a type uint16"]
+    cached = validate_pack(_pack({"mtu": "big"}), bindings)
+    assert cached.cached and cached.errors == invalid.errors
+    assert len(loads) == 2
+    assert validate_pack(_pack({}), {}).skipped
+
+
+def test_missing_binding(monkeypatch, tmp_path):
+    """
+    Test that a binding that can't be imported is reported for its pack and not cached
+    """
+    monkeypatch.setenv("ANANKE_CACHE_DIR", str(tmp_path))
+    bindings = {"demo:system": {"binding": "ananke_missing_binding", "object": "x"}}
+    result = validate_pack(_pack({"hostname": "a"}), bindings)
+    assert result.errors == [
+        "ModuleNotFoundError: No module named 'ananke_missing_binding'"
+    ]
+    assert not list(tmp_path.rglob("*.json"))
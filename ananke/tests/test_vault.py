@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+import hvac  # type: ignore
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List
+import ananke.struct.config as config_module
+import ananke.struct.dispatch as dispatch_module
+from ananke.struct import vault
+from ananke.struct.dispatch import Dispatch
+from ananke.struct.vault import Vault
+
+SECRETS = {
+    "network/devices": {"ANANKE_CONNECTOR_PASSWORD": "old", "snmp_community": "c"},
+    "network/override": {"ANANKE_CONNECTOR_PASSWORD": "new"},
+}
+
+
+class Client:
+    """
+    Stands in for hvac.Client, counting logins and KV reads
+    """
+
+    logins = 0
+    reads: List[str] = []
+    revoked = False
+
+    def __init__(self, url: str):
+        self.token = None
+        self.auth = SimpleNamespace(approle=SimpleNamespace(login=self.login))
+        kv = SimpleNamespace(v2=SimpleNamespace(read_secret_version=self.read))
+        self.secrets = SimpleNamespace(kv=kv)
+
+    def login(self, role_id: str, secret_id: str, use_token: bool) -> Dict[str, Any]:
+        Client.logins += 1
+        Client.revoked = False
+        return {
+            "auth": {"client_token": f"token-{Client.logins}", "lease_duration": 60}
+        }
+
+    def is_authenticated(self) -> bool:
+        return True
+
+    def read(self, mount_point: str, path: str, raise_on_deleted_version: bool) -> Any:
+        if Client.revoked:
+            raise hvac.exceptions.Forbidden()
+        Client.reads.append(path)
+        return {"data": {"data": SECRETS[path]}}
+
+
+@pytest.fixture(autouse=True)
+def client(monkeypatch):
+    monkeypatch.setattr(vault.hvac, "Client", Client)
+    Client.logins, Client.reads, Client.revoked = 0, [], False
+    vault.clear_cache()
+    yield
+    vault.clear_cache()
+
+
+def _vault(**kwargs: Any) -> Vault:
+    return Vault(
+        paths=list(SECRETS),
+        mount_point="kv",
+        url="https://vault",
+        vault_role_id="role",
+        vault_secret="secret",
+        **kwargs,
+    )
+
+
+def test_token_and_secrets_reused():
+    """
+    Test that the token and paths are reused across Vault instances, paths are only
+    read when keys are asked for and later paths take precedence
+    """
+    first = _vault()
+    assert Client.reads == []
+    assert first.resolve(["ANANKE_CONNECTOR_PASSWORD"]) == {
+        "ANANKE_CONNECTOR_PASSWORD": "new"
+    }
+    second = _vault()
+    assert second.keys["snmp_community"] == "c"
+    assert Client.logins == 1
+    assert sorted(Client.reads) == sorted(SECRETS)
+
+
+def test_expired_and_revoked():
+    """
+    Test that paths are read again without a cache and that a revoked token is
+    replaced
+    """
+    first = _vault(ttl=0)
+    first.keys
+    first.read_path("network/devices")
+    assert len(Client.reads) == 3
+    Client.revoked = True
+    assert _vault(ttl=0).keys["ANANKE_CONNECTOR_PASSWORD"] == "new"
+    assert Client.logins == 2
+
+
+@pytest.fixture
+def repo_dir(monkeypatch):
+    # platform suffixes are matched on any underscore in the path, so the directory
+    # can't be under pytest's tmp_path
+    directory = Path(tempfile.gettempdir()) / f"ananke-vault-{os.getpid()}"
+    for device, extra in [("device1", ""), ("device2", "snmp_community: d2\n")]:
+        (directory / "devices" / device).mkdir(parents=True)
+        (directory / "devices" / device / "vars.yaml").write_text(
+            f"---\nhostname: {device}\nroles: []\nmanagement: {{}}\n{extra}"
+        )
+    (directory / "macros").mkdir()
+    (directory / "macros" / "aaa.j2").write_text("key: {{ tacacs_key }}")
+    (directory / "devices" / "device1" / "system.yaml.j2").write_text(
+        "---\nopenconfig:/system:\n  aaa:\n"
+        f"    {{% include '{directory}/macros/aaa.j2' %}}\n"
+        "  snmp: {{ snmp_community }}\n"
+    )
+    (directory / "settings.yaml").write_text(
+        "---\nvault: false\ndomain-name: example.net\npriority: []\n"
+        "write-methods:\n  default: replace\n"
+    )
+    monkeypatch.setattr(config_module, "CONFIG_DIR", str(directory))
+    monkeypatch.setattr(dispatch_module, "CONFIG_DIR", str(directory))
+    config_module.template_files.cache_clear()
+    yield directory
+    shutil.rmtree(directory)
+    config_module.template_files.cache_clear()
+
+
+def test_secret_keys(repo_dir):
+    """
+    Test that keys referenced through includes and keys some vars.yaml defines are
+    used, and that templates with dynamic includes use every key
+    """
+    dispatch = Dispatch(targets={"device1": set()}, connect=False)
+    assert dispatch.secret_keys() == {"tacacs_key", "snmp_community"}
+    (repo_dir / "devices" / "device1" / "dynamic.yaml.j2").write_text(
+        "---\n/dynamic:\n  {% include name %}\n"
+    )
+    config_module.template_files.cache_clear()
+    assert Dispatch({"device2": set()}, connect=False).secret_keys() is None
@@ -0,0 +1,122 @@
+from io import StringIO
+import ruamel.yaml  # type: ignore
+from ananke.config_api.network_config import RepoConfigSection
+from ananke.config_api.yang_index import ContentIndex, KeyedList, parse_path
+
+CONTENT = """---
+openconfig:/network-instances:
+  openconfig-network-instance:network-instance:
+    - name: default  # default VRF
+      protocols:
+        protocol:
+          - identifier: BGP
+            name: BGP
+            bgp:
+              neighbors:
+                neighbor:
+                  - neighbor-address: 10.0.0.1
+                    config:
+                      peer-as: 64512
+"""
+BGP = "network-instance[name=default]/protocols/protocol[identifier=BGP][name=BGP]"
+
+
+def _section() -> RepoConfigSection:
+    content = ruamel.yaml.YAML().load(CONTENT)
+    return RepoConfigSection(
+        hostname="device1", path="openconfig:/network-instances", content=content
+    )
+
+
+def test_parse_path():
+    """
+    Test that predicates are parsed and values may contain slashes
+    """
+    assert parse_path("/static[prefix=10.0.0.0/8]/config") == [
+        ("static", {"prefix": "10.0.0.0/8"}),
+        ("config", {}),
+    ]
+
+
+def test_keyed_access():
+    """
+    Test lookups, inserts and deletes by key, keeping comments in the content
+    """
+    section = _section()
+    keyed = section.keyed()
+    assert keyed.get(f"{BGP}/bgp/neighbors/neighbor[neighbor-address=10.0.0.1]")
+    assert keyed.get(f"{BGP}/bgp/neighbors/neighbor[neighbor-address=10.0.0.9]") is None
+    keyed.insert(
+        f"{BGP}/bgp/neighbors/neighbor[neighbor-address=10.0.0.2]",
+        {"config": {"peer-as": 64513}},
+    )
+    assert keyed.delete(f"{BGP}/bgp/neighbors/neighbor[neighbor-address=10.0.0.1]")
+    neighbor = keyed.get(f"{BGP}/bgp/neighbors/neighbor[neighbor-address=10.0.0.2]")
+    assert neighbor["config"]["peer-as"] == 64513
+    keyed.ensure("network-instance[name=mgmt]/config")["type"] = "L3VRF"
+    output = StringIO()
+    ruamel.yaml.YAML().dump(section.content, output)
+    assert "# default VRF" in output.getvalue()
+    assert "10.0.0.1" not in output.getvalue()
+    assert "name: mgmt" in output.getvalue()
+
+
+def test_keyed_list_rebuilds():
+    """
+    Test that changes made to the list directly are picked up
+    """
+    items = [{"name": "a"}, {"name": "b"}]
+    keyed = KeyedList(items, ("name",))
+    assert keyed.get(("b",)) is items[1]
+    items.insert(0, {"name": "c"})
+    assert keyed.get(("b",)) is items[2]
+    items[2] = {"name": "d"}
+    assert keyed.get(("b",)) is None
+
+
+def test_keyed_list_replaced_in_place():
+    """
+    Test that an entry replaced in place under a new key is found once the old key is
+    looked up or after a refresh, and not duplicated
+    """
+    items = [{"name": "a"}, {"name": "b"}]
+    keyed = KeyedList(items, ("name",))
+    assert keyed.get(("a",)) is items[0]
+    items[0] = {"name": "z"}
+    assert keyed.get(("a",)) is None
+    assert keyed.get(("z",)) is items[0]
+    items[1] = {"name": "y"}
+    keyed.refresh()
+    keyed.insert({"name": "y", "value": 1})
+    assert items == [{"name": "z"}, {"name": "y", "value": 1}]
+
+
+def test_keyed_list_bulk_insert():
+    """
+    Test that inserting many new entries doesn't rebuild the index per insert
+    """
+    items = [{"name": "first"}]
+    keyed = KeyedList(items, ("name",))
+    for number in range(5000):
+        keyed.insert({"name": f"entry{number}"})
+    assert keyed.get(("entry4999",)) is items[-1]
+    assert keyed.get(("missing",)) is None
+    assert len(items) == 5001
+    assert keyed.rebuilds == 1
+
+
+def test_typed_key_values():
+    """
+    Test that created entries get integer key values, like their siblings
+    """
+    content = {"sequence": [{"index": 10, "name": "first"}], "term": []}
+    keyed = ContentIndex(content)
+    keyed.ensure("sequence[index=20]")
+    keyed.insert("term[index=0]", {"action": "accept"})
+    keyed.insert("term[name=007]", {})
+    assert content["sequence"][1] == {"index": 20}
+    assert content["term"][0] == {"index": 0, "action": "accept"}
+    output = StringIO()
+    ruamel.yaml.YAML().dump(content, output)
+    assert "index: 0\n" in output.getvalue()
+    assert keyed.get("term[name=007]") == {"name": "007"}